@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+import argparse
+import datetime as dt
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+
+import duckdb
+
+# apps/reddit, so the modules shared by the reddit commands import as internal.*.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from internal.compact import MANIFEST, MANIFEST_VERSION, day_dirs, latest_per_sid, read_manifest
+from internal.journal import cursor_get, cursor_init, cursor_set, journal_head, journal_open, journal_since
+
+RE_PART = re.compile(r"^part-(?P<gen>\d{6})-(?P<n>\d{3})\.parquet$")
+
+# Thread columns carried from 02_staged, plus the name fields every row is keyed by.
+KINDS = {
+    "submissions": {
+        "cols": "author, body, title",
+        "sort": ["sid"],
+    },
+    "comments": {
+        "cols": "author, body, comment_id, parent_id",
+        "sort": ["sid", "comment_id"],
+    },
+}
+
+def log_info(msg: str):
+    sys.stderr.write(f"[INFO] {msg}\n")
+    sys.stderr.flush()
+
+def log_warn(msg: str):
+    sys.stderr.write(f"[WARN] {msg}\n")
+    sys.stderr.flush()
+
+def log_error(msg: str):
+    sys.stderr.write(f"[ERROR] {msg}\n")
+    sys.stderr.flush()
+
+def _iter_days(lookback_days: int):
+    today = dt.datetime.now(dt.UTC).date()
+    if lookback_days <= 0:
+        return None
+    out = []
+    for i in range(lookback_days + 1):
+        d = today - dt.timedelta(days=i)
+        out.append((str(d.year), f"{d.month:02d}{d.day:02d}"))
+    return out
+
+def _esc(s: str) -> str:
+    return s.replace("'", "''")
+
+def _sql_list(items) -> str:
+    return "[" + ", ".join(f"'{_esc(s)}'" for s in items) + "]"
+
+def _state_open(path: str) -> sqlite3.Connection:
+    con = sqlite3.connect(path, timeout=5.0)
+    con.execute("PRAGMA journal_mode=WAL")
+    cursor_init(con)
+    con.commit()
+    return con
+
+def _write_manifest(day_dir: str, doc: dict):
+    tmp = os.path.join(day_dir, f".{MANIFEST}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(doc, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+    os.replace(tmp, os.path.join(day_dir, MANIFEST))
+
+def _compact_day(con, staged_day: str, out_day: str, kind: str, rows_per_file: int, row_group_size: int, force: bool, stats: dict):
+    latest = latest_per_sid(staged_day)
+    if not latest:
+        return "empty"
+    items = sorted(latest.values(), key=lambda x: x[0])
+    names = [fn for fn, _ in items]
+    src_sha16 = hashlib.sha256("\n".join(names).encode("utf-8")).hexdigest()[:16]
+    old = read_manifest(out_day)
+    if old is not None and old.get("sources_sha16") == src_sha16 and old.get("row_group_size") == row_group_size and not force:
+        return "unchanged"
+
+    spec = KINDS[kind]
+    paths = [os.path.join(staged_day, fn) for fn in names]
+    con.execute(
+        f"CREATE OR REPLACE TEMP TABLE names AS SELECT unnest({_sql_list(paths)}) AS filename, "
+        f"unnest({_sql_list(m.group('sid') for _, m in items)}) AS sid, "
+        f"unnest({_sql_list(m.group('cap14') for _, m in items)}) AS cap14, "
+        f"unnest({_sql_list(m.group('h16').lower() for _, m in items)}) AS h16"
+    )
+    con.execute(
+        f"CREATE OR REPLACE TEMP TABLE day AS SELECT n.sid, n.cap14, n.h16, {', '.join('r.' + c.strip() for c in spec['cols'].split(','))} "
+        f"FROM read_parquet({_sql_list(paths)}, filename=true, union_by_name=true) r JOIN names n USING (filename)"
+    )
+    total = con.execute("SELECT count(*) FROM day").fetchone()[0]
+    n_sids = len(latest)
+    parts = max(1, -(-total // max(1, rows_per_file)))
+    # Whole threads go to one part, so a sid lookup touches a single file.
+    con.execute(
+        f"CREATE OR REPLACE TEMP TABLE day_p AS SELECT *, (dense_rank() OVER (ORDER BY sid) - 1) * {parts} // {n_sids} AS part FROM day"
+    )
+
+    os.makedirs(out_day, exist_ok=True)
+    gen = (old or {}).get("generation", 0) + 1
+    order = ", ".join(spec["sort"])
+    cols = f"sid, cap14, h16, {spec['cols']}"
+    files = []
+    for part in range(parts):
+        name = f"part-{gen:06d}-{part:03d}.parquet"
+        tmp = os.path.join(out_day, f".{name}.tmp")
+        con.execute(
+            f"COPY (SELECT {cols} FROM day_p WHERE part = {part} ORDER BY {order}) TO '{_esc(tmp)}' "
+            f"(FORMAT parquet, COMPRESSION zstd, ROW_GROUP_SIZE {row_group_size})"
+        )
+        rows, sid_min, sid_max = con.execute(f"SELECT count(*), min(sid), max(sid) FROM day_p WHERE part = {part}").fetchone()
+        if rows == 0:
+            os.remove(tmp)
+            continue
+        os.replace(tmp, os.path.join(out_day, name))
+        snaps = con.execute(f"SELECT sid, any_value(cap14) FROM day_p WHERE part = {part} GROUP BY sid ORDER BY sid").fetchall()
+        files.append({
+            "name": name, "rows": rows, "sid_min": sid_min, "sid_max": sid_max, "bytes": os.path.getsize(os.path.join(out_day, name)),
+            "sids": [r[0] for r in snaps], "cap14s": [r[1] for r in snaps],
+        })
+
+    _write_manifest(out_day, {
+        "version": MANIFEST_VERSION,
+        "kind": kind,
+        "generation": gen,
+        "created_at": int(time.time()),
+        "sort": spec["sort"],
+        "columns": [c.strip() for c in cols.split(",")],
+        "row_group_size": row_group_size,
+        "sources": len(names),
+        "sources_sha16": src_sha16,
+        "rows": total,
+        "files": files,
+    })
+    # Older generations go only after the new manifest is in place.
+    keep = {f["name"] for f in files}
+    for fn in os.listdir(out_day):
+        m = RE_PART.match(fn)
+        if (m and fn not in keep) or (fn.startswith(".part-") and fn.endswith(".tmp")):
+            os.remove(os.path.join(out_day, fn))
+    stats["rows"] += total
+    stats["files"] += len(files)
+    stats["threads"] += n_sids
+    return "write"
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--staged-root", required=True)
+    ap.add_argument("--compact-root", required=True)
+    ap.add_argument("--lookback-days", type=int, required=True)
+    ap.add_argument("--rows-per-file", type=int, default=1000000)
+    ap.add_argument("--row-group-size", type=int, default=16384)
+    ap.add_argument("--duckdb-threads", type=int, default=0)
+    ap.add_argument("--force", choices=["true", "false"], default="false", help="rewrite days whose sources did not change")
+    ap.add_argument("--discover", choices=["journal", "scan"], default="journal",
+                    help="journal reads 02_staged's change journal; scan walks the lookback days")
+    ap.add_argument("--sub", action="append", default=[])
+    args = ap.parse_args()
+
+    if args.rows_per_file <= 0 or args.row_group_size <= 0:
+        log_error(f"bad rows_per_file={args.rows_per_file} row_group_size={args.row_group_size}")
+        return 2
+
+    days = _iter_days(args.lookback_days)
+    os.makedirs(args.compact_root, exist_ok=True)
+    os.makedirs(args.staged_root, exist_ok=True)
+    state = _state_open(os.path.join(args.compact_root, "_state.sqlite"))
+    src = journal_open(os.path.join(args.staged_root, "_journal.sqlite"))
+    con = duckdb.connect(database=":memory:")
+    if args.duckdb_threads > 0:
+        con.execute(f"SET threads={args.duckdb_threads}")
+    stats = {"days": 0, "wrote": 0, "unchanged": 0, "threads": 0, "rows": 0, "files": 0}
+    t0 = time.monotonic()
+    for sub in args.sub:
+        cur = cursor_get(state, "02_staged", sub)
+        journaled = None
+        if args.discover == "journal" and cur is not None:
+            entries = journal_since(src, sub, cur)
+            head = entries[-1][0] if entries else cur
+            journaled = {(kind, *rel.split(os.sep)[2:4]) for _, kind, rel in entries if rel.count(os.sep) == 4}
+            log_info(f"subreddit={sub} discover=journal from_seq={cur} to_seq={head} entries={len(entries)} days={len(journaled)}")
+        else:
+            # No cursor yet: walk the tree once, then follow the journal from here.
+            head = journal_head(src)
+            log_info(f"subreddit={sub} discover=scan journal_seq={head}")
+        for kind in ("submissions", "comments"):
+            base = os.path.join(args.staged_root, f"r_{sub}", kind)
+            if not os.path.isdir(base):
+                log_warn(f"subreddit={sub} kind={kind} action=skip reason=missing_dir path={base}")
+                continue
+            if journaled is None:
+                day_list = day_dirs(base, days)
+            else:
+                day_list = sorted((y, md) for k, y, md in journaled if k == kind and os.path.isdir(os.path.join(base, y, md)))
+            for y, md in day_list:
+                stats["days"] += 1
+                out_day = os.path.join(args.compact_root, f"r_{sub}", kind, y, md)
+                t1 = time.monotonic()
+                res = _compact_day(con, os.path.join(base, y, md), out_day, kind, args.rows_per_file, args.row_group_size, args.force == "true", stats)
+                if res == "write":
+                    stats["wrote"] += 1
+                    m = read_manifest(out_day)
+                    log_info(
+                        f"subreddit={sub} kind={kind} day={y}/{md} action=write generation={m['generation']} threads={m['sources']} "
+                        f"rows={m['rows']} files={len(m['files'])} elapsed_s={time.monotonic() - t1:.2f}"
+                    )
+                elif res == "unchanged":
+                    stats["unchanged"] += 1
+        cursor_set(state, "02_staged", sub, head)
+        state.commit()
+    con.close()
+    src.close()
+    state.close()
+
+    log_info(
+        f"done days={stats['days']} wrote={stats['wrote']} unchanged={stats['unchanged']} threads={stats['threads']} "
+        f"rows={stats['rows']} files={stats['files']} elapsed_s={time.monotonic() - t0:.1f}"
+    )
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+import argparse
+import datetime as dt
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+
+import duckdb
+
+# apps/reddit, so the modules shared by the reddit commands import as internal.*.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from internal.extract import RE_EXTRACT
+from internal.journal import cursor_get, cursor_init, cursor_set, journal_head, journal_open, journal_since
+
+RE_02 = re.compile(r"^(?P<hms>\d{6})_(?P<sid>[A-Za-z0-9]+)_(?P<cap14>\d{14})_(?P<h16>[0-9a-fA-F]+)\.parquet$")
+
+COLUMNS = ("vid", "sub", "t", "sid", "pid", "h", "text")
+READ_BATCH = 512
+LOOKUP_BATCH = 500
+
+def log_info(msg: str):
+    sys.stderr.write(f"[INFO] {msg}\n")
+    sys.stderr.flush()
+
+def log_warn(msg: str):
+    sys.stderr.write(f"[WARN] {msg}\n")
+    sys.stderr.flush()
+
+def log_error(msg: str):
+    sys.stderr.write(f"[ERROR] {msg}\n")
+    sys.stderr.flush()
+
+def _iter_days(lookback_days: int):
+    today = dt.datetime.now(dt.UTC).date()
+    if lookback_days <= 0:
+        return None
+    out = []
+    for i in range(lookback_days + 1):
+        d = today - dt.timedelta(days=i)
+        out.append((str(d.year), f"{d.month:02d}{d.day:02d}"))
+    return out
+
+def _sha16(s: str) -> str:
+    return hashlib.sha256(s.encode("utf-8", errors="ignore")).hexdigest()[:16]
+
+def _esc(s: str) -> str:
+    return s.replace("'", "''")
+
+def _state_open(path: str) -> sqlite3.Connection:
+    con = sqlite3.connect(path, timeout=5.0)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("CREATE TABLE IF NOT EXISTS extract_meta (k TEXT PRIMARY KEY, v TEXT NOT NULL)")
+    con.execute("CREATE TABLE IF NOT EXISTS extract_files (relpath TEXT PRIMARY KEY, seq INTEGER NOT NULL) WITHOUT ROWID")
+    con.execute("CREATE TABLE IF NOT EXISTS extract_rows (vid TEXT PRIMARY KEY, h TEXT NOT NULL, seq INTEGER NOT NULL) WITHOUT ROWID")
+    con.execute(
+        "CREATE TABLE IF NOT EXISTS extract_runs ("
+        "seq INTEGER PRIMARY KEY, at REAL NOT NULL, files INTEGER NOT NULL, rows INTEGER NOT NULL)"
+    )
+    cursor_init(con)
+    return con
+
+def _state_check_max_chars(con: sqlite3.Connection, max_chars: int):
+    """Forget processed files (and journal cursors) when max_chars changed, so every staged file is re-read.
+
+    Row hashes are kept: only rows whose truncated text actually changed are emitted again.
+    """
+    row = con.execute("SELECT v FROM extract_meta WHERE k = 'max_chars'").fetchone()
+    if row is not None and int(row[0]) != max_chars:
+        log_warn(f"state action=reset_files reason=max_chars_changed old={row[0]} new={max_chars}")
+        con.execute("DELETE FROM extract_files")
+        con.execute("DELETE FROM journal_cursor")
+    con.execute("INSERT OR REPLACE INTO extract_meta VALUES ('max_chars', ?)", [str(max_chars)])
+    con.commit()
+
+def _seq_hwm(con: sqlite3.Connection, out_root: str, last_seq: int) -> int:
+    """Highest seq ever written, committed or not; the run numbers its files above it.
+
+    A consumer may have read an uncommitted file before the crash and moved its
+    cursor to that seq, so dropped seqs are never handed out again. The mark is
+    committed before _drop_uncommitted removes the files it was taken from.
+    """
+    row = con.execute("SELECT v FROM extract_meta WHERE k = 'seq_hwm'").fetchone()
+    hwm = max(last_seq, int(row[0]) if row is not None else 0)
+    for d in os.listdir(out_root):
+        if d.startswith("r_") and os.path.isdir(os.path.join(out_root, d)):
+            for fn in os.listdir(os.path.join(out_root, d)):
+                m = RE_EXTRACT.match(fn)
+                if m:
+                    hwm = max(hwm, int(m.group("seq")))
+    con.execute("INSERT OR REPLACE INTO extract_meta VALUES ('seq_hwm', ?)", [str(hwm)])
+    con.commit()
+    return hwm
+
+def _drop_uncommitted(out_root: str, subs: list[str], last_seq: int):
+    """Remove outputs of a run that crashed after writing parquet but before committing state."""
+    for sub in subs:
+        d = os.path.join(out_root, f"r_{sub}")
+        if not os.path.isdir(d):
+            continue
+        for fn in os.listdir(d):
+            m = RE_EXTRACT.match(fn)
+            if (m and int(m.group("seq")) > last_seq) or fn.endswith(".tmp"):
+                log_warn(f"subreddit={sub} action=remove reason=uncommitted file={fn}")
+                os.remove(os.path.join(d, fn))
+
+def _from_journal(staged_root: str, entries):
+    out = set()
+    for _, kind, rel in entries:
+        p = os.path.join(staged_root, rel)
+        if kind in ("submissions", "comments") and RE_02.match(os.path.basename(rel)) and os.path.isfile(p):
+            out.add((kind, p))
+    return sorted(out, key=lambda x: x[1])
+
+def _scan(staged_root: str, sub: str, days):
+    out = []
+    for kind in ("submissions", "comments"):
+        base = os.path.join(staged_root, f"r_{sub}", kind)
+        if not os.path.isdir(base):
+            log_warn(f"subreddit={sub} kind={kind} action=skip reason=missing_dir path={base}")
+            continue
+        if days is None:
+            for root, _, files in os.walk(base):
+                for fn in files:
+                    if RE_02.match(fn):
+                        out.append((kind, os.path.join(root, fn)))
+        else:
+            for y, md in days:
+                ddir = os.path.join(base, y, md)
+                if not os.path.isdir(ddir):
+                    continue
+                for fn in os.listdir(ddir):
+                    if RE_02.match(fn):
+                        out.append((kind, os.path.join(ddir, fn)))
+    out.sort(key=lambda x: x[1])
+    return out
+
+def _read_submissions(con, paths: list[str]):
+    rows = con.execute(
+        "SELECT filename, coalesce(title,''), coalesce(body,'') "
+        "FROM read_parquet(?, filename=true, file_row_number=true, union_by_name=true) "
+        "QUALIFY row_number() OVER (PARTITION BY filename ORDER BY file_row_number) = 1",
+        [paths],
+    ).fetchall()
+    return {fn: (title, body) for fn, title, body in rows}
+
+def _read_comments(con, paths: list[str]):
+    rows = con.execute(
+        "SELECT filename, coalesce(comment_id,''), coalesce(parent_id,''), coalesce(body,'') "
+        "FROM read_parquet(?, filename=true, file_row_number=true, union_by_name=true) "
+        "WHERE comment_id IS NOT NULL ORDER BY filename, file_row_number",
+        [paths],
+    ).fetchall()
+    out = {}
+    for fn, cid, pid, body in rows:
+        out.setdefault(fn, []).append((cid, pid, body))
+    return out
+
+def _read_batch(con, kind: str, paths: list[str]):
+    """Read one kind for many files in a single query; fall back per file on errors.
+
+    Returns ({path: data}, [paths that could not be read]).
+    """
+    fn = _read_submissions if kind == "submissions" else _read_comments
+    try:
+        return fn(con, paths), []
+    except Exception as e:
+        if len(paths) == 1:
+            log_warn(f"kind={kind} action=skip reason=read_error file={paths[0]} err={e}")
+            return {}, paths
+    got = {}
+    bad = []
+    for p in paths:
+        g, b = _read_batch(con, kind, [p])
+        got.update(g)
+        bad += b
+    return got, bad
+
+def _file_rows(sub: str, kind: str, path: str, data, max_chars: int):
+    sid = RE_02.match(os.path.basename(path)).group("sid")
+    if kind == "submissions":
+        if data is None:
+            return []
+        title, body = data
+        text = (title or "").strip()
+        b = (body or "").strip()
+        if b:
+            text = f"{text}\n\n{b}" if text else b
+        if not text:
+            return []
+        if len(text) > max_chars:
+            text = text[:max_chars]
+        return [(f"r:s:{sub}:{sid}", sub, "s", sid, "", _sha16(text), text)]
+
+    out = []
+    for cid, pid, body in data or []:
+        text = (body or "").strip()
+        if not text:
+            continue
+        if len(text) > max_chars:
+            text = text[:max_chars]
+        out.append((f"r:c:{sub}:{cid}", sub, "c", sid, pid or "", _sha16(text), text))
+    return out
+
+def _changed(state: sqlite3.Connection, rows: list):
+    """Keep rows whose vid is new or whose h differs from the last emitted one.
+
+    A vid seen twice in the batch (several snapshots of one thread) keeps its last row.
+    """
+    last = {}
+    for r in rows:
+        last[r[0]] = r
+    vids = list(last)
+    known = {}
+    for i in range(0, len(vids), LOOKUP_BATCH):
+        chunk = vids[i : i + LOOKUP_BATCH]
+        q = ",".join("?" * len(chunk))
+        for vid, h in state.execute(f"SELECT vid, h FROM extract_rows WHERE vid IN ({q})", chunk):
+            known[vid] = h
+    return [r for r in last.values() if known.get(r[0]) != r[5]]
+
+def _write_parquet(con, rows: list, out_path: str):
+    """Spool rows to NDJSON and let DuckDB write the parquet (much faster than row inserts)."""
+    d = os.path.dirname(out_path)
+    os.makedirs(d, exist_ok=True)
+    fd, spool = tempfile.mkstemp(prefix="extract_", suffix=".ndjson.tmp", dir=d)
+    tmp = out_path + ".tmp"
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            for r in rows:
+                f.write(json.dumps(dict(zip(COLUMNS, r)), ensure_ascii=False))
+                f.write("\n")
+        cols = ", ".join(f"{c}: 'VARCHAR'" for c in COLUMNS)
+        con.execute(
+            f"COPY (SELECT {', '.join(COLUMNS)} FROM read_json('{_esc(spool)}', format='newline_delimited', columns={{{cols}}})) "
+            f"TO '{_esc(tmp)}' (FORMAT parquet, COMPRESSION zstd)"
+        )
+        os.replace(tmp, out_path)
+    finally:
+        for p in (spool, tmp):
+            try:
+                os.remove(p)
+            except FileNotFoundError:
+                pass
+
+def _extract_sub(con, state, staged_root: str, out_root: str, sub: str, cands: list, max_chars: int, seq: int, stats: dict) -> int:
+    """Extract a sub's new files READ_BATCH at a time; returns the next free seq.
+
+    Each batch with changed rows is written as its own {seq}.parquet, so a first
+    run or a full scan holds one batch of rows, not the whole sub. extract_rows is
+    updated per batch (uncommitted, but visible on this connection), so a vid met
+    again in a later batch is emitted again only when its text changed.
+    """
+    rels = [os.path.relpath(p, staged_root) for _, p in cands]
+    done = set()
+    for i in range(0, len(rels), LOOKUP_BATCH):
+        chunk = rels[i : i + LOOKUP_BATCH]
+        q = ",".join("?" * len(chunk))
+        done.update(r[0] for r in state.execute(f"SELECT relpath FROM extract_files WHERE relpath IN ({q})", chunk))
+    todo = [(kind, p, rel) for (kind, p), rel in zip(cands, rels) if rel not in done]
+    stats["scanned"] += len(cands)
+    log_info(f"subreddit={sub} scan files={len(cands)} new={len(todo)}")
+    if not todo:
+        return seq
+
+    files = nrows = nchanged = nout = 0
+    for kind in ("submissions", "comments"):
+        items = [(p, rel) for k, p, rel in todo if k == kind]
+        for i in range(0, len(items), READ_BATCH):
+            batch = items[i : i + READ_BATCH]
+            got, bad = _read_batch(con, kind, [p for p, _ in batch])
+            bad = set(bad)
+            rows = []
+            read_ok = []
+            for p, rel in batch:
+                if p in bad:
+                    stats["bad"] += 1
+                    continue
+                rows += _file_rows(sub, kind, p, got.get(p), max_chars)
+                read_ok.append(rel)
+            changed = _changed(state, rows)
+            out = "-"
+            if changed:
+                out_path = os.path.join(out_root, f"r_{sub}", f"{seq:08d}.parquet")
+                _write_parquet(con, changed, out_path)
+                out = os.path.basename(out_path)
+            state.executemany("INSERT OR REPLACE INTO extract_files VALUES (?, ?)", [(rel, seq) for rel in read_ok])
+            state.executemany("INSERT OR REPLACE INTO extract_rows VALUES (?, ?, ?)", [(r[0], r[5], seq) for r in changed])
+            if changed:
+                seq += 1
+                nout += 1
+            files += len(read_ok)
+            nrows += len(rows)
+            nchanged += len(changed)
+            log_info(
+                f"subreddit={sub} kind={kind} progress files={min(i + READ_BATCH, len(items))}/{len(items)} "
+                f"rows={len(rows)} changed={len(changed)} out={out}"
+            )
+
+    stats["files"] += files
+    stats["rows"] += nrows
+    stats["changed"] += nchanged
+    log_info(f"subreddit={sub} extract files={files} rows={nrows} changed={nchanged} outs={nout}")
+    return seq
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--staged-root", required=True)
+    ap.add_argument("--extract-root", required=True)
+    ap.add_argument("--lookback-days", type=int, required=True)
+    ap.add_argument("--max-chars", type=int, required=True)
+    ap.add_argument("--discover", choices=["journal", "scan"], default="journal",
+                    help="journal reads 02_staged's change journal; scan walks the lookback days")
+    ap.add_argument("--sub", action="append", default=[])
+    args = ap.parse_args()
+
+    os.makedirs(args.extract_root, exist_ok=True)
+    os.makedirs(args.staged_root, exist_ok=True)
+    state = _state_open(os.path.join(args.extract_root, "_state.sqlite"))
+    _state_check_max_chars(state, args.max_chars)
+    last = state.execute("SELECT coalesce(max(seq), 0) FROM extract_runs").fetchone()[0]
+    hwm = _seq_hwm(state, args.extract_root, last)
+    _drop_uncommitted(args.extract_root, args.sub, last)
+    first = seq = hwm + 1
+
+    days = _iter_days(args.lookback_days)
+    con = duckdb.connect(database=":memory:")
+    stats = {"scanned": 0, "files": 0, "bad": 0, "rows": 0, "changed": 0}
+    t0 = time.monotonic()
+    src = journal_open(os.path.join(args.staged_root, "_journal.sqlite"))
+    for sub in args.sub:
+        cur = cursor_get(state, "02_staged", sub)
+        if args.discover == "journal" and cur is not None:
+            entries = journal_since(src, sub, cur)
+            head = entries[-1][0] if entries else cur
+            cands = _from_journal(args.staged_root, entries)
+            log_info(f"subreddit={sub} discover=journal from_seq={cur} to_seq={head} entries={len(entries)}")
+        else:
+            # No cursor yet: walk the tree once, then follow the journal from here.
+            head = journal_head(src)
+            cands = _scan(args.staged_root, sub, days)
+            log_info(f"subreddit={sub} discover=scan journal_seq={head}")
+        seq = _extract_sub(con, state, args.staged_root, args.extract_root, sub, cands, args.max_chars, seq, stats)
+        cursor_set(state, "02_staged", sub, head)
+    src.close()
+    # One commit (files, rows, cursors) after every parquet of this run is in place;
+    # a crash before it leaves files that the next run drops and regenerates under
+    # new seqs. A run is recorded under the last seq it used.
+    last = max(first, seq - 1)
+    state.execute("INSERT INTO extract_runs VALUES (?, ?, ?, ?)", [last, time.time(), stats["files"], stats["changed"]])
+    state.commit()
+    con.close()
+    state.close()
+
+    log_info(
+        f"done seq={first}-{last} scanned={stats['scanned']} files={stats['files']} bad={stats['bad']} rows={stats['rows']} "
+        f"changed={stats['changed']} elapsed_s={time.monotonic() - t0:.1f}"
+    )
+
+if __name__ == "__main__":
+    main()
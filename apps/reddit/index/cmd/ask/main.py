@@ -1,18 +1,28 @@
 #!/usr/bin/env python3
 import argparse
 import datetime as dt
+import hashlib
 import json
+import math
 import os
-import re
+import sqlite3
 import sys
 import time
+from array import array
+from typing import TYPE_CHECKING
 from urllib.parse import urljoin
 
-import requests
-from google import genai
-from google.genai import types
+if TYPE_CHECKING:
+    from google import genai
 
-RE_02 = re.compile(r"^(?P<hms>\d{6})_(?P<sid>[A-Za-z0-9]+)_(?P<cap14>\d{14})_(?P<h16>[0-9a-fA-F]+)\.parquet$")
+# apps/reddit, so the modules shared by the reddit commands import as internal.*.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from internal import cloudflare, hedge, profiling, trace
+from internal.compact import thread_files
+
+# Share of --deadline-ms each stage may use at most. Generation gets whatever is left.
+STAGE_SHARE = {"embed": 0.15, "vector": 0.2, "hydrate": 0.15}
 
 def log_info(msg: str):
     sys.stderr.write(f"[INFO] {msg}\n")
@@ -36,7 +46,9 @@ def _iter_days(lookback_days: int):
         out.append((str(d.year), f"{d.month:02d}{d.day:02d}"))
     return out
 
-def _cf_post_json(url: str, token: str, payload: dict, timeout_s: int = 30):
+def _cf_post_json(url: str, token: str, payload: dict, timeout_s: float = 30):
+    import requests
+
     headers = {
         "Authorization": f"Bearer {token}",
         "Content-Type": "application/json",
@@ -60,45 +72,54 @@ def _cf_post_json(url: str, token: str, payload: dict, timeout_s: int = 30):
         raise RuntimeError(f"cf_api_error url={r.url} resp={j}")
     return j
 
-def _embed_one(client: genai.Client, model: str, q: str, task_type: str, dim: int, retry_max: int, backoff_ms: int):
-    cfg = types.EmbedContentConfig(task_type=task_type, output_dimensionality=dim)
-    last = None
+def _http_options(stage_end: float | None):
+    from google.genai import types
+
+    if stage_end is None:
+        return None
+    return types.HttpOptions(timeout=max(1, int((stage_end - time.monotonic()) * 1000)))
+
+def _backoff_or_raise(last: Exception, attempt: int, retry_max: int, backoff_ms: int, stage_end: float | None):
+    if attempt >= retry_max:
+        raise last
+    sleep_s = (backoff_ms / 1000.0) * (2 ** attempt)
+    if stage_end is not None and time.monotonic() + sleep_s >= stage_end:
+        raise last
+    time.sleep(sleep_s)
+
+def _embed_one(client: "genai.Client", model: str, q: str, task_type: str, dim: int, retry_max: int, backoff_ms: int, stage_end: float | None = None):
+    from google.genai import types
+
     for attempt in range(retry_max + 1):
+        cfg = types.EmbedContentConfig(task_type=task_type, output_dimensionality=dim, http_options=_http_options(stage_end))
         try:
             res = client.models.embed_content(model=model, contents=[q], config=cfg)
             return res.embeddings[0].values
         except Exception as e:
-            last = e
             s = str(e)
             is_429 = ("429" in s) or ("RESOURCE_EXHAUSTED" in s)
             if not is_429:
                 raise
-            if attempt >= retry_max:
-                break
-            time.sleep((backoff_ms / 1000.0) * (2 ** attempt))
-    raise last  # type: ignore[misc]
-
-def _gen_text(client: genai.Client, model: str, prompt: str, temperature: float, max_output_tokens: int, retry_max: int, backoff_ms: int):
-    cfg = types.GenerateContentConfig(temperature=temperature, max_output_tokens=max_output_tokens)
-    last = None
+            _backoff_or_raise(e, attempt, retry_max, backoff_ms, stage_end)
+
+def _gen_text(client: "genai.Client", model: str, prompt: str, temperature: float, max_output_tokens: int, retry_max: int, backoff_ms: int, stage_end: float | None = None):
+    from google.genai import types
+
     for attempt in range(retry_max + 1):
+        cfg = types.GenerateContentConfig(temperature=temperature, max_output_tokens=max_output_tokens, http_options=_http_options(stage_end))
         try:
             res = client.models.generate_content(model=model, contents=prompt, config=cfg)
             txt = getattr(res, "text", None)
             return "" if txt is None else txt
         except Exception as e:
-            last = e
             s = str(e)
             is_429 = ("429" in s) or ("RESOURCE_EXHAUSTED" in s)
             if not is_429:
                 raise
-            if attempt >= retry_max:
-                break
-            time.sleep((backoff_ms / 1000.0) * (2 ** attempt))
-    raise last  # type: ignore[misc]
+            _backoff_or_raise(e, attempt, retry_max, backoff_ms, stage_end)
 
-def _vectorize_query(account_id: str, token: str, index: str, vector: list[float], topk: int, filt: dict | None, timeout_s: int):
-    url = f"https://api.cloudflare.com/client/v4/accounts/{account_id}/vectorize/v2/indexes/{index}/query"
+def _vectorize_query(account_id: str, token: str, index: str, vector: list[float], topk: int, filt: dict | None, timeout_s: float):
+    url = f"{cloudflare.api_base()}/accounts/{account_id}/vectorize/v2/indexes/{index}/query"
     payload = {"vector": vector, "topK": topk, "returnMetadata": "all", "returnValues": False}
     if filt is not None:
         payload["filter"] = filt
@@ -106,57 +127,21 @@ def _vectorize_query(account_id: str, token: str, index: str, vector: list[float
     res = data.get("result") or {}
     return res.get("matches") or []
 
-def _find_latest_02(staged_root: str, sub: str, kind: str, sid: str, lookback_days: int):
-    base = os.path.join(staged_root, f"r_{sub}", kind)
-    if not os.path.isdir(base):
-        return None
-
-    days = _iter_days(lookback_days)
-    cands = []
-
-    if days is None:
-        for root, _, files in os.walk(base):
-            for fn in files:
-                if not fn.endswith(".parquet"):
-                    continue
-                m = RE_02.match(fn)
-                if not m:
-                    continue
-                if m.group("sid") != sid:
-                    continue
-                cands.append(os.path.join(root, fn))
-    else:
-        for y, md in days:
-            ddir = os.path.join(base, y, md)
-            if not os.path.isdir(ddir):
-                continue
-            for fn in os.listdir(ddir):
-                if not fn.endswith(".parquet"):
-                    continue
-                m = RE_02.match(fn)
-                if not m:
-                    continue
-                if m.group("sid") != sid:
-                    continue
-                cands.append(os.path.join(ddir, fn))
-
-    if not cands:
-        return None
-    cands.sort()
-    return cands[-1]
+def _read_text_from_02(path: str, kind: str, sid: str | None, cid: str | None, max_chars: int):
+    """The thread's text (comments: the comment's), or None when the file has no such row.
 
-def _read_text_from_02(path: str, kind: str, cid: str | None, max_chars: int):
-    import duckdb
-
-    con = duckdb.connect(database=":memory:")
+    sid is set for 02c_compact parts, which hold many threads sorted by sid, comment_id.
+    """
+    con = profiling.duckdb_connect()
+    by_sid = [sid] if sid is not None else []
     try:
         if kind == "submissions":
             row = con.execute(
-                "SELECT coalesce(title,''), coalesce(body,'') FROM read_parquet(?) LIMIT 1",
-                [path],
+                f"SELECT coalesce(title,''), coalesce(body,'') FROM read_parquet(?){' WHERE sid = ?' if by_sid else ''} LIMIT 1",
+                [path] + by_sid,
             ).fetchone()
             if not row:
-                return ""
+                return None
             title, body = row
             text = (title or "").strip()
             b = (body or "").strip()
@@ -166,11 +151,11 @@ def _read_text_from_02(path: str, kind: str, cid: str | None, max_chars: int):
             if not cid:
                 return ""
             row = con.execute(
-                "SELECT coalesce(body,'') FROM read_parquet(?) WHERE comment_id = ? LIMIT 1",
-                [path, cid],
+                f"SELECT coalesce(body,'') FROM read_parquet(?) WHERE comment_id = ?{' AND sid = ?' if by_sid else ''} LIMIT 1",
+                [path, cid] + by_sid,
             ).fetchone()
             if not row:
-                return ""
+                return None
             text = (row[0] or "").strip()
 
         text = (text or "").strip()
@@ -182,6 +167,111 @@ def _read_text_from_02(path: str, kind: str, cid: str | None, max_chars: int):
     finally:
         con.close()
 
+def _sha16(s: str) -> str:
+    return hashlib.sha256(s.encode("utf-8", errors="ignore")).hexdigest()[:16]
+
+def _norm_query(q: str) -> str:
+    return " ".join(q.split())
+
+def _unit(vec) -> array:
+    n = math.sqrt(sum(x * x for x in vec))
+    if n <= 0:
+        return array("f", vec)
+    return array("f", (x / n for x in vec))
+
+def _cache_fp(args) -> str:
+    parts = [
+        args.index,
+        args.embed_model,
+        args.embed_dim,
+        args.embed_task_type,
+        args.gen_model,
+        args.temperature,
+        args.max_output_tokens,
+        args.topk,
+        args.max_docs,
+        args.dedup_sid,
+        args.filter_json.strip(),
+        args.ctx_max_chars,
+    ]
+    return _sha16(json.dumps(parts, ensure_ascii=False))
+
+def _cache_open(path: str) -> sqlite3.Connection:
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    con = sqlite3.connect(path, timeout=5.0)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute(
+        "CREATE TABLE IF NOT EXISTS ask_cache ("
+        "id INTEGER PRIMARY KEY, fp TEXT NOT NULL, qnorm TEXT NOT NULL, vec BLOB NOT NULL, "
+        "src_ids TEXT NOT NULL, answer TEXT NOT NULL, sources TEXT NOT NULL, "
+        "created REAL NOT NULL, last_hit REAL NOT NULL, hits INTEGER NOT NULL DEFAULT 0)"
+    )
+    con.execute("CREATE INDEX IF NOT EXISTS ask_cache_fp_q ON ask_cache(fp, qnorm)")
+    return con
+
+def _cache_evict(con: sqlite3.Connection, ttl_s: int, max_entries: int, now: float):
+    if ttl_s > 0:
+        con.execute("DELETE FROM ask_cache WHERE created < ?", [now - ttl_s])
+    if max_entries > 0:
+        con.execute(
+            "DELETE FROM ask_cache WHERE id NOT IN (SELECT id FROM ask_cache ORDER BY last_hit DESC, id DESC LIMIT ?)",
+            [max_entries],
+        )
+    con.commit()
+
+def _cache_hit(con: sqlite3.Connection, row, sim: float, now: float):
+    rid, answer, sources, created = row
+    con.execute("UPDATE ask_cache SET hits = hits + 1, last_hit = ? WHERE id = ?", [now, rid])
+    con.commit()
+    return {"answer": answer, "sources": json.loads(sources), "sim": sim, "age_s": int(now - created)}
+
+def _cache_lookup_exact(con: sqlite3.Connection, fp: str, qnorm: str, now: float):
+    row = con.execute(
+        "SELECT id, answer, sources, created FROM ask_cache WHERE fp = ? AND qnorm = ? ORDER BY created DESC LIMIT 1",
+        [fp, qnorm],
+    ).fetchone()
+    if not row:
+        return None
+    return _cache_hit(con, row, 1.0, now)
+
+def _cache_lookup_sim(con: sqlite3.Connection, fp: str, uvec: array, min_sim: float, src_ids: str | None, now: float):
+    best = None
+    best_sim = -1.0
+    for rid, blob, ids, answer, sources, created in con.execute(
+        "SELECT id, vec, src_ids, answer, sources, created FROM ask_cache WHERE fp = ?",
+        [fp],
+    ):
+        if src_ids is not None and ids != src_ids:
+            continue
+        v = array("f")
+        v.frombytes(blob)
+        if len(v) != len(uvec):
+            continue
+        sim = math.fsum(a * b for a, b in zip(uvec, v))
+        if sim > best_sim:
+            best_sim = sim
+            best = (rid, answer, sources, created)
+    if best is None or best_sim < min_sim:
+        return None
+    return _cache_hit(con, best, best_sim, now)
+
+def _cache_put(con: sqlite3.Connection, fp: str, qnorm: str, uvec: array, src_ids: str, answer: str, sources: list[str], now: float):
+    con.execute(
+        "INSERT INTO ask_cache (fp, qnorm, vec, src_ids, answer, sources, created, last_hit) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        [fp, qnorm, uvec.tobytes(), src_ids, answer, json.dumps(sources, ensure_ascii=False), now, now],
+    )
+    con.commit()
+
+def _write_answer(ans: str, sources: list[str], cached: dict | None = None):
+    sys.stdout.write((ans or "").strip() + "\n\n")
+    sys.stdout.write("SOURCES\n")
+    for s in sources:
+        sys.stdout.write(f"- {s}\n")
+    if cached is not None:
+        sys.stdout.write(f"CACHED sim={cached['sim']:.6f} age_s={cached['age_s']}\n")
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("query", nargs="?", default="")
@@ -201,8 +291,15 @@ def main():
 
     ap.add_argument("--filter-json", default="")
     ap.add_argument("--timeout-s", type=int, default=30)
+    ap.add_argument("--deadline-ms", type=int, default=0)
+    ap.add_argument("--hedge", choices=["true", "false"], default="true")
+    ap.add_argument("--hedge-delay-ms", type=int, default=1000)
+    ap.add_argument("--latency-path", default="")
+    ap.add_argument("--trace", choices=["true", "false"], default="false", help="also write the spans to stderr as [TRACE] lines")
+    ap.add_argument("--trace-path", default="")
 
     ap.add_argument("--staged-root", default="data/reddit/02_staged")
+    ap.add_argument("--compact-root", default="data/reddit/02c_compact", help="02c_compact output; days it has not written are read from --staged-root")
     ap.add_argument("--lookback-days", type=int, default=14)
     ap.add_argument("--ctx-max-chars", type=int, default=1200)
 
@@ -211,8 +308,20 @@ def main():
     ap.add_argument("--gen-retry-max", type=int, default=6)
     ap.add_argument("--gen-retry-backoff-ms", type=int, default=1500)
 
+    ap.add_argument("--cache-path", default="")
+    ap.add_argument("--cache-min-sim", type=float, default=0.95)
+    ap.add_argument("--cache-ttl-s", type=int, default=86400)
+    ap.add_argument("--cache-max-entries", type=int, default=512)
+    ap.add_argument("--cache-match-sources", choices=["true", "false"], default="false")
+
     ap.add_argument("--dry-run", action="store_true")
+    ap.add_argument("--profile", choices=["none", "cpu", "mem", "duckdb"], default="none")
+    ap.add_argument("--profile-dir", default="data/reddit/logs/profile")
     args = ap.parse_args()
+    profiling.start("ask", args.profile, args.profile_dir)
+
+    t_start = time.perf_counter()
+    trace.init("ask", args.trace_path, args.trace == "true")
 
     q = (args.query or "").strip()
     if not q:
@@ -244,19 +353,92 @@ def main():
             log_error("bad --filter-json")
             raise SystemExit(2)
 
-    client = genai.Client(api_key=gemini_key)
-
-    vec = _embed_one(
-        client,
-        args.embed_model,
-        q,
-        args.embed_task_type,
-        args.embed_dim,
-        args.embed_retry_max,
-        args.embed_retry_backoff_ms,
-    )
+    cache = None
+    fp = ""
+    qnorm = _norm_query(q)
+    match_sources = args.cache_match_sources == "true"
+    if args.cache_path and not args.dry_run:
+        t0 = time.perf_counter()
+        cache = _cache_open(args.cache_path)
+        _cache_evict(cache, args.cache_ttl_s, args.cache_max_entries, time.time())
+        fp = _cache_fp(args)
+        if not match_sources:
+            hit = _cache_lookup_exact(cache, fp, qnorm, time.time())
+            trace.emit("cache", (time.perf_counter() - t0) * 1000, kind="exact", hit=hit is not None)
+            if hit is not None:
+                log_info(f"cache hit kind=exact age_s={hit['age_s']} ms={(time.perf_counter() - t0) * 1000:.1f}")
+                _write_answer(hit["answer"], hit["sources"], hit)
+                trace.emit("total", (time.perf_counter() - t_start) * 1000, cached=True)
+                return
+
+    t0 = time.perf_counter()
+    from google import genai
 
-    matches = _vectorize_query(cf_account_id, cf_token, args.index, vec, topk, filt, args.timeout_s)
+    client = genai.Client(api_key=gemini_key)
+    trace.emit("init", (time.perf_counter() - t0) * 1000)
+
+    deadline_at = time.monotonic() + args.deadline_ms / 1000.0 if args.deadline_ms > 0 else None
+    lat = hedge.lat_load(args.latency_path)
+    hedging = args.hedge == "true"
+
+    vec = None
+    t0 = time.perf_counter()
+    degraded = False
+    # Without a deadline the embed call (and ask's 429 retries) run unbounded, as before deadlines existed.
+    t_embed = hedge.stage_timeout_s(STAGE_SHARE, "embed", deadline_at, args.deadline_ms, None)
+    embed_end = None if t_embed is None else time.monotonic() + t_embed
+    try:
+        vec, winner = hedge.hedged(
+            "embed",
+            lambda: _embed_one(
+                client,
+                args.embed_model,
+                q,
+                args.embed_task_type,
+                args.embed_dim,
+                args.embed_retry_max,
+                args.embed_retry_backoff_ms,
+                embed_end,
+            ),
+            t_embed,
+            hedge.delay_s(lat, "embed", args.hedge_delay_ms) if hedging else None,
+            lat,
+        )
+        trace.emit("embed", (time.perf_counter() - t0) * 1000, status="ok", winner=winner)
+    except TimeoutError as e:
+        log_warn(f"stage=embed action=degrade reason=deadline err={e}")
+        trace.emit("embed", (time.perf_counter() - t0) * 1000, status="deadline")
+        degraded = True
+
+    uvec = _unit(vec) if (cache is not None and vec is not None) else None
+    if uvec is not None and not match_sources:
+        t0 = time.perf_counter()
+        hit = _cache_lookup_sim(cache, fp, uvec, args.cache_min_sim, None, time.time())
+        trace.emit("cache", (time.perf_counter() - t0) * 1000, kind="sim", hit=hit is not None)
+        if hit is not None:
+            log_info(f"cache hit kind=sim sim={hit['sim']:.6f} age_s={hit['age_s']} ms={(time.perf_counter() - t0) * 1000:.1f}")
+            _write_answer(hit["answer"], hit["sources"], hit)
+            trace.emit("total", (time.perf_counter() - t_start) * 1000, cached=True)
+            return
+
+    matches = []
+    if vec is not None:
+        t0 = time.perf_counter()
+        t_vec = hedge.stage_timeout_s(STAGE_SHARE, "vector", deadline_at, args.deadline_ms, args.timeout_s)
+        try:
+            matches, winner = hedge.hedged(
+                "vector",
+                lambda: _vectorize_query(cf_account_id, cf_token, args.index, vec, topk, filt, t_vec),
+                t_vec,
+                hedge.delay_s(lat, "vector", args.hedge_delay_ms) if hedging else None,
+                lat,
+            )
+            trace.emit("vector", (time.perf_counter() - t0) * 1000, status="ok", winner=winner, matches=len(matches))
+        except TimeoutError as e:
+            log_warn(f"stage=vector action=degrade reason=deadline err={e}")
+            trace.emit("vector", (time.perf_counter() - t0) * 1000, status="deadline")
+            degraded = True
+    hedge.lat_save(args.latency_path, lat)
 
     rows = []
     for m in matches:
@@ -280,9 +462,29 @@ def main():
         if len(picked) >= args.max_docs:
             break
 
+    src_ids = ",".join(sorted(r["id"] for r in picked))
+    if uvec is not None and match_sources:
+        t0 = time.perf_counter()
+        hit = _cache_lookup_sim(cache, fp, uvec, args.cache_min_sim, src_ids, time.time())
+        trace.emit("cache", (time.perf_counter() - t0) * 1000, kind="sim+sources", hit=hit is not None)
+        if hit is not None:
+            log_info(f"cache hit kind=sim+sources sim={hit['sim']:.6f} age_s={hit['age_s']} ms={(time.perf_counter() - t0) * 1000:.1f}")
+            _write_answer(hit["answer"], hit["sources"], hit)
+            trace.emit("total", (time.perf_counter() - t_start) * 1000, cached=True)
+            return
+
     ctx_blocks = []
     sources = []
+    catalog_ms = 0.0
+    catalog_calls = 0
+    hydrate_ms = 0.0
+    hydrate_calls = 0
+    hydrate_end = time.monotonic() + hedge.stage_timeout_s(STAGE_SHARE, "hydrate", deadline_at, args.deadline_ms, float("inf"))
     for r in picked:
+        if time.monotonic() >= hydrate_end:
+            log_warn(f"stage=hydrate action=degrade reason=deadline docs={len(ctx_blocks)} picked={len(picked)}")
+            degraded = True
+            break
         md = r["metadata"]
         sub = str(md.get("sub") or "")
         sid = str(md.get("sid") or "")
@@ -292,9 +494,19 @@ def main():
 
         text = ""
         if sub and sid and kind:
-            p = _find_latest_02(args.staged_root, sub, kind, sid, args.lookback_days)
-            if p:
-                text = _read_text_from_02(p, kind, cid if kind == "comments" else None, args.ctx_max_chars)
+            t0 = time.perf_counter()
+            files = thread_files(args.staged_root, args.compact_root, sub, kind, sid, _iter_days(args.lookback_days))
+            catalog_ms += (time.perf_counter() - t0) * 1000
+            catalog_calls += 1
+            if files:
+                t0 = time.perf_counter()
+                # A part without the row (a comment newer than the compaction) moves on to the next older day.
+                for p, compacted in files:
+                    text = _read_text_from_02(p, kind, sid if compacted else None, cid if kind == "comments" else None, args.ctx_max_chars)
+                    if text is not None or not compacted:
+                        break
+                hydrate_ms += (time.perf_counter() - t0) * 1000
+                hydrate_calls += 1
 
         text = (text or "").strip()
         if not text:
@@ -304,6 +516,9 @@ def main():
         ctx_blocks.append(f"[{len(ctx_blocks)+1}] {src_line}\n{text}")
         sources.append(src_line)
 
+    trace.emit("catalog", catalog_ms, calls=catalog_calls)
+    trace.emit("hydrate", hydrate_ms, calls=hydrate_calls, docs=len(ctx_blocks))
+
     prompt = ""
     if ctx_blocks:
         prompt = (
@@ -328,9 +543,21 @@ def main():
 
     if args.dry_run:
         sys.stdout.write(prompt + "\n")
+        trace.emit("total", (time.perf_counter() - t_start) * 1000, cached=False, degraded=degraded, dry_run=True)
         return
 
     log_info(f"rag plan matches={len(matches)} docs={len(ctx_blocks)} gen_model={args.gen_model}")
+    gen_end = None
+    if deadline_at is not None:
+        t_gen = hedge.stage_timeout_s(STAGE_SHARE, "gen", deadline_at, args.deadline_ms, args.timeout_s)
+        # Below the 1 ms HttpOptions resolution the request could only time out.
+        if t_gen < 0.001:
+            log_error(f"stage=gen action=abort reason=deadline deadline_ms={args.deadline_ms} docs={len(ctx_blocks)}")
+            trace.emit("total", (time.perf_counter() - t_start) * 1000, cached=False, degraded=True, aborted=True)
+            hedge.exit_if_abandoned(1)
+            raise SystemExit(1)
+        gen_end = time.monotonic() + t_gen
+    t0 = time.perf_counter()
     ans = _gen_text(
         client,
         args.gen_model,
@@ -339,12 +566,17 @@ def main():
         args.max_output_tokens,
         args.gen_retry_max,
         args.gen_retry_backoff_ms,
+        gen_end,
     )
+    trace.emit("gen", (time.perf_counter() - t0) * 1000, chars=len(ans or ""))
 
-    sys.stdout.write((ans or "").strip() + "\n\n")
-    sys.stdout.write("SOURCES\n")
-    for s in sources:
-        sys.stdout.write(f"- {s}\n")
+    _write_answer(ans, sources)
+    trace.emit("total", (time.perf_counter() - t_start) * 1000, cached=False, degraded=degraded)
+
+    if uvec is not None and not degraded and (ans or "").strip():
+        _cache_put(cache, fp, qnorm, uvec, src_ids, (ans or "").strip(), sources, time.time())
+        cache.close()
 
 if __name__ == "__main__":
     main()
+    hedge.exit_if_abandoned()
@@ -9,15 +9,28 @@ import sys
 import tempfile
 import time
 import random
-
-import duckdb
-import requests
-from google import genai
-from google.genai import types
+from typing import TYPE_CHECKING
 from urllib.parse import urljoin
 
+if TYPE_CHECKING:
+    from google import genai
+
+# apps/reddit, so the modules shared by the reddit commands import as internal.*.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from internal import cloudflare, profiling
+from internal.batches import iter_batches
+from internal.extract import cursor_load, extract_files_after, iter_extract_rows
+
+_GEMINI_CLIENT = None
+
 RE_02 = re.compile(r"^(?P<hms>\d{6})_(?P<sid>[A-Za-z0-9]+)_(?P<cap14>\d{14})_(?P<h16>[0-9a-fA-F]+)\.parquet$")
 
+# str.strip()'s whitespace set, so trim() in SQL strips exactly what Python would
+# and the text hashes stay the same.
+STRIP_CHARS = "\t\n\x0b\x0c\r\x1c\x1d\x1e\x1f \x85\xa0\u1680\u2000\u2001\u2002\u2003\u2004\u2005\u2006\u2007\u2008\u2009\u200a\u2028\u2029\u202f\u205f\u3000"
+COMMENT_BATCH_ROWS = 2048
+
 def log_info(msg: str):
     sys.stderr.write(f"[INFO] {msg}\n")
     sys.stderr.flush()
@@ -43,7 +56,17 @@ def _iter_days(lookback_days: int):
 def _sha16(s: str) -> str:
     return hashlib.sha256(s.encode("utf-8", errors="ignore")).hexdigest()[:16]
 
+def _gemini_client(api_key: str) -> "genai.Client":
+    global _GEMINI_CLIENT
+    if _GEMINI_CLIENT is None:
+        from google import genai
+
+        _GEMINI_CLIENT = genai.Client(api_key=api_key)
+    return _GEMINI_CLIENT
+
 def _cf_post_json(url, token, payload, timeout_s=30):
+    import requests
+
     headers = {
         "Authorization": f"Bearer {token}",
         "Content-Type": "application/json",
@@ -73,7 +96,7 @@ def _cf_post_json(url, token, payload, timeout_s=30):
 def _cf_get_by_ids(account_id: str, token: str, index_name: str, ids: list[str]):
     if not ids:
         return {}
-    url = f"https://api.cloudflare.com/client/v4/accounts/{account_id}/vectorize/v2/indexes/{index_name}/get_by_ids"
+    url = f"{cloudflare.api_base()}/accounts/{account_id}/vectorize/v2/indexes/{index_name}/get_by_ids"
     data = _cf_post_json(url, token, {"ids": ids})
     res = data.get("result") or []
     out = {}
@@ -84,29 +107,40 @@ def _cf_get_by_ids(account_id: str, token: str, index_name: str, ids: list[str])
     return out
 
 def _read_submission_row(path: str):
-    con = duckdb.connect(database=":memory:")
+    con = profiling.duckdb_connect()
     rows = con.execute("SELECT coalesce(author,''), coalesce(title,''), coalesce(body,'') FROM read_parquet(?) LIMIT 1", [path]).fetchall()
     con.close()
     if not rows:
         return None
     return rows[0]
 
-def _read_comment_rows(path: str):
-    con = duckdb.connect(database=":memory:")
-    rows = con.execute(
-        "SELECT coalesce(comment_id,''), coalesce(parent_id,''), coalesce(author,''), coalesce(body,'') "
-        "FROM read_parquet(?) WHERE comment_id IS NOT NULL",
-        [path],
-    ).fetchall()
-    con.close()
-    return rows
+def _iter_comment_rows(path: str, max_chars: int, batch: int = COMMENT_BATCH_ROWS):
+    """Yield (cid, pid, text, h) for the non-empty comments of a 02_staged file.
+
+    Stripping, truncation to max_chars and the sha16 run in DuckDB, and rows are
+    fetched a batch at a time, so a megathread never sits in memory as tuples.
+    """
+    con = profiling.duckdb_connect()
+    try:
+        cur = con.execute(
+            "WITH c AS (SELECT comment_id, coalesce(parent_id,'') AS pid, trim(coalesce(body,''), ?) AS body "
+            "           FROM read_parquet(?) WHERE comment_id IS NOT NULL), "
+            "t AS (SELECT comment_id, pid, left(body, ?) AS text FROM c WHERE body <> '') "
+            "SELECT comment_id, pid, text, left(sha256(text), 16) FROM t",
+            [STRIP_CHARS, path, max_chars],
+        )
+        yield from iter_batches(cur, batch)
+    finally:
+        con.close()
+
+def _embed(client: "genai.Client", model: str, texts: list[str], task_type: str, embed_dim: int):
+    from google.genai import types
 
-def _embed(client: genai.Client, model: str, texts: list[str], task_type: str, embed_dim: int):
     cfg = types.EmbedContentConfig(task_type=task_type, output_dimensionality=embed_dim)
     res = client.models.embed_content(model=model, contents=texts, config=cfg)
     return [e.values for e in res.embeddings]
 
-def _flush(items_buf, cf_account_id, cf_token, client, args, budget_left):
+def _flush(items_buf, cf_account_id, cf_token, gemini_key, args, budget_left):
     if not items_buf or budget_left <= 0:
         return 0, False
 
@@ -165,7 +199,7 @@ def _flush(items_buf, cf_account_id, cf_token, client, args, budget_left):
 
             for attempt in range(args.embed_retry_max + 1):
                 try:
-                    vals = _embed(client, args.gemini_model, texts, args.task_type, args.embed_dim)
+                    vals = _embed(_gemini_client(gemini_key), args.gemini_model, texts, args.task_type, args.embed_dim)
                     ok = True
                     break
                 except Exception as e:
@@ -205,10 +239,58 @@ def _flush(items_buf, cf_account_id, cf_token, client, args, budget_left):
         return 0, stop
 
     log_info(f"emit ndjson={out_path} vectors={written}")
+    profiling.mark("flush")
     sys.stdout.write(out_path + "\n")
     sys.stdout.flush()
     return written, stop
 
+def _run_extract(args, cf_account_id, cf_token, gemini_key):
+    """Index changed rows from 02b_extract.
+
+    After the NDJSON paths of each fully indexed file, prints `cursor {json}`: the
+    cursor 03_index.sh writes to --extract-cursor once every upsert before it has
+    succeeded, so a failed upsert leaves the file to the next run.
+    """
+    cursor = cursor_load(args.extract_cursor)
+    files = extract_files_after(args.extract_root, args.sub, cursor)
+    log_info(f"extract files={len(files)} cursor={args.extract_cursor}")
+
+    flush_size = max(1, args.get_by_ids_batch_size)
+    total_written = 0
+    for sub, seq, path in files:
+        items_buf = []
+        complete = True
+        n = 0
+        for vid, _, t, sid, pid, h, text in iter_extract_rows(path):
+            if len(text) > args.max_chars:
+                text = text[: args.max_chars]
+                h = _sha16(text)
+            if t == "s":
+                meta = {"src": "r", "sub": sub, "t": "s", "sid": sid, "h": h}
+            else:
+                meta = {"src": "r", "sub": sub, "t": "c", "sid": sid, "pid": pid or "", "h": h}
+            items_buf.append((vid, text, meta))
+            n += 1
+            if len(items_buf) >= flush_size:
+                w, stop = _flush(items_buf, cf_account_id, cf_token, gemini_key, args, args.max_vectors_per_run - total_written)
+                total_written += w
+                items_buf = []
+                if stop or total_written >= args.max_vectors_per_run:
+                    complete = False
+                    break
+        if complete and items_buf:
+            w, stop = _flush(items_buf, cf_account_id, cf_token, gemini_key, args, args.max_vectors_per_run - total_written)
+            total_written += w
+            complete = not stop and total_written < args.max_vectors_per_run
+        if not complete:
+            log_info(f"extract stop sub={sub} seq={seq} rows_seen={n} written={total_written}")
+            break
+        cursor[sub] = seq
+        sys.stdout.write(f"cursor {json.dumps(cursor, sort_keys=True)}\n")
+        sys.stdout.flush()
+        log_info(f"extract_progress sub={sub} seq={seq} rows={n} written={total_written}")
+        profiling.mark(f"extract:{sub}:{seq}")
+
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--staged-root", required=True)
@@ -229,7 +311,12 @@ def main():
     ap.add_argument("--embed-retry-max", type=int, required=True)
     ap.add_argument("--embed-retry-backoff-ms", type=int, required=True)
     ap.add_argument("--on-embed-429", required=True)
+    ap.add_argument("--extract-root", default="", help="read changed rows from 02b_extract instead of scanning 02_staged")
+    ap.add_argument("--extract-cursor", default="")
+    ap.add_argument("--profile", choices=["none", "cpu", "mem", "duckdb"], default="none")
+    ap.add_argument("--profile-dir", default="data/reddit/logs/profile")
     args = ap.parse_args()
+    profiling.start("indexer", args.profile, args.profile_dir)
 
     if args.embed_dim != args.vector_dim:
         log_error(f"embed_dim must equal vector_dim embed_dim={args.embed_dim} vector_dim={args.vector_dim}")
@@ -246,7 +333,13 @@ def main():
         log_error("missing GEMINI_API_KEY (or GOOGLE_API_KEY)")
         raise SystemExit(2)
 
-    client = genai.Client(api_key=gemini_key)
+    if args.extract_root:
+        if not args.extract_cursor:
+            log_error("--extract-cursor is required with --extract-root")
+            raise SystemExit(2)
+        _run_extract(args, cf_account_id, cf_token, gemini_key)
+        return
+
     days = _iter_days(args.lookback_days)
 
     candidates = []
@@ -276,6 +369,7 @@ def main():
 
     candidates.sort(key=lambda x: x[2])
     log_info(f"scan candidates={len(candidates)} lookback_days={args.lookback_days}")
+    profiling.mark("scan")
 
     flush_size = max(1, args.get_by_ids_batch_size)
 
@@ -311,29 +405,21 @@ def main():
                     items_buf.append((vid, text, meta))
 
                     if len(items_buf) >= flush_size:
-                        w, stop = _flush(items_buf, cf_account_id, cf_token, client, args, args.max_vectors_per_run - total_written)
+                        w, stop = _flush(items_buf, cf_account_id, cf_token, gemini_key, args, args.max_vectors_per_run - total_written)
                         total_written += w
                         items_buf = []
                         if stop:
                             break
         else:
-            rows = _read_comment_rows(path)
-            for cid, pid, author, body in rows:
+            for cid, pid, text, h in _iter_comment_rows(path, args.max_chars):
                 if total_written >= args.max_vectors_per_run:
                     break
-                body = (body or "").strip()
-                if not body:
-                    continue
-                text = body
-                if len(text) > args.max_chars:
-                    text = text[: args.max_chars]
-                h = _sha16(text)
                 vid = f"r:c:{sub}:{cid}"
-                meta = {"src": "r", "sub": sub, "t": "c", "sid": sid, "pid": pid or "", "h": h}
+                meta = {"src": "r", "sub": sub, "t": "c", "sid": sid, "pid": pid, "h": h}
                 items_buf.append((vid, text, meta))
 
                 if len(items_buf) >= flush_size:
-                    w, stop = _flush(items_buf, cf_account_id, cf_token, client, args, args.max_vectors_per_run - total_written)
+                    w, stop = _flush(items_buf, cf_account_id, cf_token, gemini_key, args, args.max_vectors_per_run - total_written)
                     total_written += w
                     items_buf = []
                     if stop:
@@ -343,7 +429,7 @@ def main():
             log_info(f"scan_progress files_parsed={parsed} items_buf={len(items_buf)} written={total_written} last={sub}/{kind}/{fn}")
 
     if items_buf and total_written < args.max_vectors_per_run:
-        w, _ = _flush(items_buf, cf_account_id, cf_token, client, args, args.max_vectors_per_run - total_written)
+        w, _ = _flush(items_buf, cf_account_id, cf_token, gemini_key, args, args.max_vectors_per_run - total_written)
         total_written += w
 
     if total_written <= 0:
@@ -3,15 +3,22 @@ import argparse
 import datetime as dt
 import json
 import os
-import re
 import sys
+import time
+from typing import TYPE_CHECKING
 from urllib.parse import urljoin
 
-import requests
-from google import genai
-from google.genai import types
+if TYPE_CHECKING:
+    from google import genai
 
-RE_02 = re.compile(r"^(?P<hms>\d{6})_(?P<sid>[A-Za-z0-9]+)_(?P<cap14>\d{14})_(?P<h16>[0-9a-fA-F]+)\.parquet$")
+# apps/reddit, so the modules shared by the reddit commands import as internal.*.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from internal import cloudflare, hedge, profiling, trace
+from internal.compact import thread_files
+
+# Share of --deadline-ms each stage may use at most. Hydration gets whatever is left.
+STAGE_SHARE = {"embed": 0.35, "vector": 0.45}
 
 def log_info(msg: str):
     sys.stderr.write(f"[INFO] {msg}\n")
@@ -35,7 +42,9 @@ def _iter_days(lookback_days: int):
         out.append((str(d.year), f"{d.month:02d}{d.day:02d}"))
     return out
 
-def _cf_post_json(url: str, token: str, payload: dict, timeout_s: int = 30):
+def _cf_post_json(url: str, token: str, payload: dict, timeout_s: float = 30):
+    import requests
+
     headers = {
         "Authorization": f"Bearer {token}",
         "Content-Type": "application/json",
@@ -59,13 +68,22 @@ def _cf_post_json(url: str, token: str, payload: dict, timeout_s: int = 30):
         raise RuntimeError(f"cf_api_error url={r.url} resp={j}")
     return j
 
-def _embed_query(client: genai.Client, model: str, q: str, task_type: str, dim: int):
-    cfg = types.EmbedContentConfig(task_type=task_type, output_dimensionality=dim)
+def _http_options(stage_end: float | None):
+    from google.genai import types
+
+    if stage_end is None:
+        return None
+    return types.HttpOptions(timeout=max(1, int((stage_end - time.monotonic()) * 1000)))
+
+def _embed_query(client: "genai.Client", model: str, q: str, task_type: str, dim: int, stage_end: float | None = None):
+    from google.genai import types
+
+    cfg = types.EmbedContentConfig(task_type=task_type, output_dimensionality=dim, http_options=_http_options(stage_end))
     res = client.models.embed_content(model=model, contents=[q], config=cfg)
     return res.embeddings[0].values
 
-def _vectorize_query(account_id: str, token: str, index: str, vector: list[float], topk: int, return_metadata: str, return_values: bool, filt: dict | None, timeout_s: int):
-    url = f"https://api.cloudflare.com/client/v4/accounts/{account_id}/vectorize/v2/indexes/{index}/query"
+def _vectorize_query(account_id: str, token: str, index: str, vector: list[float], topk: int, return_metadata: str, return_values: bool, filt: dict | None, timeout_s: float):
+    url = f"{cloudflare.api_base()}/accounts/{account_id}/vectorize/v2/indexes/{index}/query"
     payload = {
         "vector": vector,
         "topK": topk,
@@ -78,60 +96,21 @@ def _vectorize_query(account_id: str, token: str, index: str, vector: list[float
     res = data.get("result") or {}
     return res.get("matches") or []
 
-def _find_latest_02(staged_root: str, sub: str, kind: str, sid: str, lookback_days: int):
-    base = os.path.join(staged_root, f"r_{sub}", kind)
-    if not os.path.isdir(base):
-        return None
-
-    days = _iter_days(lookback_days)
-    cands = []
-
-    if days is None:
-        for root, _, files in os.walk(base):
-            for fn in files:
-                if not fn.endswith(".parquet"):
-                    continue
-                m = RE_02.match(fn)
-                if not m:
-                    continue
-                if m.group("sid") != sid:
-                    continue
-                cands.append(os.path.join(root, fn))
-    else:
-        for y, md in days:
-            ddir = os.path.join(base, y, md)
-            if not os.path.isdir(ddir):
-                continue
-            for fn in os.listdir(ddir):
-                if not fn.endswith(".parquet"):
-                    continue
-                m = RE_02.match(fn)
-                if not m:
-                    continue
-                if m.group("sid") != sid:
-                    continue
-                cands.append(os.path.join(ddir, fn))
-
-    if not cands:
-        return None
-    cands.sort()
-    return cands[-1]
-
-def _excerpt_from_02(path: str, kind: str, cid: str | None, max_chars: int):
-    try:
-        import duckdb
-    except Exception as e:
-        return f"<duckdb_import_error {e}>"
+def _excerpt_from_02(path: str, kind: str, sid: str | None, cid: str | None, max_chars: int):
+    """The thread's text (comments: the comment's), or None when the file has no such row.
 
-    con = duckdb.connect(database=":memory:")
+    sid is set for 02c_compact parts, which hold many threads sorted by sid, comment_id.
+    """
+    con = profiling.duckdb_connect()
+    by_sid = [sid] if sid is not None else []
     try:
         if kind == "submissions":
             row = con.execute(
-                "SELECT coalesce(title,''), coalesce(body,'') FROM read_parquet(?) LIMIT 1",
-                [path],
+                f"SELECT coalesce(title,''), coalesce(body,'') FROM read_parquet(?){' WHERE sid = ?' if by_sid else ''} LIMIT 1",
+                [path] + by_sid,
             ).fetchone()
             if not row:
-                return ""
+                return None
             title, body = row
             text = (title or "").strip()
             b = (body or "").strip()
@@ -141,11 +120,11 @@ def _excerpt_from_02(path: str, kind: str, cid: str | None, max_chars: int):
             if not cid:
                 return ""
             row = con.execute(
-                "SELECT coalesce(body,'') FROM read_parquet(?) WHERE comment_id = ? LIMIT 1",
-                [path, cid],
+                f"SELECT coalesce(body,'') FROM read_parquet(?) WHERE comment_id = ?{' AND sid = ?' if by_sid else ''} LIMIT 1",
+                [path, cid] + by_sid,
             ).fetchone()
             if not row:
-                return ""
+                return None
             text = (row[0] or "").strip()
 
         text = (text or "").strip()
@@ -167,6 +146,12 @@ def main():
     ap.add_argument("--task-type", default="RETRIEVAL_QUERY")
     ap.add_argument("--filter-json", default="")
     ap.add_argument("--timeout-s", type=int, default=30)
+    ap.add_argument("--deadline-ms", type=int, default=0)
+    ap.add_argument("--hedge", choices=["true", "false"], default="true")
+    ap.add_argument("--hedge-delay-ms", type=int, default=1000)
+    ap.add_argument("--latency-path", default="")
+    ap.add_argument("--trace", choices=["true", "false"], default="false", help="also write the spans to stderr as [TRACE] lines")
+    ap.add_argument("--trace-path", default="")
     ap.add_argument("--format", choices=["pretty", "jsonl"], default="pretty")
 
     ap.add_argument("--return-metadata", choices=["none", "indexed", "all"], default="all")
@@ -174,9 +159,16 @@ def main():
 
     ap.add_argument("--with-text", action="store_true")
     ap.add_argument("--staged-root", default="data/reddit/02_staged")
+    ap.add_argument("--compact-root", default="data/reddit/02c_compact", help="02c_compact output; days it has not written are read from --staged-root")
     ap.add_argument("--lookback-days", type=int, default=7)
     ap.add_argument("--max-chars", type=int, default=600)
+    ap.add_argument("--profile", choices=["none", "cpu", "mem", "duckdb"], default="none")
+    ap.add_argument("--profile-dir", default="data/reddit/logs/profile")
     args = ap.parse_args()
+    profiling.start("query", args.profile, args.profile_dir)
+
+    t_start = time.perf_counter()
+    trace.init("query", args.trace_path, args.trace == "true")
 
     q = (args.query or "").strip()
     if not q:
@@ -211,22 +203,73 @@ def main():
             log_error("bad --filter-json")
             raise SystemExit(2)
 
+    t0 = time.perf_counter()
+    from google import genai
+
     client = genai.Client(api_key=gemini_key)
-    vec = _embed_query(client, args.gemini_model, q, args.task_type, args.embed_dim)
-    matches = _vectorize_query(
-        cf_account_id,
-        cf_token,
-        args.index,
-        vec,
-        topk,
-        args.return_metadata,
-        args.return_values == "true",
-        filt,
-        args.timeout_s,
-    )
+    trace.emit("init", (time.perf_counter() - t0) * 1000)
+
+    deadline_at = time.monotonic() + args.deadline_ms / 1000.0 if args.deadline_ms > 0 else None
+    lat = hedge.lat_load(args.latency_path)
+    hedging = args.hedge == "true"
+
+    vec = None
+    t0 = time.perf_counter()
+    # Without a deadline the embed call (and ask's 429 retries) run unbounded, as before deadlines existed.
+    t_embed = hedge.stage_timeout_s(STAGE_SHARE, "embed", deadline_at, args.deadline_ms, None)
+    embed_end = None if t_embed is None else time.monotonic() + t_embed
+    try:
+        vec, winner = hedge.hedged(
+            "embed",
+            lambda: _embed_query(client, args.gemini_model, q, args.task_type, args.embed_dim, embed_end),
+            t_embed,
+            hedge.delay_s(lat, "embed", args.hedge_delay_ms) if hedging else None,
+            lat,
+        )
+        trace.emit("embed", (time.perf_counter() - t0) * 1000, status="ok", winner=winner)
+    except TimeoutError as e:
+        log_warn(f"stage=embed action=degrade reason=deadline err={e}")
+        trace.emit("embed", (time.perf_counter() - t0) * 1000, status="deadline")
+
+    matches = []
+    if vec is not None:
+        t0 = time.perf_counter()
+        t_vec = hedge.stage_timeout_s(STAGE_SHARE, "vector", deadline_at, args.deadline_ms, args.timeout_s)
+        try:
+            matches, winner = hedge.hedged(
+                "vector",
+                lambda: _vectorize_query(
+                    cf_account_id,
+                    cf_token,
+                    args.index,
+                    vec,
+                    topk,
+                    args.return_metadata,
+                    args.return_values == "true",
+                    filt,
+                    t_vec,
+                ),
+                t_vec,
+                hedge.delay_s(lat, "vector", args.hedge_delay_ms) if hedging else None,
+                lat,
+            )
+            trace.emit("vector", (time.perf_counter() - t0) * 1000, status="ok", winner=winner, matches=len(matches))
+        except TimeoutError as e:
+            log_warn(f"stage=vector action=degrade reason=deadline err={e}")
+            trace.emit("vector", (time.perf_counter() - t0) * 1000, status="deadline")
+    hedge.lat_save(args.latency_path, lat)
 
     log_info(f"query ok index={args.index} topk={topk} matches={len(matches)}")
 
+    hydrate_end = None
+    if deadline_at is not None:
+        hydrate_end = time.monotonic() + hedge.stage_timeout_s(STAGE_SHARE, "hydrate", deadline_at, args.deadline_ms, args.timeout_s)
+    hydrate_missed = 0
+    catalog_ms = 0.0
+    catalog_calls = 0
+    hydrate_ms = 0.0
+    hydrate_calls = 0
+
     out_rows = []
     for m in matches:
         vid = str(m.get("id") or "")
@@ -240,17 +283,37 @@ def main():
             t = str(md.get("t") or "")
             kind = "submissions" if t == "s" else "comments" if t == "c" else ""
             cid = vid.split(":")[-1] if (t == "c" and ":" in vid) else ""
-            if sub and sid and kind:
-                p = _find_latest_02(args.staged_root, sub, kind, sid, args.lookback_days)
-                if p:
-                    row["excerpt"] = _excerpt_from_02(p, kind, cid if kind == "comments" else None, args.max_chars)
-                else:
-                    row["excerpt"] = ""
+            if hydrate_end is not None and time.monotonic() >= hydrate_end:
+                hydrate_missed += 1
+                row["excerpt"] = ""
+            elif sub and sid and kind:
+                t0 = time.perf_counter()
+                files = thread_files(args.staged_root, args.compact_root, sub, kind, sid, _iter_days(args.lookback_days))
+                catalog_ms += (time.perf_counter() - t0) * 1000
+                catalog_calls += 1
+                text = None
+                if files:
+                    t0 = time.perf_counter()
+                    # A part without the row (a comment newer than the compaction) moves on to the next older day.
+                    for p, compacted in files:
+                        text = _excerpt_from_02(p, kind, sid if compacted else None, cid if kind == "comments" else None, args.max_chars)
+                        if text is not None or not compacted:
+                            break
+                    hydrate_ms += (time.perf_counter() - t0) * 1000
+                    hydrate_calls += 1
+                row["excerpt"] = text or ""
             else:
                 row["excerpt"] = ""
 
         out_rows.append(row)
 
+    if hydrate_missed:
+        log_warn(f"stage=hydrate action=degrade reason=deadline missed={hydrate_missed} rows={len(out_rows)}")
+    if args.with_text:
+        trace.emit("catalog", catalog_ms, calls=catalog_calls)
+        trace.emit("hydrate", hydrate_ms, calls=hydrate_calls, missed=hydrate_missed)
+    trace.emit("total", (time.perf_counter() - t_start) * 1000, matches=len(out_rows))
+
     if args.format == "jsonl":
         for r in out_rows:
             sys.stdout.write(json.dumps(r, ensure_ascii=False) + "\n")
@@ -267,3 +330,4 @@ def main():
 
 if __name__ == "__main__":
     main()
+    hedge.exit_if_abandoned()
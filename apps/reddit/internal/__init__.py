@@ -0,0 +1 @@
+"""Modules shared by the reddit commands under apps/reddit/*/cmd."""
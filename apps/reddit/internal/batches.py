@@ -0,0 +1,12 @@
+"""Streaming DuckDB results."""
+
+def iter_batches(cur, n: int):
+    """Yield the rows of an executed DuckDB statement, fetching n at a time.
+
+    Only one batch of tuples is held at once, where fetchall would hold the whole result.
+    """
+    while True:
+        rows = cur.fetchmany(n)
+        if not rows:
+            return
+        yield from rows
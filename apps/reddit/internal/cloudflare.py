@@ -0,0 +1,6 @@
+"""Cloudflare API root for the Vectorize calls."""
+import os
+
+def api_base() -> str:
+    # CF_API_BASE points the Vectorize calls at a stand-in (scripts/bench/vectorizestub.py).
+    return (os.environ.get("CF_API_BASE") or "https://api.cloudflare.com/client/v4").rstrip("/")
@@ -0,0 +1,87 @@
+"""02c_compact days and their manifests.
+
+The compactor rewrites a 02_staged day ({root}/r_{sub}/{kind}/{y}/{md}/) as a few
+part files sorted by sid (comments: sid, comment_id), whole threads per part, and
+lists each part's sids, with the cap14 of the snapshot compacted, in _manifest.json.
+Readers pick the part for a sid from the manifest and filter on the sort keys, so
+DuckDB reads only the row groups that can hold the thread.
+"""
+import bisect
+import json
+import os
+import re
+
+RE_02 = re.compile(r"^(?P<hms>\d{6})_(?P<sid>[A-Za-z0-9]+)_(?P<cap14>\d{14})_(?P<h16>[0-9a-fA-F]+)\.parquet$")
+
+MANIFEST = "_manifest.json"
+MANIFEST_VERSION = 3
+
+def day_dirs(base: str, days):
+    """The (y, md) day directories under base, of days or of every day when days is None."""
+    if days is not None:
+        return [(y, md) for y, md in days if os.path.isdir(os.path.join(base, y, md))]
+    if not os.path.isdir(base):
+        return []
+    out = []
+    for y in sorted(os.listdir(base)):
+        yd = os.path.join(base, y)
+        if os.path.isdir(yd):
+            out += [(y, md) for md in sorted(os.listdir(yd)) if os.path.isdir(os.path.join(yd, md))]
+    return out
+
+def latest_per_sid(day_dir: str):
+    """Latest staged snapshot per thread, by capture time then name; returns {sid: (name, match)}."""
+    out = {}
+    for fn in sorted(os.listdir(day_dir)):
+        m = RE_02.match(fn)
+        if not m:
+            continue
+        prev = out.get(m.group("sid"))
+        if prev is None or (m.group("cap14"), fn) > (prev[1].group("cap14"), prev[0]):
+            out[m.group("sid")] = (fn, m)
+    return out
+
+def read_manifest(day_dir: str):
+    """Return the day manifest, or None when the day was never compacted."""
+    p = os.path.join(day_dir, MANIFEST)
+    try:
+        with open(p, "r", encoding="utf-8") as f:
+            doc = json.load(f)
+    except FileNotFoundError:
+        return None
+    if doc.get("version") != MANIFEST_VERSION:
+        return None
+    return doc
+
+def manifest_part(doc: dict, sid: str):
+    """(part file, cap14) for thread sid, or None when the day's compaction does not have it."""
+    for f in doc.get("files") or []:
+        if f["sid_min"] <= sid <= f["sid_max"]:
+            sids = f["sids"]
+            i = bisect.bisect_left(sids, sid)
+            return (f["name"], f["cap14s"][i]) if i < len(sids) and sids[i] == sid else None
+    return None
+
+def thread_files(staged_root: str, compact_root: str, sub: str, kind: str, sid: str, days):
+    """Files that may hold a thread's latest rows, newest day first, as (path, compacted).
+
+    A compacted day gives the part holding sid (rows must be filtered on sid). The
+    thread's latest 02_staged snapshot is used instead when the compaction lacks
+    the thread or the snapshot was captured after the compacted one, so staging
+    that runs ahead of 02c_compact is never hidden.
+    """
+    staged = os.path.join(staged_root, f"r_{sub}", kind)
+    compact = os.path.join(compact_root, f"r_{sub}", kind) if compact_root else ""
+    if days is None:
+        days = sorted(set(day_dirs(staged, None)) | set(day_dirs(compact, None) if compact else set()), reverse=True)
+    out = []
+    for y, md in days:
+        doc = read_manifest(os.path.join(compact, y, md)) if compact else None
+        part = manifest_part(doc, sid) if doc is not None else None
+        ddir = os.path.join(staged, y, md)
+        snap = latest_per_sid(ddir).get(sid) if os.path.isdir(ddir) else None
+        if snap is not None and (part is None or snap[1].group("cap14") > part[1]):
+            out.append((os.path.join(ddir, snap[0]), False))
+        elif part is not None:
+            out.append((os.path.join(compact, y, md, part[0]), True))
+    return out
@@ -0,0 +1,55 @@
+"""02b_extract outputs and the per-sub seq cursors its consumers keep.
+
+The extractor writes r_{sub}/{seq:08d}.parquet under the extract root, seqs
+increasing across runs; the indexer and uploader each keep a JSON file mapping
+sub to the last seq they finished and read the files after it.
+"""
+import json
+import os
+import re
+import sys
+
+from internal import profiling
+from internal.batches import iter_batches
+
+RE_EXTRACT = re.compile(r"^(?P<seq>\d{8})\.parquet$")
+
+def extract_files_after(extract_root: str, subs: list[str], cursor: dict):
+    """List 02b_extract outputs newer than the cursor as (sub, seq, path), oldest first."""
+    out = []
+    for sub in subs:
+        d = os.path.join(extract_root, f"r_{sub}")
+        if not os.path.isdir(d):
+            sys.stderr.write(f"[WARN] subreddit={sub} action=skip reason=missing_extract_dir path={d}\n")
+            sys.stderr.flush()
+            continue
+        for fn in os.listdir(d):
+            m = RE_EXTRACT.match(fn)
+            if m and int(m.group("seq")) > cursor.get(sub, 0):
+                out.append((sub, int(m.group("seq")), os.path.join(d, fn)))
+    out.sort(key=lambda x: (x[1], x[0]))
+    return out
+
+def iter_extract_rows(path: str, batch: int = 2048):
+    """Yield (vid, sub, t, sid, pid, h, text) from one 02b_extract file."""
+    con = profiling.duckdb_connect()
+    try:
+        yield from iter_batches(con.execute("SELECT vid, sub, t, sid, pid, h, text FROM read_parquet(?)", [path]), batch)
+    finally:
+        con.close()
+
+def cursor_load(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return {str(k): int(v) for k, v in json.load(f).items()}
+    except FileNotFoundError:
+        return {}
+
+def cursor_save(path: str, cursor: dict):
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cursor, f, sort_keys=True)
+    os.replace(tmp, path)
@@ -0,0 +1,144 @@
+"""--deadline-ms and --hedge for query and ask.
+
+Each stage may spend at most its share of the deadline. A hedged call fires a
+second copy once the first has run longer than the stage's p95, read from the
+latency samples kept in --latency-path.
+"""
+import json
+import math
+import os
+import queue
+import sys
+import threading
+import time
+
+from internal import profiling
+
+HEDGE_MIN_SAMPLES = 16
+LATENCY_KEEP = 256
+
+_THREADS: list[threading.Thread] = []
+
+def _log(level: str, msg: str):
+    sys.stderr.write(f"[{level}] {msg}\n")
+    sys.stderr.flush()
+
+def is_timeout(e: BaseException) -> bool:
+    return any("Timeout" in c.__name__ for c in type(e).__mro__)
+
+def stage_timeout_s(shares: dict, stage: str, deadline_at: float | None, deadline_ms: int, fallback_s: float | None) -> float | None:
+    """Seconds stage may run: what is left of the deadline, capped at its share; fallback_s without a deadline."""
+    if deadline_at is None:
+        return None if fallback_s is None else float(fallback_s)
+    left = deadline_at - time.monotonic()
+    share = shares.get(stage)
+    if share is not None:
+        left = min(left, deadline_ms * share / 1000.0)
+    return max(0.0, left)
+
+def lat_load(path: str) -> dict:
+    if not path:
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            j = json.load(f)
+    except Exception:
+        return {}
+    return j if isinstance(j, dict) else {}
+
+def lat_add(stats: dict, stage: str, took_s: float):
+    xs = stats.get(stage)
+    if not isinstance(xs, list):
+        xs = []
+    xs.append(round(took_s * 1000.0, 1))
+    stats[stage] = xs[-LATENCY_KEEP:]
+
+def lat_save(path: str, stats: dict):
+    if not path:
+        return
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(stats, f)
+    os.replace(tmp, path)
+
+def p95(xs: list[float]) -> float:
+    s = sorted(xs)
+    return s[min(len(s) - 1, max(0, math.ceil(0.95 * len(s)) - 1))]
+
+def delay_s(stats: dict, stage: str, fallback_ms: int) -> float:
+    """The stage's p95 latency, or fallback_ms until HEDGE_MIN_SAMPLES calls are recorded."""
+    xs = [float(x) for x in (stats.get(stage) or []) if isinstance(x, (int, float))]
+    if len(xs) >= HEDGE_MIN_SAMPLES:
+        return p95(xs) / 1000.0
+    return fallback_ms / 1000.0
+
+def hedged(stage: str, fn, timeout_s: float | None, hedge_delay_s: float | None, stats: dict):
+    """Run fn, firing a second copy after hedge_delay_s; first success wins. Returns (result, winner).
+
+    The winner's latency goes into stats[stage]. When the hedge wins, the primary's
+    time so far goes in too: it is a lower bound on a slow call, and leaving it out
+    would pull the p95 that sets the hedge delay down to the fast copies.
+
+    Raises TimeoutError when neither copy succeeds within timeout_s; a None
+    timeout_s waits for the copies however long they take.
+    """
+    q: queue.Queue = queue.Queue()
+    t0 = time.monotonic()
+
+    def run(tag: str):
+        t1 = time.monotonic()
+        try:
+            q.put((tag, None, fn(), time.monotonic() - t1))
+        except Exception as e:
+            q.put((tag, e, None, time.monotonic() - t1))
+
+    def launch(tag: str):
+        th = threading.Thread(target=run, args=(tag,), daemon=True)
+        _THREADS.append(th)
+        th.start()
+
+    launch("primary")
+    inflight = 1
+    hedged = hedge_delay_s is None or (timeout_s is not None and hedge_delay_s >= timeout_s)
+    last_err = None
+    while inflight > 0:
+        elapsed = time.monotonic() - t0
+        left = None if timeout_s is None else timeout_s - elapsed
+        if left is not None and left <= 0:
+            break
+        wait = left
+        if not hedged:
+            to_hedge = max(0.0, hedge_delay_s - elapsed)
+            wait = to_hedge if left is None else min(left, to_hedge)
+        try:
+            tag, err, res, took = q.get(timeout=wait)
+        except queue.Empty:
+            if not hedged and time.monotonic() - t0 >= hedge_delay_s:
+                _log("INFO", f"hedge stage={stage} action=fire delay_ms={hedge_delay_s * 1000:.0f}")
+                launch("hedge")
+                inflight += 1
+                hedged = True
+            continue
+        inflight -= 1
+        if err is None:
+            lat_add(stats, stage, took)
+            if tag == "hedge":
+                _log("INFO", f"hedge stage={stage} action=win took_ms={took * 1000:.0f}")
+                lat_add(stats, stage, time.monotonic() - t0)
+            return res, tag
+        last_err = err
+        if inflight == 0 and (timeout_s is None or not is_timeout(err)):
+            raise err
+    raise TimeoutError(f"deadline stage={stage} timeout_s={timeout_s:.3f} err={last_err}")
+
+def exit_if_abandoned(code: int = 0):
+    # Losing hedges and timed-out calls keep running in daemon threads; tearing the
+    # interpreter down underneath them can abort, so skip finalization instead.
+    if any(th.is_alive() for th in _THREADS):
+        profiling.finish()
+        sys.stdout.flush()
+        sys.stderr.flush()
+        os._exit(code)
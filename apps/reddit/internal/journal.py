@@ -0,0 +1,49 @@
+"""Change journals: the contract between the reddit pipeline stages.
+
+A stage appends (sub, kind, relpath) for everything it wrote to _journal.sqlite
+under its output root. A downstream stage keeps, in its own state database, the
+last journal seq it consumed per (source, sub) and reads the entries after it;
+with no cursor yet it scans its input once and starts from journal_head().
+"""
+import sqlite3
+import time
+
+def journal_open(path) -> sqlite3.Connection:
+    con = sqlite3.connect(str(path), timeout=30.0)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute(
+        "CREATE TABLE IF NOT EXISTS journal ("
+        "seq INTEGER PRIMARY KEY AUTOINCREMENT, at REAL NOT NULL, sub TEXT NOT NULL, kind TEXT NOT NULL, relpath TEXT NOT NULL)"
+    )
+    con.execute("CREATE INDEX IF NOT EXISTS journal_sub_seq ON journal (sub, seq)")
+    con.commit()
+    return con
+
+def journal_append(con: sqlite3.Connection, entries):
+    """Append (sub, kind, relpath) entries and commit."""
+    now = time.time()
+    rows = [(now, sub, kind, rel) for sub, kind, rel in entries]
+    if not rows:
+        return
+    con.executemany("INSERT INTO journal (at, sub, kind, relpath) VALUES (?, ?, ?, ?)", rows)
+    con.commit()
+
+def journal_head(con: sqlite3.Connection) -> int:
+    return con.execute("SELECT coalesce(max(seq), 0) FROM journal").fetchone()[0]
+
+def journal_since(con: sqlite3.Connection, sub: str, after: int):
+    return con.execute("SELECT seq, kind, relpath FROM journal WHERE sub = ? AND seq > ? ORDER BY seq", [sub, after]).fetchall()
+
+def cursor_init(con: sqlite3.Connection):
+    """Create the journal_cursor table in a consumer's state database."""
+    con.execute(
+        "CREATE TABLE IF NOT EXISTS journal_cursor ("
+        "source TEXT NOT NULL, sub TEXT NOT NULL, seq INTEGER NOT NULL, PRIMARY KEY (source, sub)) WITHOUT ROWID"
+    )
+
+def cursor_get(con: sqlite3.Connection, source: str, sub: str):
+    row = con.execute("SELECT seq FROM journal_cursor WHERE source = ? AND sub = ?", [source, sub]).fetchone()
+    return None if row is None else row[0]
+
+def cursor_set(con: sqlite3.Connection, source: str, sub: str, seq: int):
+    con.execute("INSERT OR REPLACE INTO journal_cursor VALUES (?, ?, ?)", [source, sub, seq])
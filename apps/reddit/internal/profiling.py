@@ -0,0 +1,192 @@
+"""--profile for the reddit commands.
+
+cpu: cProfile of the main thread (cpu.prof, cpu.txt). mem: tracemalloc and RSS at
+stage boundaries (mem.jsonl). duckdb: DuckDB's JSON profile of every statement.
+With mode none (the default) every call here is a no-op and duckdb_connect returns
+a plain connection; the module imports only the standard library.
+"""
+import atexit
+import datetime as dt
+import json
+import os
+import sys
+import threading
+import time
+
+TOP = 15
+
+_STATE = {"mode": "none", "dir": "", "t0": 0.0, "cpu": None, "cons": [], "con_seq": 0, "stmt_seq": 0, "mem_hwm": 0, "done": False}
+_LOCK = threading.Lock()
+
+def _log(level: str, msg: str):
+    sys.stderr.write(f"[{level}] {msg}\n")
+    sys.stderr.flush()
+
+def start(stage: str, mode: str, root: str):
+    """Start profiling; outputs go to {root}/{stage}_{utc timestamp}_{pid}/."""
+    if mode == "none":
+        return
+    run_dir = os.path.join(root, f"{stage}_{dt.datetime.now(dt.UTC).strftime('%Y%m%dT%H%M%SZ')}_{os.getpid()}")
+    os.makedirs(run_dir, exist_ok=True)
+    _STATE.update(mode=mode, dir=run_dir, t0=time.monotonic())
+    if mode == "cpu":
+        import cProfile
+
+        _STATE["cpu"] = cProfile.Profile()
+        _STATE["cpu"].enable()
+    elif mode == "mem":
+        import tracemalloc
+
+        tracemalloc.start()
+    elif mode == "duckdb":
+        _log("WARN", "profile mode=duckdb fetchone/fetchall results are read whole; fetchmany streams are profiled only when read to the end")
+    atexit.register(finish)
+    _log("INFO", f"profile mode={mode} dir={run_dir}")
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1048576, 1)
+    except Exception:
+        return -1.0
+
+def mark(stage: str):
+    """With mode mem, append RSS and traced memory to mem.jsonl.
+
+    The largest live allocation sites are added when traced memory reaches a new
+    high (a snapshot costs about a second on a large heap) and at the end.
+    """
+    if _STATE["mode"] != "mem" or _STATE["done"]:
+        return
+    import resource
+    import tracemalloc
+
+    cur, peak = tracemalloc.get_traced_memory()
+    top = None
+    if stage == "end" or peak > _STATE["mem_hwm"] * 1.1:
+        _STATE["mem_hwm"] = max(_STATE["mem_hwm"], peak)
+        top = [
+            {"at": f"{s.traceback[0].filename}:{s.traceback[0].lineno}", "kb": round(s.size / 1024, 1), "count": s.count}
+            for s in tracemalloc.take_snapshot().statistics("lineno")[:TOP]
+        ]
+    tracemalloc.reset_peak()
+    rec = {
+        "t_s": round(time.monotonic() - _STATE["t0"], 3),
+        "stage": stage,
+        "rss_mb": rss_mb(),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "traced_mb": round(cur / 1048576, 2),
+        "traced_peak_mb": round(peak / 1048576, 2),
+    }
+    if top is not None:
+        rec["top"] = top
+    with _LOCK:
+        with open(os.path.join(_STATE["dir"], "mem.jsonl"), "a", encoding="utf-8") as f:
+            f.write(json.dumps(rec) + "\n")
+
+def finish():
+    if _STATE["mode"] == "none" or _STATE["done"]:
+        return
+    mark("end")
+    _STATE["done"] = True
+    if _STATE["mode"] == "cpu":
+        import io
+        import pstats
+
+        prof = _STATE["cpu"]
+        prof.disable()
+        prof.dump_stats(os.path.join(_STATE["dir"], "cpu.prof"))
+        buf = io.StringIO()
+        pstats.Stats(prof, stream=buf).sort_stats("cumulative").print_stats(TOP * 3)
+        with open(os.path.join(_STATE["dir"], "cpu.txt"), "w", encoding="utf-8") as f:
+            f.write(buf.getvalue())
+    for con in list(_STATE["cons"]):
+        con.keep()
+    _log("INFO", f"profile done mode={_STATE['mode']} dir={_STATE['dir']} wall_s={time.monotonic() - _STATE['t0']:.2f}")
+
+class ProfiledResult:
+    """A statement's result that lets DuckDB finish the statement, so its profile gets written.
+
+    fetchmany streams as it would unprofiled (the profile appears once the last
+    batch is read); fetchone and fetchall read the rest of the result first, since
+    a LIMIT 1 read with fetchone would otherwise never finish.
+    """
+
+    def __init__(self, cur):
+        self.description = cur.description
+        self._cur = cur
+        self._rows = None
+        self._i = 0
+
+    def _drain(self):
+        if self._rows is None:
+            self._rows = self._cur.fetchall()
+
+    def fetchone(self):
+        self._drain()
+        if self._i >= len(self._rows):
+            return None
+        self._i += 1
+        return self._rows[self._i - 1]
+
+    def fetchmany(self, size: int = 1):
+        if self._rows is None:
+            return self._cur.fetchmany(size)
+        out = self._rows[self._i : self._i + size]
+        self._i += len(out)
+        return out
+
+    def fetchall(self):
+        self._drain()
+        out = self._rows[self._i :]
+        self._i = len(self._rows)
+        return out
+
+class ProfiledDuckDB:
+    """DuckDB connection that keeps the JSON profile of every statement it runs.
+
+    DuckDB rewrites profiling_output for every statement, so the file is moved
+    aside before the next statement and on close.
+    """
+
+    def __init__(self, con):
+        with _LOCK:
+            _STATE["con_seq"] += 1
+            self._out = os.path.join(_STATE["dir"], f".pending_{_STATE['con_seq']}.json")
+            _STATE["cons"].append(self)
+        self._con = con
+        con.execute("PRAGMA enable_profiling='json'")
+        out_sql = self._out.replace("'", "''")
+        con.execute(f"PRAGMA profiling_output='{out_sql}'")
+
+    def keep(self):
+        if not os.path.exists(self._out):
+            return
+        with _LOCK:
+            _STATE["stmt_seq"] += 1
+            seq = _STATE["stmt_seq"]
+        os.replace(self._out, os.path.join(_STATE["dir"], f"duckdb_{seq:06d}.json"))
+
+    def execute(self, *args, **kwargs):
+        self.keep()
+        return ProfiledResult(self._con.execute(*args, **kwargs))
+
+    def executemany(self, *args, **kwargs):
+        self.keep()
+        return self._con.executemany(*args, **kwargs)
+
+    def close(self):
+        self.keep()
+        with _LOCK:
+            if self in _STATE["cons"]:
+                _STATE["cons"].remove(self)
+        self._con.close()
+
+    def __getattr__(self, name):
+        return getattr(self._con, name)
+
+def duckdb_connect():
+    import duckdb
+
+    con = duckdb.connect(database=":memory:")
+    return ProfiledDuckDB(con) if _STATE["mode"] == "duckdb" else con
@@ -0,0 +1,32 @@
+"""Per-stage timing spans for query and ask.
+
+Each span is one JSON line ({ts, trace, cmd, stage, ms, ...}) appended to
+--trace-path and, with --trace true, also written to stderr as "[TRACE] {json}".
+scripts/tools/trace_summary.py reads either.
+"""
+import json
+import os
+import sys
+import time
+
+from internal import profiling
+
+_STATE = {"id": "", "cmd": "", "path": "", "stderr": False}
+
+def init(cmd: str, path: str, to_stderr: bool):
+    _STATE.update(id=os.urandom(6).hex(), cmd=cmd, path=path, stderr=to_stderr)
+    d = os.path.dirname(path) if path else ""
+    if d:
+        os.makedirs(d, exist_ok=True)
+
+def emit(stage: str, ms: float, **attrs):
+    rec = {"ts": round(time.time(), 3), "trace": _STATE["id"], "cmd": _STATE["cmd"], "stage": stage, "ms": round(ms, 3)}
+    rec.update(attrs)
+    line = json.dumps(rec, ensure_ascii=False)
+    if _STATE["stderr"]:
+        sys.stderr.write(f"[TRACE] {line}\n")
+        sys.stderr.flush()
+    if _STATE["path"]:
+        with open(_STATE["path"], "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    profiling.mark(stage)
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+import argparse
+import datetime as dt
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+import duckdb
+
+# apps/reddit, so the modules shared by the reddit commands import as internal.*.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from internal.journal import journal_append, journal_open
+
+RE_RAW = re.compile(r"^(?P<cap14>[^_]+)_(?P<hash>[^.]+)\.jsonl$")
+RE_CAP14 = re.compile(r"^\d{14}$")
+
+# Output columns and row filters of the 01_parquet layout.
+KINDS = {
+    "submissions": {
+        "read": {"author": "VARCHAR", "selftext": "VARCHAR", "title": "VARCHAR"},
+        "select": "coalesce(author, '') AS author, coalesce(selftext, '') AS body, coalesce(title, '') AS title",
+        "cols": "author, body, title",
+        "filter": "QUALIFY row_number() OVER (PARTITION BY filename ORDER BY i) = 1",
+    },
+    "comments": {
+        "read": {"author": "VARCHAR", "body": "VARCHAR", "id": "VARCHAR", "parent_id": "VARCHAR"},
+        "select": "coalesce(author, '') AS author, coalesce(body, '') AS body, coalesce(id, '') AS comment_id, coalesce(parent_id, '') AS parent_id",
+        "cols": "author, body, comment_id, parent_id",
+        "filter": "WHERE id IS NOT NULL",
+    },
+}
+
+def log_info(msg: str):
+    sys.stderr.write(f"[INFO] {msg}\n")
+    sys.stderr.flush()
+
+def log_warn(msg: str):
+    sys.stderr.write(f"[WARN] {msg}\n")
+    sys.stderr.flush()
+
+def log_error(msg: str):
+    sys.stderr.write(f"[ERROR] {msg}\n")
+    sys.stderr.flush()
+
+def _iter_days(lookback_days: int):
+    today = dt.datetime.now(dt.UTC).date()
+    if lookback_days <= 0:
+        return None
+    out = []
+    for i in range(lookback_days + 1):
+        d = today - dt.timedelta(days=i)
+        out.append((str(d.year), f"{d.month:02d}{d.day:02d}"))
+    return out
+
+def _esc(s: str) -> str:
+    return s.replace("'", "''")
+
+def _state_open(path: str) -> sqlite3.Connection:
+    con = sqlite3.connect(path, timeout=5.0)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("CREATE TABLE IF NOT EXISTS convert_dirs (relpath TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL) WITHOUT ROWID")
+    con.commit()
+    return con
+
+def _thread_dirs(in_root: str, days):
+    """Thread dirs under r_{sub}/{kind}, limited to the lookback days when given."""
+    if days is None:
+        day_dirs = []
+        for y in sorted(os.listdir(in_root)):
+            yd = os.path.join(in_root, y)
+            if os.path.isdir(yd):
+                day_dirs += [os.path.join(yd, md) for md in sorted(os.listdir(yd))]
+    else:
+        day_dirs = [os.path.join(in_root, y, md) for y, md in days]
+    out = []
+    for d in day_dirs:
+        if not os.path.isdir(d):
+            continue
+        with os.scandir(d) as it:
+            out += sorted(e.path for e in it if e.is_dir())
+    return out
+
+def _copy_sql(kind: str, src: str, out: str, copy_opts: str, partitioned: bool) -> str:
+    """One COPY over the raw files listed in temp table m (filename, k) or a single file.
+
+    Rows keep their file order through row_number() over the scan, which
+    DuckDB emits in insertion order.
+    """
+    spec = KINDS[kind]
+    cols = ", ".join(f"{c}: '{t}'" for c, t in spec["read"].items())
+    scan = f"read_json({src}, format='newline_delimited', filename=true, columns={{{cols}}})"
+    if partitioned:
+        return (
+            f"COPY (SELECT k, {spec['cols']} FROM ("
+            f"SELECT m.k, r.i, {spec['select']} FROM (SELECT *, row_number() OVER () AS i FROM {scan}) r "
+            f"JOIN m USING (filename) {spec['filter']}) ORDER BY k, i) "
+            f"TO '{_esc(out)}' ({copy_opts}, PARTITION_BY (k), FILENAME_PATTERN 'data')"
+        )
+    return (
+        f"COPY (SELECT {spec['cols']} FROM ("
+        f"SELECT r.i, {spec['select']} FROM (SELECT *, row_number() OVER () AS i FROM {scan}) r {spec['filter']}) ORDER BY i) "
+        f"TO '{_esc(out)}' ({copy_opts})"
+    )
+
+class Converter:
+    """Converts queued raw files with one partitioned COPY per batch on a long-lived connection."""
+
+    def __init__(self, con, parquet_root: str, copy_opts: str, batch_size: int):
+        self.con = con
+        self.parquet_root = parquet_root
+        self.tmp_root = parquet_root
+        self.copy_opts = copy_opts
+        self.batch_size = batch_size
+        self.queue = {"submissions": [], "comments": []}
+        self.wrote = 0
+        self.failed = []
+
+    def add(self, kind: str, src: str, out: str, meta: str):
+        q = self.queue[kind]
+        q.append((src, out, meta))
+        if len(q) >= self.batch_size:
+            self.flush(kind)
+
+    def flush(self, kind: str):
+        items = self.queue[kind]
+        self.queue[kind] = []
+        if not items:
+            return
+        tmp = tempfile.mkdtemp(prefix=".convert_", dir=self.tmp_root)
+        try:
+            try:
+                # A SQL list literal; binding thousands of Python strings costs more than the COPY.
+                srcs = "[" + ", ".join(f"'{_esc(src)}'" for src, _, _ in items) + "]"
+                # Two unnests in one SELECT zip, so k is each file's position in the batch.
+                self.con.execute(f"CREATE OR REPLACE TEMP TABLE m AS SELECT unnest({srcs}) AS filename, unnest(range({len(items)})) AS k")
+                self.con.execute(_copy_sql(kind, srcs, os.path.join(tmp, "out"), self.copy_opts, True))
+            except duckdb.Error as e:
+                if len(items) == 1:
+                    self._fail(items[0], e)
+                    return
+                log_warn(f"kind={kind} action=retry scope=file files={len(items)} reason=batch_error err={str(e).splitlines()[0]}")
+                for it in items:
+                    self._one(kind, it, tmp)
+                return
+            for k, it in enumerate(items):
+                src, out, meta = it
+                part = os.path.join(tmp, "out", f"k={k}")
+                names = os.listdir(part) if os.path.isdir(part) else []
+                if len(names) == 1:
+                    self._publish(os.path.join(part, names[0]), it)
+                else:
+                    # No partition means no rows (e.g. no comment ids); write it
+                    # on its own so the empty file exists as before.
+                    self._one(kind, it, tmp)
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def _one(self, kind: str, it, tmp: str):
+        src, out, meta = it
+        one = os.path.join(tmp, f"one_{os.path.basename(out)}")
+        try:
+            self.con.execute(_copy_sql(kind, f"'{_esc(src)}'", one, self.copy_opts, False))
+        except duckdb.Error as e:
+            self._fail(it, e)
+            return
+        self._publish(one, it)
+
+    def _publish(self, path: str, it):
+        src, out, meta = it
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+        try:
+            os.link(path, out)
+        except FileExistsError:
+            log_info(f"{meta} action=skip scope=file reason=exists out={os.path.basename(out)}")
+            return
+        self.wrote += 1
+        log_info(f"{meta} action=write out={os.path.basename(out)}")
+
+    def _fail(self, it, e):
+        src, out, meta = it
+        log_error(f"{meta} action=fail reason=duckdb_error err={str(e).splitlines()[0]}")
+        self.failed.append(src)
+
+def _convert_kind(conv: Converter, state, journal, raw_root: str, parquet_root: str, sub: str, kind: str, days, rescan: bool, totals: dict):
+    in_root = os.path.join(raw_root, f"r_{sub}", kind)
+    if not os.path.isdir(in_root):
+        log_warn(f"subreddit={sub} kind={kind} missing_dir path={in_root}")
+        return
+    threads = files = skipped = unchanged = bad = 0
+    wrote0 = conv.wrote
+    seen = []
+    touched = []
+    for td in _thread_dirs(in_root, days):
+        threads += 1
+        rel = os.path.relpath(td, raw_root)
+        try:
+            mtime_ns = os.stat(td).st_mtime_ns
+        except FileNotFoundError:
+            continue
+        if not rescan:
+            row = state.execute("SELECT mtime_ns FROM convert_dirs WHERE relpath = ?", [rel]).fetchone()
+            if row is not None and row[0] == mtime_ns:
+                unchanged += 1
+                continue
+        y, md, thread = rel.split(os.sep)[-3:]
+        out_dir = os.path.join(parquet_root, f"r_{sub}", kind, y, md, thread)
+        touched.append((rel, out_dir))
+        have = set(os.listdir(out_dir)) if os.path.isdir(out_dir) else set()
+        ok = True
+        for fn in sorted(os.listdir(td)):
+            m = RE_RAW.match(fn)
+            if not m:
+                continue
+            files += 1
+            cap14 = m.group("cap14")
+            meta = f"subreddit={sub} kind={kind} thread={y}/{md}/{thread} file={fn}"
+            if not RE_CAP14.match(cap14):
+                log_error(f"{meta} action=fail reason=bad_capture_ts capture={cap14}")
+                bad += 1
+                ok = False
+                continue
+            name = f"{cap14}_{m.group('hash')[:16]}.parquet"
+            if name in have:
+                skipped += 1
+                continue
+            conv.add(kind, os.path.join(td, fn), os.path.join(out_dir, name), meta)
+        if ok:
+            seen.append((rel, mtime_ns))
+    conv.flush(kind)
+    if conv.failed:
+        failed_dirs = {os.path.relpath(os.path.dirname(p), raw_root) for p in conv.failed}
+        seen = [s for s in seen if s[0] not in failed_dirs]
+    # Every dir looked at is journaled, not just the ones with new files: a crash
+    # between the COPY and this point leaves outputs the rerun finds "existing".
+    journal_append(journal, [(sub, kind, rel) for rel, out_dir in touched if os.path.isdir(out_dir)])
+    # Dirs are marked only once their files are on disk and journaled, so a crash rescans them.
+    state.executemany("INSERT OR REPLACE INTO convert_dirs VALUES (?, ?)", seen)
+    state.commit()
+    wrote = conv.wrote - wrote0
+    totals["threads"] += threads
+    totals["files"] += files
+    totals["wrote"] += wrote
+    totals["skipped"] += skipped
+    totals["unchanged"] += unchanged
+    totals["bad"] += bad
+    log_info(f"subreddit={sub} kind={kind} stats threads={threads} unchanged_threads={unchanged} files={files} wrote={wrote} skipped={skipped}")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--raw-root", required=True)
+    ap.add_argument("--parquet-root", required=True)
+    ap.add_argument("--lookback-days", type=int, required=True)
+    ap.add_argument("--compression", default="zstd")
+    ap.add_argument("--compression-level", type=int, default=22, help="zstd level (0 = DuckDB default)")
+    ap.add_argument("--duckdb-threads", type=int, default=0)
+    ap.add_argument("--batch-size", type=int, default=2048, help="raw files per COPY statement")
+    ap.add_argument("--rescan", choices=["true", "false"], default="false", help="list every thread dir, ignoring recorded mtimes")
+    ap.add_argument("--sub", action="append", default=[])
+    args = ap.parse_args()
+
+    if not re.fullmatch(r"[A-Za-z0-9_]+", args.compression):
+        log_error(f"bad compression={args.compression}")
+        return 2
+    copy_opts = f"FORMAT parquet, COMPRESSION '{args.compression}'"
+    if args.compression.lower() == "zstd" and args.compression_level > 0:
+        copy_opts += f", COMPRESSION_LEVEL {args.compression_level}"
+
+    os.makedirs(args.parquet_root, exist_ok=True)
+    state = _state_open(os.path.join(args.parquet_root, "_convert_state.sqlite"))
+    journal = journal_open(os.path.join(args.parquet_root, "_journal.sqlite"))
+    con = duckdb.connect(database=":memory:")
+    if args.duckdb_threads > 0:
+        con.execute(f"SET threads={args.duckdb_threads}")
+    conv = Converter(con, args.parquet_root, copy_opts, max(1, args.batch_size))
+
+    days = _iter_days(args.lookback_days)
+    totals = {"threads": 0, "files": 0, "wrote": 0, "skipped": 0, "unchanged": 0, "bad": 0}
+    t0 = time.monotonic()
+    for sub in args.sub:
+        log_info(f"subreddit={sub} begin")
+        if not os.path.isdir(os.path.join(args.raw_root, f"r_{sub}")):
+            log_warn(f"subreddit={sub} skip reason=no_raw_dir path={os.path.join(args.raw_root, f'r_{sub}')}")
+            continue
+        # Scratch dirs live per subreddit, so runs for different subs can share the root.
+        conv.tmp_root = os.path.join(args.parquet_root, f"r_{sub}")
+        os.makedirs(conv.tmp_root, exist_ok=True)
+        for d in os.listdir(conv.tmp_root):
+            if d.startswith(".convert_"):
+                shutil.rmtree(os.path.join(conv.tmp_root, d), ignore_errors=True)
+        for kind in ("submissions", "comments"):
+            _convert_kind(conv, state, journal, args.raw_root, args.parquet_root, sub, kind, days, args.rescan == "true", totals)
+        log_info(f"subreddit={sub} end")
+    con.close()
+    state.close()
+    journal.close()
+
+    elapsed = time.monotonic() - t0
+    failed = len(conv.failed) + totals["bad"]
+    log_info(
+        f"done totals threads={totals['threads']} unchanged_threads={totals['unchanged']} files={totals['files']} "
+        f"wrote={totals['wrote']} skipped={totals['skipped']} failed={failed} elapsed_s={elapsed:.1f} "
+        f"files_per_s={totals['wrote'] / max(elapsed, 1e-9):.1f}"
+    )
+    return 2 if failed else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,20 +1,50 @@
 #!/usr/bin/env python3
 import argparse
+import bisect
 import datetime as dt
+import gzip
 import hashlib
+import json
 import os
-import random
 import re
+import sqlite3
+import struct
 import sys
+import threading
 import time
+import zlib
+from array import array
+from concurrent.futures import ThreadPoolExecutor
 
-import duckdb
 import boto3
 from botocore.config import Config
 from botocore.exceptions import ClientError
 
+# apps/reddit, so the modules shared by the reddit commands import as internal.*.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from internal import profiling
+from internal.batches import iter_batches
+from internal.extract import cursor_load, cursor_save, extract_files_after, iter_extract_rows
+
 RE_02 = re.compile(r"^(?P<hms>\d{6})_(?P<sid>[A-Za-z0-9]+)_(?P<cap14>\d{14})_(?P<h16>[0-9a-fA-F]+)\.parquet$")
 
+# Reddit ids are base36, so listings are sharded on the first character of the id.
+ID_SHARDS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+# str.strip()'s whitespace set, so trim() in SQL strips exactly what Python would
+# and the text hashes (and so the object keys) stay the same.
+STRIP_CHARS = "\t\n\x0b\x0c\r\x1c\x1d\x1e\x1f \x85\xa0\u1680\u2000\u2001\u2002\u2003\u2004\u2005\u2006\u2007\u2008\u2009\u200a\u2028\u2029\u202f\u205f\u3000"
+COMMENT_BATCH_ROWS = 2048
+
+# Bundle layout: zlib blocks, then a zlib JSON index, then a fixed trailer
+# (index offset u64, index length u32, magic), all little-endian.
+BUNDLE_MAGIC = b"TDB1"
+BUNDLE_TRAILER = struct.Struct("<QI4s")
+
+TEXT_PUT = {"ContentType": "text/plain; charset=utf-8"}
+BUNDLE_PUT = {"ContentType": "application/vnd.teidaishu.bundle"}
+
 def log_info(msg: str):
     sys.stderr.write(f"[INFO] {msg}\n")
     sys.stderr.flush()
@@ -41,7 +71,7 @@ def _sha16(s: str) -> str:
     return hashlib.sha256(s.encode("utf-8", errors="ignore")).hexdigest()[:16]
 
 def _read_submission_row(path: str):
-    con = duckdb.connect(database=":memory:")
+    con = profiling.duckdb_connect()
     rows = con.execute(
         "SELECT coalesce(author,''), coalesce(title,''), coalesce(body,'') FROM read_parquet(?) LIMIT 1",
         [path],
@@ -51,15 +81,36 @@ def _read_submission_row(path: str):
         return None
     return rows[0]
 
-def _read_comment_rows(path: str):
-    con = duckdb.connect(database=":memory:")
-    rows = con.execute(
-        "SELECT coalesce(comment_id,''), coalesce(parent_id,''), coalesce(author,''), coalesce(body,'') "
-        "FROM read_parquet(?) WHERE comment_id IS NOT NULL",
-        [path],
-    ).fetchall()
-    con.close()
-    return rows
+def _submission_text(path: str, max_chars: int) -> str:
+    row = _read_submission_row(path)
+    if row is None:
+        return ""
+    author, title, body = row
+    text = (title or "").strip()
+    b = (body or "").strip()
+    if b:
+        text = f"{text}\n\n{b}" if text else b
+    if len(text) > max_chars:
+        text = text[:max_chars]
+    return text
+
+def _iter_comment_texts(path: str, max_chars: int, batch: int = COMMENT_BATCH_ROWS):
+    """Yield (cid, text, h) for the non-empty comments of a 02_staged file.
+
+    Stripping, truncation to max_chars and the sha16 run in DuckDB, and rows are
+    fetched a batch at a time, so a megathread never sits in memory as tuples.
+    """
+    con = profiling.duckdb_connect()
+    try:
+        cur = con.execute(
+            "WITH c AS (SELECT comment_id, trim(coalesce(body,''), ?) AS body FROM read_parquet(?) WHERE comment_id IS NOT NULL), "
+            "t AS (SELECT comment_id, left(body, ?) AS text FROM c WHERE body <> '') "
+            "SELECT comment_id, text, left(sha256(text), 16) FROM t",
+            [STRIP_CHARS, path, max_chars],
+        )
+        yield from iter_batches(cur, batch)
+    finally:
+        con.close()
 
 def _norm_prefix(p: str) -> str:
     p = (p or "").strip().strip("/")
@@ -70,7 +121,47 @@ def _key_for(typ: str, sub: str, sid_or_cid: str, h: str, prefix: str) -> str:
     base = f"r/{typ}/{sub}/{sid_or_cid}/{h}.txt"
     return f"{prefix}/{base}" if prefix else base
 
-def _mk_s3():
+def _bundle_key(sub: str, sid: str, prefix: str) -> str:
+    prefix = _norm_prefix(prefix)
+    base = f"r/b/{sub}/{sid}.tdb"
+    return f"{prefix}/{base}" if prefix else base
+
+def _encode_bundle(sub: str, sid: str, entries, block_bytes: int) -> bytes:
+    """Pack (t, id, h, text) entries into one bundle object.
+
+    Texts are cut into blocks of about block_bytes and each block is compressed on
+    its own, so a single entry costs one range read of its block. Index entries are
+    [t, id, h, block, offset, length] with offset/length in decompressed bytes.
+    The encoding is deterministic, so an unchanged thread produces the same ETag.
+    """
+    out = bytearray()
+    raw = bytearray()
+    blocks = []
+    index = []
+
+    def cut():
+        if raw:
+            c = zlib.compress(bytes(raw), 6)
+            blocks.append([len(out), len(c), len(raw)])
+            out.extend(c)
+            raw.clear()
+
+    for t, eid, h, text in entries:
+        b = text.encode("utf-8")
+        if raw and len(raw) + len(b) > block_bytes:
+            cut()
+        index.append([t, eid, h, len(blocks), len(raw), len(b)])
+        raw.extend(b)
+    cut()
+
+    doc = {"v": 1, "sub": sub, "sid": sid, "codec": "zlib", "blocks": blocks, "entries": index}
+    idx = zlib.compress(json.dumps(doc, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), 6)
+    off = len(out)
+    out.extend(idx)
+    out.extend(BUNDLE_TRAILER.pack(off, len(idx), BUNDLE_MAGIC))
+    return bytes(out)
+
+def _mk_s3(pool_size: int = 10):
     ak = os.environ.get("R2_ACCESS_KEY_ID", "")
     sk = os.environ.get("R2_SECRET_ACCESS_KEY", "")
     if not ak or not sk:
@@ -86,7 +177,11 @@ def _mk_s3():
         log_error("missing R2_ENDPOINT (or CF_ACCOUNT_ID to derive endpoint)")
         raise SystemExit(2)
 
-    cfg = Config(signature_version="s3v4", retries={"max_attempts": 3, "mode": "standard"})
+    cfg = Config(
+        signature_version="s3v4",
+        retries={"max_attempts": 3, "mode": "standard"},
+        max_pool_connections=max(10, pool_size),
+    )
     return boto3.client(
         "s3",
         endpoint_url=endpoint,
@@ -96,48 +191,468 @@ def _mk_s3():
         config=cfg,
     ), endpoint
 
-def _exists(s3, bucket: str, key: str) -> bool:
+def _exists(s3, bucket: str, key: str, etag: str = "") -> bool:
     try:
-        s3.head_object(Bucket=bucket, Key=key)
-        return True
+        r = s3.head_object(Bucket=bucket, Key=key)
+        return not etag or str(r.get("ETag") or "").strip('"') == etag
     except ClientError as e:
         code = str(e.response.get("Error", {}).get("Code", ""))
         if code in ("404", "NoSuchKey", "NotFound"):
             return False
         raise
 
-def _put_text(s3, bucket: str, key: str, text: str):
-    s3.put_object(
-        Bucket=bucket,
-        Key=key,
-        Body=text.encode("utf-8"),
-        ContentType="text/plain; charset=utf-8",
+def _key_fp(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "little")
+
+def _shard_of(key: str, prefix: str) -> str:
+    p = _norm_prefix(prefix)
+    rel = key[len(p) + 1 :] if p else key
+    parts = rel.split("/", 4)
+    if len(parts) < 4 or not parts[3]:
+        return ""
+    return f"{key[: len(key) - len(rel)]}r/{parts[1]}/{parts[2]}/{parts[3][0]}"
+
+def _list_shard(s3, bucket: str, shard: str, budget: int, with_etag: bool = False):
+    """List every key under shard into an array of 64-bit fingerprints.
+
+    With with_etag the fingerprint covers "key|etag", so rewritten objects under a
+    stable key do not count as present. Returns None when the shard holds more
+    than budget keys.
+    """
+    out = array("Q")
+    pages = 0
+    paginator = s3.get_paginator("list_objects_v2")
+    for page in paginator.paginate(Bucket=bucket, Prefix=shard, PaginationConfig={"PageSize": 1000}):
+        pages += 1
+        for o in page.get("Contents") or []:
+            k = o["Key"]
+            if with_etag:
+                etag = str(o.get("ETag") or "").strip('"')
+                k = f"{k}|{etag}"
+            out.append(_key_fp(k))
+        if budget > 0 and len(out) > budget:
+            return None, pages
+    return out, pages
+
+def _list_existing(s3, bucket: str, prefix: str, subs: list[str], concurrency: int, max_keys: int, types=("s", "c"), with_etag: bool = False):
+    """Build a sorted fingerprint array of existing keys for the given subs.
+
+    Shards that fail to list or would exceed max_keys are returned as ambiguous;
+    keys in them fall back to per-key HEAD.
+    """
+    p = _norm_prefix(prefix)
+    shards = []
+    for sub in subs:
+        for typ in types:
+            base = f"r/{typ}/{sub}/"
+            base = f"{p}/{base}" if p else base
+            shards += [base + c for c in ID_SHARDS]
+
+    lock = threading.Lock()
+    state = {"keys": 0, "pages": 0}
+    parts = []
+    ambiguous = set()
+
+    def one(shard: str):
+        with lock:
+            left = max_keys - state["keys"] if max_keys > 0 else 0
+        if max_keys > 0 and left <= 0:
+            with lock:
+                ambiguous.add(shard)
+            return
+        try:
+            fps, pages = _list_shard(s3, bucket, shard, left, with_etag)
+        except Exception as e:
+            log_warn(f"list action=fallback_head shard={shard} err={e}")
+            with lock:
+                ambiguous.add(shard)
+            return
+        with lock:
+            state["pages"] += pages
+            if fps is None:
+                ambiguous.add(shard)
+                return
+            state["keys"] += len(fps)
+            parts.append(fps)
+
+    t0 = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="r2list") as ex:
+        list(ex.map(one, shards))
+
+    known = array("Q", sorted(x for a in parts for x in a))
+    log_info(
+        f"list done shards={len(shards)} keys={len(known)} pages={state['pages']} ambiguous={len(ambiguous)} "
+        f"mem_mb={known.itemsize * len(known) / 1e6:.1f} elapsed_s={time.monotonic() - t0:.1f}"
     )
+    return known, ambiguous
+
+def _mk_exists_fn(s3, bucket: str, prefix: str, load_known, cnt: dict, lock: threading.Lock):
+    """Return a key -> bool existence check.
+
+    load_known is None (HEAD every key) or a callable returning (known, ambiguous)
+    from _list_existing; it runs once, on the first check, so runs where every file
+    is skipped by the manifest never list the bucket.
+    """
+    state = {"loaded": load_known is None, "known": None, "ambiguous": set()}
+    load_lock = threading.Lock()
+
+    def exists(key: str, etag: str = "") -> bool:
+        if not state["loaded"]:
+            with load_lock:
+                if not state["loaded"]:
+                    state["known"], state["ambiguous"] = load_known()
+                    state["loaded"] = True
+        known, ambiguous = state["known"], state["ambiguous"]
+        shard = _shard_of(key, prefix) if known is not None else ""
+        if shard and shard[-1] in ID_SHARDS and shard not in ambiguous:
+            x = _key_fp(f"{key}|{etag}" if etag else key)
+            i = bisect.bisect_left(known, x)
+            return i < len(known) and known[i] == x
+        with lock:
+            cnt["head"] += 1
+        return _exists(s3, bucket, key, etag)
+
+    return exists
+
+def _mk_encoder(encoding: str, min_bytes: int, level: int):
+    """Return encode(body, put_kw) -> (body, put_kw) for text objects.
+
+    Bodies below min_bytes, or that would not shrink, are stored as-is. Encoded
+    objects carry Content-Encoding and x-amz-meta-raw-size with the original size.
+    """
+    if encoding == "none":
+        return lambda body, put_kw: (body, put_kw)
+
+    def compress(b: bytes) -> bytes:
+        return gzip.compress(b, compresslevel=level or 6, mtime=0)
+
+    def encode(body: bytes, put_kw: dict):
+        if len(body) < min_bytes or not str(put_kw.get("ContentType", "")).startswith("text/"):
+            return body, put_kw
+        c = compress(body)
+        if len(c) >= len(body):
+            return body, put_kw
+        return c, {**put_kw, "ContentEncoding": encoding, "Metadata": {"raw-size": str(len(body))}}
+
+    return encode
+
+def _put_body(s3, bucket: str, key: str, body: bytes, put_kw: dict):
+    s3.put_object(Bucket=bucket, Key=key, Body=body, **put_kw)
+
+def _mk_rate_limiter(rate_per_s: float):
+    if rate_per_s <= 0:
+        return lambda: None
+
+    lock = threading.Lock()
+    interval = 1.0 / rate_per_s
+    state = {"next": time.monotonic()}
+
+    def acquire():
+        with lock:
+            now = time.monotonic()
+            at = max(state["next"], now)
+            state["next"] = at + interval
+        if at > now:
+            time.sleep(at - now)
+
+    return acquire
+
+def _manifest_open(path: str) -> sqlite3.Connection:
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    con = sqlite3.connect(path, timeout=5.0)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute(
+        "CREATE TABLE IF NOT EXISTS r2_manifest ("
+        "sub TEXT NOT NULL, kind TEXT NOT NULL, sid TEXT NOT NULL, h16 TEXT NOT NULL, fp TEXT NOT NULL, "
+        "n_keys INTEGER NOT NULL, keys BLOB NOT NULL, uploaded_at REAL NOT NULL, "
+        "PRIMARY KEY (sub, kind, sid, h16, fp)) WITHOUT ROWID"
+    )
+    return con
+
+def _manifest_fp(bucket: str, prefix: str, max_chars: int, layout: str = "objects") -> str:
+    # Anything that changes the derived keys or their destination invalidates the manifest.
+    s = f"{bucket}|{_norm_prefix(prefix)}|{max_chars}"
+    return _sha16(s if layout == "objects" else f"{s}|{layout}")
+
+def _manifest_has(con: sqlite3.Connection, fp: str, sub: str, kind: str, sid: str, h16: str) -> bool:
+    row = con.execute(
+        "SELECT 1 FROM r2_manifest WHERE sub = ? AND kind = ? AND sid = ? AND h16 = ? AND fp = ?",
+        [sub, kind, sid, h16, fp],
+    ).fetchone()
+    return row is not None
+
+def _manifest_flush(con: sqlite3.Connection, fp: str, done: list):
+    """Persist files whose keys are all uploaded or already present.
+
+    done holds (files, keys) pairs appended by upload workers, where files is a
+    list of (sub, kind, sid, h16); it is drained in place.
+    """
+    if not done:
+        return 0
+    rows = []
+    while done:
+        files, keys = done.pop()
+        blob = zlib.compress("\n".join(keys).encode("utf-8"))
+        for sub, kind, sid, h16 in files:
+            rows.append((sub, kind, sid, h16, fp, len(keys), blob, time.time()))
+    con.executemany("INSERT OR REPLACE INTO r2_manifest VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    con.commit()
+    return len(rows)
+
+def _mk_file_tracker(done: list, lock: threading.Lock):
+    """Track per-file completion of yielded objects.
+
+    Returns (begin, end, ok): begin(files) opens a unit of staged files (one file,
+    or a whole thread in bundle layout) and returns its id, end(fid, keys) closes it
+    once every object has been yielded, ok(fid) is called by workers per uploaded
+    or existing object. A unit is appended to done when all its objects are ok.
+    """
+    files = {}
+    state = {"next": 0}
+
+    def begin(meta) -> int:
+        with lock:
+            fid = state["next"]
+            state["next"] += 1
+            files[fid] = {"meta": meta, "ok": 0, "keys": None}
+        return fid
+
+    def _maybe_done(fid: int):
+        f = files[fid]
+        if f["keys"] is not None and f["ok"] == len(f["keys"]):
+            done.append((f["meta"], f["keys"]))
+            del files[fid]
+
+    def end(fid: int, keys: list):
+        with lock:
+            files[fid]["keys"] = keys
+            _maybe_done(fid)
+
+    def ok(fid: int):
+        with lock:
+            if fid in files:
+                files[fid]["ok"] += 1
+                _maybe_done(fid)
+
+    return begin, end, ok
+
+def _iter_objects(candidates, max_chars: int, prefix: str, stats: dict, cnt: dict, manifest=None):
+    """Yield (key, body, put_kw, etag, fid) for every object derived from the candidate files.
+
+    manifest is None or (con, fp, tracker, done); files already recorded in it are
+    skipped without being opened, and newly completed files are flushed to it.
+    """
+    for sub, kind, path in candidates:
+        fn = os.path.basename(path)
+        m = RE_02.match(fn)
+        if not m:
+            continue
+        sid = m.group("sid")
+        h16 = m.group("h16").lower()
+        stats["files"] += 1
+
+        fid = -1
+        if manifest is not None:
+            con, fp, (begin, end, _), done = manifest
+            if done:
+                stats["manifest_new"] += _manifest_flush(con, fp, done)
+            if _manifest_has(con, fp, sub, kind, sid, h16):
+                stats["manifest_skip"] += 1
+                if stats["manifest_skip"] % 10000 == 0:
+                    log_info(f"progress manifest_skip={stats['manifest_skip']} last={sub}/{kind}/{fn}")
+                continue
+            fid = begin([(sub, kind, sid, h16)])
+        keys = []
+        stats["parsed"] += 1
 
-def main():
-    ap = argparse.ArgumentParser()
-    ap.add_argument("--staged-root", required=True)
-    ap.add_argument("--lookback-days", type=int, required=True)
-    ap.add_argument("--bucket", required=True)
-    ap.add_argument("--prefix", required=True)
-    ap.add_argument("--max-chars", type=int, required=True)
-    ap.add_argument("--max-objects-per-run", type=int, required=True)
-    ap.add_argument("--check-exists", required=True)
-    ap.add_argument("--put-sleep-ms", type=int, required=True)
-    ap.add_argument("--put-jitter-ms", type=int, required=True)
-    ap.add_argument("--sub", action="append", default=[])
-    args = ap.parse_args()
-
-    check_exists = str(args.check_exists).lower() == "true"
-    days = _iter_days(args.lookback_days)
-
-    s3, endpoint = _mk_s3()
-    log_info(f"r2 endpoint={endpoint} bucket={args.bucket} prefix={_norm_prefix(args.prefix)} check_exists={check_exists}")
+        if kind == "submissions":
+            text = _submission_text(path, max_chars)
+            texts = [("s", sid, text, _sha16(text))] if text else []
+        else:
+            texts = (("c", cid, text, h) for cid, text, h in _iter_comment_texts(path, max_chars))
+        for typ, eid, text, h in texts:
+            key = _key_for(typ, sub, eid, h, prefix)
+            keys.append(key)
+            yield key, text.encode("utf-8"), TEXT_PUT, "", fid
+        if not keys:
+            stats["empty"] += 1
+
+        if fid >= 0:
+            end(fid, keys)
+
+        if stats["parsed"] % 50 == 0:
+            log_info(f"progress files_parsed={stats['parsed']} put_ok={cnt['put_ok']} skip_exist={cnt['skip_exist']} empty={stats['empty']} last={sub}/{kind}/{fn}")
+
+def _iter_extract_objects(files, max_chars: int, prefix: str, stats: dict, cnt: dict, tracker):
+    """Yield text objects for changed rows of 02b_extract files, in _iter_objects shape.
+
+    Each file is one tracker unit keyed (sub, seq), so the caller can advance the
+    cursor only past files whose objects all landed.
+    """
+    begin, end, _ = tracker
+    for sub, seq, path in files:
+        fid = begin([(sub, seq)])
+        keys = []
+        stats["files"] += 1
+        for vid, _, t, sid, pid, h, text in iter_extract_rows(path):
+            if len(text) > max_chars:
+                text = text[:max_chars]
+                h = _sha16(text)
+            key = _key_for(t, sub, vid.split(":", 3)[3], h, prefix)
+            keys.append(key)
+            stats["entries"] += 1
+            yield key, text.encode("utf-8"), TEXT_PUT, "", fid
+            if stats["entries"] % 10000 == 0:
+                log_info(f"progress rows={stats['entries']} put_ok={cnt['put_ok']} skip_exist={cnt['skip_exist']} last={sub}/{seq:08d}")
+        end(fid, keys)
+        stats["parsed"] += 1
+
+def _group_threads(candidates):
+    """Group candidates into threads as (sub, sid, [(kind, path, h16), ...]).
+
+    02_staged keeps every snapshot it has seen, so only the latest capture per
+    kind is kept, as 02_staged itself does when picking from 01_parquet.
+    """
+    latest = {}
+    for sub, kind, path in candidates:
+        m = RE_02.match(os.path.basename(path))
+        if not m:
+            continue
+        cur = latest.setdefault((sub, m.group("sid")), {})
+        prev = cur.get(kind)
+        if prev is None or m.group("cap14") > prev[2]:
+            cur[kind] = (path, m.group("h16").lower(), m.group("cap14"))
+    out = []
+    for (sub, sid), kinds in sorted(latest.items()):
+        out.append((sub, sid, [(k, kinds[k][0], kinds[k][1]) for k in ("submissions", "comments") if k in kinds]))
+    return out
 
+def _iter_bundles(threads, max_chars: int, prefix: str, block_bytes: int, stats: dict, cnt: dict, manifest=None):
+    """Yield one bundle object per thread, in the same shape as _iter_objects.
+
+    The bundle key is stable per thread, so existence is checked against the
+    MD5 ETag of the encoded bundle.
+    """
+    for sub, sid, files in threads:
+        stats["files"] += len(files)
+        metas = [(sub, kind, sid, h16) for kind, _, h16 in files]
+
+        fid = -1
+        if manifest is not None:
+            con, fp, (begin, end, _), done = manifest
+            if done:
+                stats["manifest_new"] += _manifest_flush(con, fp, done)
+            if all(_manifest_has(con, fp, *m) for m in metas):
+                stats["manifest_skip"] += len(files)
+                if stats["manifest_skip"] % 10000 < len(files):
+                    log_info(f"progress manifest_skip={stats['manifest_skip']} last={sub}/{sid}")
+                continue
+            fid = begin(metas)
+        stats["parsed"] += len(files)
+
+        entries = []
+        for kind, path, _ in files:
+            if kind == "submissions":
+                text = _submission_text(path, max_chars)
+                if text:
+                    entries.append(("s", sid, _sha16(text), text))
+            else:
+                entries += [("c", cid, h, text) for cid, text, h in _iter_comment_texts(path, max_chars)]
+
+        keys = []
+        if entries:
+            key = _bundle_key(sub, sid, prefix)
+            body = _encode_bundle(sub, sid, entries, block_bytes)
+            raw_n = sum(len(e[3].encode("utf-8")) for e in entries)
+            keys.append(key)
+            stats["entries"] += len(entries)
+            yield key, body, {**BUNDLE_PUT, "Metadata": {"raw-size": str(raw_n)}}, hashlib.md5(body).hexdigest(), fid
+        else:
+            stats["empty"] += 1
+        if fid >= 0:
+            end(fid, keys)
+
+        if stats["parsed"] % 50 < len(files):
+            log_info(f"progress files_parsed={stats['parsed']} put_ok={cnt['put_ok']} skip_exist={cnt['skip_exist']} empty={stats['empty']} last={sub}/{sid}")
+
+def _run_uploads(s3, bucket: str, objects, cnt: dict, exists, concurrency: int, max_inflight: int, max_objects: int, acquire, on_ok=None, encode=None):
+    """Upload (key, body, put_kw, etag, fid) items from objects on a thread pool sharing one client.
+
+    exists is None or a (key, etag) -> bool check; existing objects are skipped. on_ok, if
+    given, is called with fid for every object that was uploaded or skipped. encode,
+    if given, runs on the worker right before the PUT, so skipped objects are
+    never compressed. At most
+    max_inflight objects are queued or running at once, and no more than
+    max_objects PUTs are issued when max_objects > 0. Returns the first error, if any.
+    """
+    lock = threading.Lock()
+    stop = threading.Event()
+    slots = threading.BoundedSemaphore(max_inflight)
+    errs = []
+
+    def work(key: str, body: bytes, put_kw: dict, etag: str, fid: int):
+        try:
+            if stop.is_set():
+                return
+            if exists is not None and exists(key, etag):
+                with lock:
+                    cnt["skip_exist"] += 1
+                if on_ok is not None:
+                    on_ok(fid)
+                return
+            with lock:
+                if max_objects > 0 and cnt["reserved"] >= max_objects:
+                    stop.set()
+                    return
+                cnt["reserved"] += 1
+            try:
+                raw_n = int((put_kw.get("Metadata") or {}).get("raw-size") or len(body))
+                if encode is not None:
+                    body, put_kw = encode(body, put_kw)
+                acquire()
+                _put_body(s3, bucket, key, body, put_kw)
+            except Exception:
+                with lock:
+                    cnt["reserved"] -= 1
+                raise
+            with lock:
+                cnt["put_ok"] += 1
+                cnt["raw_bytes"] += raw_n
+                cnt["stored_bytes"] += len(body)
+                if len(body) < raw_n:
+                    cnt["encoded"] += 1
+                if max_objects > 0 and cnt["put_ok"] >= max_objects:
+                    stop.set()
+            if on_ok is not None:
+                on_ok(fid)
+        except Exception as e:
+            with lock:
+                cnt["failed"] += 1
+                if not errs:
+                    errs.append((key, e))
+            stop.set()
+        finally:
+            slots.release()
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="r2") as ex:
+        for key, body, put_kw, etag, fid in objects:
+            if stop.is_set():
+                break
+            slots.acquire()
+            if stop.is_set():
+                slots.release()
+                break
+            ex.submit(work, key, body, put_kw, etag, fid)
+
+    return errs[0] if errs else None
+
+def _scan_staged(staged_root: str, subs: list[str], days):
     candidates = []
-    for sub in args.sub:
+    for sub in subs:
         for kind in ("submissions", "comments"):
-            base = os.path.join(args.staged_root, f"r_{sub}", kind)
+            base = os.path.join(staged_root, f"r_{sub}", kind)
             if not os.path.isdir(base):
                 log_warn(f"subreddit={sub} kind={kind} action=skip reason=missing_dir path={base}")
                 continue
@@ -154,86 +669,162 @@ def main():
                     for fn in sorted(os.listdir(ddir)):
                         if fn.endswith(".parquet"):
                             candidates.append((sub, kind, os.path.join(ddir, fn)))
+    return candidates
 
-    if not candidates:
-        return
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--staged-root", required=True)
+    ap.add_argument("--lookback-days", type=int, required=True)
+    ap.add_argument("--bucket", required=True)
+    ap.add_argument("--prefix", required=True)
+    ap.add_argument("--max-chars", type=int, required=True)
+    ap.add_argument("--max-objects-per-run", type=int, required=True)
+    ap.add_argument("--check-exists", required=True)
+    ap.add_argument("--exists-mode", choices=["head", "list"], default="head")
+    ap.add_argument("--list-max-keys", type=int, default=50_000_000)
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--max-inflight", type=int, default=0)
+    ap.add_argument("--put-rate", type=float, default=0.0)
+    ap.add_argument("--put-sleep-ms", type=int, default=0)
+    ap.add_argument("--put-jitter-ms", type=int, default=0)
+    ap.add_argument("--layout", choices=["objects", "bundle"], default="objects")
+    ap.add_argument("--bundle-block-bytes", type=int, default=16384)
+    ap.add_argument("--encoding", choices=["none", "gzip"], default="none", help="Content-Encoding for text objects")
+    ap.add_argument("--encode-min-bytes", type=int, default=1024)
+    ap.add_argument("--encode-level", type=int, default=0, help="0 uses the codec default")
+    ap.add_argument("--manifest-path", default="", help="sqlite manifest of fully uploaded staged files (empty disables)")
+    ap.add_argument("--extract-root", default="", help="upload changed rows from 02b_extract instead of scanning 02_staged")
+    ap.add_argument("--extract-cursor", default="")
+    ap.add_argument("--sub", action="append", default=[])
+    ap.add_argument("--profile", choices=["none", "cpu", "mem", "duckdb"], default="none")
+    ap.add_argument("--profile-dir", default="data/reddit/logs/profile")
+    args = ap.parse_args()
+    profiling.start("uploader", args.profile, args.profile_dir)
 
-    candidates.sort(key=lambda x: x[2])
-    log_info(f"scan candidates={len(candidates)} lookback_days={args.lookback_days}")
+    check_exists = str(args.check_exists).lower() == "true"
+    days = _iter_days(args.lookback_days)
 
-    put_ok = 0
-    skip_exist = 0
-    empty = 0
-    parsed = 0
-    files = 0
+    concurrency = max(1, args.concurrency)
+    max_inflight = args.max_inflight if args.max_inflight > 0 else concurrency * 4
+    put_rate = args.put_rate
+    if put_rate <= 0 and (args.put_sleep_ms > 0 or args.put_jitter_ms > 0):
+        put_rate = 1000.0 / (args.put_sleep_ms + args.put_jitter_ms / 2.0)
+        log_warn(f"put_sleep_ms/put_jitter_ms are deprecated, using put_rate={put_rate:.2f}/s")
 
-    for sub, kind, path in candidates:
-        fn = os.path.basename(path)
-        m = RE_02.match(fn)
-        if not m:
-            continue
-        sid = m.group("sid")
-        parsed += 1
-        files += 1
+    s3, endpoint = _mk_s3(concurrency)
+    log_info(f"r2 endpoint={endpoint} bucket={args.bucket} prefix={_norm_prefix(args.prefix)} check_exists={check_exists} exists_mode={args.exists_mode} layout={args.layout} encoding={args.encoding} concurrency={concurrency} max_inflight={max_inflight} put_rate={put_rate}")
 
-        if kind == "submissions":
-            row = _read_submission_row(path)
-            if row is None:
-                empty += 1
-                continue
-            author, title, body = row
-            text = (title or "").strip()
-            b = (body or "").strip()
-            if b:
-                text = f"{text}\n\n{b}" if text else b
-            if not text:
-                empty += 1
+    bundle = args.layout == "bundle"
+    block_bytes = max(1024, args.bundle_block_bytes)
+    candidates = []
+    extract_files = []
+    if args.extract_root:
+        if bundle:
+            log_error("--layout bundle packs whole threads and cannot consume changed rows; use --layout objects with --extract-root")
+            raise SystemExit(2)
+        if not args.extract_cursor:
+            log_error("--extract-cursor is required with --extract-root")
+            raise SystemExit(2)
+        if args.manifest_path:
+            log_warn("manifest action=ignore reason=extract_source")
+            args.manifest_path = ""
+        cursor = cursor_load(args.extract_cursor)
+        extract_files = extract_files_after(args.extract_root, args.sub, cursor)
+        log_info(f"extract files={len(extract_files)} cursor={args.extract_cursor}")
+        if not extract_files:
+            return
+        subs = sorted({sub for sub, _, _ in extract_files})
+    else:
+        candidates = _scan_staged(args.staged_root, args.sub, days)
+        if not candidates:
+            return
+        candidates.sort(key=lambda x: x[2])
+        log_info(f"scan candidates={len(candidates)} lookback_days={args.lookback_days}")
+        subs = sorted({sub for sub, _, _ in candidates})
+
+    profiling.mark("scan")
+
+    stats = {"files": 0, "parsed": 0, "empty": 0, "entries": 0, "manifest_skip": 0, "manifest_new": 0}
+    cnt = {"put_ok": 0, "skip_exist": 0, "reserved": 0, "failed": 0, "head": 0, "raw_bytes": 0, "stored_bytes": 0, "encoded": 0}
+    t0 = time.monotonic()
+
+    exists = None
+    if check_exists:
+        load_known = None
+        if args.exists_mode == "list":
+            types = ("b",) if bundle else ("s", "c")
+            load_known = lambda: _list_existing(s3, args.bucket, args.prefix, subs, concurrency, args.list_max_keys, types, bundle)
+        exists = _mk_exists_fn(s3, args.bucket, args.prefix, load_known, cnt, threading.Lock())
+
+    manifest = None
+    on_ok = None
+    if args.manifest_path:
+        mcon = _manifest_open(args.manifest_path)
+        mfp = _manifest_fp(args.bucket, args.prefix, args.max_chars, f"bundle:{block_bytes}" if bundle else "objects")
+        done = []
+        tracker = _mk_file_tracker(done, threading.Lock())
+        manifest = (mcon, mfp, tracker, done)
+        on_ok = tracker[2]
+        log_info(f"manifest path={args.manifest_path} fp={mfp}")
+
+    if extract_files:
+        done = []
+        tracker = _mk_file_tracker(done, threading.Lock())
+        on_ok = tracker[2]
+        objects = _iter_extract_objects(extract_files, args.max_chars, args.prefix, stats, cnt, tracker)
+    elif bundle:
+        objects = _iter_bundles(_group_threads(candidates), args.max_chars, args.prefix, block_bytes, stats, cnt, manifest)
+    else:
+        objects = _iter_objects(candidates, args.max_chars, args.prefix, stats, cnt, manifest)
+
+    err = _run_uploads(
+        s3,
+        args.bucket,
+        objects,
+        cnt,
+        exists,
+        concurrency,
+        max_inflight,
+        args.max_objects_per_run,
+        _mk_rate_limiter(put_rate),
+        on_ok,
+        _mk_encoder(args.encoding, max(0, args.encode_min_bytes), args.encode_level),
+    )
+    profiling.mark("upload")
+    if manifest is not None:
+        stats["manifest_new"] += _manifest_flush(mcon, mfp, done)
+        mcon.close()
+    if extract_files:
+        completed = {m for metas, _ in done for m in metas}
+        blocked = set()
+        for sub, seq, _ in extract_files:
+            if sub in blocked:
                 continue
-            if len(text) > args.max_chars:
-                text = text[: args.max_chars]
-            h = _sha16(text)
-            key = _key_for("s", sub, sid, h, args.prefix)
-
-            if check_exists and _exists(s3, args.bucket, key):
-                skip_exist += 1
+            if (sub, seq) in completed:
+                cursor[sub] = seq
             else:
-                _put_text(s3, args.bucket, key, text)
-                put_ok += 1
-
-        else:
-            rows = _read_comment_rows(path)
-            if not rows:
-                empty += 1
-                continue
-            for cid, pid, author, body in rows:
-                body = (body or "").strip()
-                if not body:
-                    continue
-                text = body
-                if len(text) > args.max_chars:
-                    text = text[: args.max_chars]
-                h = _sha16(text)
-                key = _key_for("c", sub, cid, h, args.prefix)
-
-                if check_exists and _exists(s3, args.bucket, key):
-                    skip_exist += 1
-                else:
-                    _put_text(s3, args.bucket, key, text)
-                    put_ok += 1
-
-                if args.max_objects_per_run > 0 and put_ok >= args.max_objects_per_run:
-                    log_info(f"stop reason=max_objects_per_run put_ok={put_ok}")
-                    log_info(f"done files={files} parsed={parsed} put_ok={put_ok} skip_exist={skip_exist} empty={empty}")
-                    return
-
-                sleep_ms = args.put_sleep_ms + (random.randint(0, args.put_jitter_ms) if args.put_jitter_ms > 0 else 0)
-                if sleep_ms > 0:
-                    time.sleep(sleep_ms / 1000.0)
-
-        if parsed % 50 == 0:
-            log_info(f"progress files_parsed={parsed} put_ok={put_ok} skip_exist={skip_exist} empty={empty} last={sub}/{kind}/{fn}")
-
-    log_info(f"done files={files} parsed={parsed} put_ok={put_ok} skip_exist={skip_exist} empty={empty}")
+                blocked.add(sub)
+        cursor_save(args.extract_cursor, cursor)
+        log_info(f"extract cursor={cursor} blocked={sorted(blocked)}")
+
+    elapsed = max(1e-9, time.monotonic() - t0)
+    if args.max_objects_per_run > 0 and cnt["put_ok"] >= args.max_objects_per_run:
+        log_info(f"stop reason=max_objects_per_run put_ok={cnt['put_ok']}")
+    log_info(
+        f"done files={stats['files']} parsed={stats['parsed']} put_ok={cnt['put_ok']} skip_exist={cnt['skip_exist']} "
+        f"empty={stats['empty']} entries={stats['entries']} failed={cnt['failed']} head={cnt['head']} manifest_skip={stats['manifest_skip']} "
+        f"manifest_new={stats['manifest_new']} elapsed_s={elapsed:.1f} "
+        f"ops_per_s={(cnt['put_ok'] + cnt['skip_exist']) / elapsed:.1f}"
+    )
+    saved = cnt["raw_bytes"] - cnt["stored_bytes"]
+    log_info(
+        f"bytes put_ok={cnt['put_ok']} encoded={cnt['encoded']} raw={cnt['raw_bytes']} stored={cnt['stored_bytes']} "
+        f"saved={saved} saved_pct={100.0 * saved / max(1, cnt['raw_bytes']):.1f}"
+    )
+    if err is not None:
+        key, e = err
+        log_error(f"upload failed key={key} err={e}")
+        raise SystemExit(1)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+import argparse
+import datetime as dt
+import errno
+import fcntl
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import time
+
+# apps/reddit, so the modules shared by the reddit commands import as internal.*.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))))
+
+from internal.journal import cursor_get, cursor_init, cursor_set, journal_append, journal_head, journal_open, journal_since
+
+RE_01 = re.compile(r"^(?P<cap14>[^_]+)_(?P<hash>[^.]+)\.parquet$")
+RE_CAP14 = re.compile(r"^\d{14}$")
+
+# linux/fs.h FICLONE: share the source extents (btrfs, xfs reflink=1).
+FICLONE = 0x40049409
+
+def log_info(msg: str):
+    sys.stderr.write(f"[INFO] {msg}\n")
+    sys.stderr.flush()
+
+def log_warn(msg: str):
+    sys.stderr.write(f"[WARN] {msg}\n")
+    sys.stderr.flush()
+
+def log_error(msg: str):
+    sys.stderr.write(f"[ERROR] {msg}\n")
+    sys.stderr.flush()
+
+def _iter_days(lookback_days: int):
+    today = dt.datetime.now(dt.UTC).date()
+    if lookback_days <= 0:
+        return None
+    out = []
+    for i in range(lookback_days + 1):
+        d = today - dt.timedelta(days=i)
+        out.append((str(d.year), f"{d.month:02d}{d.day:02d}"))
+    return out
+
+def _catalog_open(path: str) -> sqlite3.Connection:
+    con = sqlite3.connect(path, timeout=5.0)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute(
+        "CREATE TABLE IF NOT EXISTS stage_threads ("
+        "relpath TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, latest TEXT NOT NULL, out TEXT NOT NULL) WITHOUT ROWID"
+    )
+    # Threads that failed; the journal cursor moves past them, so they are retried from here.
+    con.execute("CREATE TABLE IF NOT EXISTS stage_retry (relpath TEXT PRIMARY KEY, sub TEXT NOT NULL, kind TEXT NOT NULL) WITHOUT ROWID")
+    cursor_init(con)
+    con.commit()
+    return con
+
+def _thread_dirs(in_root: str, days):
+    """Thread dirs under r_{sub}/{kind}, limited to the lookback days when given."""
+    if days is None:
+        day_dirs = []
+        for y in sorted(os.listdir(in_root)):
+            yd = os.path.join(in_root, y)
+            if os.path.isdir(yd):
+                day_dirs += [os.path.join(yd, md) for md in sorted(os.listdir(yd))]
+    else:
+        day_dirs = [os.path.join(in_root, y, md) for y, md in days]
+    out = []
+    for d in day_dirs:
+        if not os.path.isdir(d):
+            continue
+        with os.scandir(d) as it:
+            out += sorted(e.path for e in it if e.is_dir())
+    return out
+
+def _reflink(src: str, dst: str):
+    with open(src, "rb") as fi, open(dst, "wb") as fo:
+        try:
+            fcntl.ioctl(fo.fileno(), FICLONE, fi.fileno())
+        except OSError:
+            fo.close()
+            os.remove(dst)
+            raise
+
+class Materializer:
+    """Creates staged files as hardlinks, then reflinks, then copies, remembering what the filesystem refused.
+
+    Only auto falls back; a pinned hardlink or reflink that the filesystem refuses is an error.
+    """
+
+    def __init__(self, mode: str):
+        self.mode = mode
+        self.can_link = mode in ("auto", "hardlink")
+        self.can_reflink = mode in ("auto", "reflink")
+        self.counts = {"hardlink": 0, "reflink": 0, "copy": 0}
+
+    def put(self, src: str, dst: str) -> str:
+        tmp = os.path.join(os.path.dirname(dst), f".{os.path.basename(dst)}.tmp")
+        if os.path.lexists(tmp):
+            os.remove(tmp)
+        how = ""
+        if self.can_link:
+            try:
+                os.link(src, tmp)
+                how = "hardlink"
+            except OSError as e:
+                reason = errno.errorcode.get(e.errno, e.errno)
+                if self.mode != "auto" or e.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP, errno.EOPNOTSUPP):
+                    log_error(f"materialize action=fail method=hardlink reason={reason} src={src}")
+                    raise
+                log_warn(f"materialize action=fallback from=hardlink reason={reason}")
+                self.can_link = False
+        if not how and self.can_reflink:
+            try:
+                _reflink(src, tmp)
+                how = "reflink"
+            except OSError as e:
+                reason = errno.errorcode.get(e.errno, e.errno)
+                if self.mode != "auto":
+                    log_error(f"materialize action=fail method=reflink reason={reason} src={src}")
+                    raise
+                log_warn(f"materialize action=fallback from=reflink reason={reason}")
+                self.can_reflink = False
+        if not how:
+            shutil.copyfile(src, tmp)
+            how = "copy"
+        os.replace(tmp, dst)
+        self.counts[how] += 1
+        return how
+
+def _stage_kind(cat, journal, mat: Materializer, parquet_root: str, staged_root: str, sub: str, kind: str, tds: list[str], rescan: bool, totals: dict) -> bool:
+    threads = wrote = skipped = empty = unchanged = 0
+    ok = True
+    outs = []
+    for td in tds:
+        threads += 1
+        rel = os.path.relpath(td, parquet_root)
+        try:
+            mtime_ns = os.stat(td).st_mtime_ns
+        except FileNotFoundError:
+            cat.execute("DELETE FROM stage_retry WHERE relpath = ?", [rel])
+            continue
+        if not rescan:
+            row = cat.execute("SELECT mtime_ns FROM stage_threads WHERE relpath = ?", [rel]).fetchone()
+            if row is not None and row[0] == mtime_ns:
+                unchanged += 1
+                continue
+        y, md, thread = rel.split(os.sep)[-3:]
+        hms, _, sid = thread.partition("_")
+        meta = f"subreddit={sub} kind={kind} thread={y}/{md}/{thread}"
+
+        names = sorted(fn for fn in os.listdir(td) if fn.endswith(".parquet"))
+        if not names:
+            empty += 1
+            log_info(f"{meta} action=skip scope=thread reason=no_parquet")
+            cat.execute("DELETE FROM stage_retry WHERE relpath = ?", [rel])
+            cat.execute("INSERT OR REPLACE INTO stage_threads VALUES (?, ?, '', '')", [rel, mtime_ns])
+            continue
+        latest = names[-1]
+        m = RE_01.match(latest)
+        cap14 = m.group("cap14") if m else latest.split("_", 1)[0]
+        if not m or not RE_CAP14.match(cap14):
+            log_error(f"{meta} action=fail file={latest} reason=bad_capture_ts capture={cap14}")
+            cat.execute("INSERT OR REPLACE INTO stage_retry VALUES (?, ?, ?)", [rel, sub, kind])
+            ok = False
+            continue
+        cat.execute("DELETE FROM stage_retry WHERE relpath = ?", [rel])
+
+        out_dir = os.path.join(staged_root, f"r_{sub}", kind, y, md)
+        out = os.path.join(out_dir, f"{hms}_{sid}_{cap14}_{m.group('hash')}.parquet")
+        if os.path.exists(out):
+            skipped += 1
+            log_info(f"{meta} action=skip scope=thread reason=exists out={os.path.basename(out)} src={latest}")
+        else:
+            os.makedirs(out_dir, exist_ok=True)
+            how = mat.put(os.path.join(td, latest), out)
+            wrote += 1
+            log_info(f"{meta} action=write latest={latest} out={os.path.basename(out)} via={how}")
+        outs.append(os.path.relpath(out, staged_root))
+        cat.execute("INSERT OR REPLACE INTO stage_threads VALUES (?, ?, ?, ?)", [rel, mtime_ns, latest, os.path.relpath(out, staged_root)])
+    # Existing outputs are journaled too, so a crash before the catalog commit loses nothing downstream.
+    journal_append(journal, [(sub, kind, rel) for rel in outs])
+    cat.commit()
+    for k, v in (("threads", threads), ("wrote", wrote), ("skipped", skipped), ("empty", empty), ("unchanged", unchanged)):
+        totals[k] += v
+    log_info(f"subreddit={sub} kind={kind} stats threads={threads} unchanged_threads={unchanged} wrote={wrote} skipped={skipped} empty={empty}")
+    return ok
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--parquet-root", required=True)
+    ap.add_argument("--staged-root", required=True)
+    ap.add_argument("--lookback-days", type=int, required=True)
+    ap.add_argument("--materialize", choices=["auto", "hardlink", "reflink", "copy"], default="auto",
+                    help="auto tries hardlink, then reflink, then copy")
+    ap.add_argument("--rescan", choices=["true", "false"], default="false", help="look at every thread dir, ignoring the catalog")
+    ap.add_argument("--discover", choices=["journal", "scan"], default="journal",
+                    help="journal reads 01_parquet's change journal; scan walks the lookback days")
+    ap.add_argument("--sub", action="append", default=[])
+    args = ap.parse_args()
+
+    os.makedirs(args.staged_root, exist_ok=True)
+    os.makedirs(args.parquet_root, exist_ok=True)
+    cat = _catalog_open(os.path.join(args.staged_root, "_catalog.sqlite"))
+    src = journal_open(os.path.join(args.parquet_root, "_journal.sqlite"))
+    journal = journal_open(os.path.join(args.staged_root, "_journal.sqlite"))
+    mat = Materializer(args.materialize)
+    days = _iter_days(args.lookback_days)
+    rescan = args.rescan == "true"
+    totals = {"threads": 0, "wrote": 0, "skipped": 0, "empty": 0, "unchanged": 0}
+    ok = True
+    t0 = time.monotonic()
+    for sub in args.sub:
+        log_info(f"subreddit={sub} begin")
+        if not os.path.isdir(os.path.join(args.parquet_root, f"r_{sub}")):
+            log_warn(f"subreddit={sub} skip reason=no_01_dir path={os.path.join(args.parquet_root, f'r_{sub}')}")
+            continue
+        cur = cursor_get(cat, "01_parquet", sub)
+        by_kind = {"submissions": [], "comments": []}
+        if args.discover == "journal" and cur is not None and not rescan:
+            entries = journal_since(src, sub, cur)
+            head = entries[-1][0] if entries else cur
+            for kind, rel in sorted({(kind, rel) for _, kind, rel in entries if kind in by_kind}):
+                td = os.path.join(args.parquet_root, rel)
+                if os.path.isdir(td):
+                    by_kind[kind].append(td)
+            log_info(f"subreddit={sub} discover=journal from_seq={cur} to_seq={head} entries={len(entries)}")
+        else:
+            # No cursor yet (or a rescan): walk the tree once, then follow the journal from here.
+            head = journal_head(src)
+            for kind in by_kind:
+                in_root = os.path.join(args.parquet_root, f"r_{sub}", kind)
+                if not os.path.isdir(in_root):
+                    log_warn(f"subreddit={sub} kind={kind} missing_dir path={in_root}")
+                    continue
+                by_kind[kind] = _thread_dirs(in_root, days)
+            log_info(f"subreddit={sub} discover=scan journal_seq={head}")
+        retry = cat.execute("SELECT relpath, kind FROM stage_retry WHERE sub = ? ORDER BY relpath", [sub]).fetchall()
+        for rel, kind in retry:
+            td = os.path.join(args.parquet_root, rel)
+            if kind in by_kind and td not in by_kind[kind]:
+                by_kind[kind].append(td)
+        if retry:
+            log_info(f"subreddit={sub} retry threads={len(retry)}")
+        for kind, tds in by_kind.items():
+            ok = _stage_kind(cat, journal, mat, args.parquet_root, args.staged_root, sub, kind, tds, rescan, totals) and ok
+        # Failed threads are in stage_retry, so the cursor can move past them.
+        cursor_set(cat, "01_parquet", sub, head)
+        cat.commit()
+        log_info(f"subreddit={sub} end")
+    cat.close()
+    src.close()
+    journal.close()
+
+    log_info(
+        f"done totals threads={totals['threads']} unchanged_threads={totals['unchanged']} wrote={totals['wrote']} "
+        f"skipped={totals['skipped']} empty={totals['empty']} hardlinked={mat.counts['hardlink']} reflinked={mat.counts['reflink']} "
+        f"copied={mat.counts['copy']} elapsed_s={time.monotonic() - t0:.1f}"
+    )
+    return 0 if ok else 2
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -75,13 +75,115 @@ function r2KeyFromMatch(prefix, id, h) {
 async function r2GetText(env, key, maxChars) {
   const obj = await env.STAGED.get(key);
   if (!obj) return "";
-  let text = await obj.text();
+  const enc = String((obj.httpMetadata && obj.httpMetadata.contentEncoding) || "").trim().toLowerCase();
+  let text;
+  if (enc && enc !== "identity") {
+    // The binding returns stored bytes as-is; the uploader writes gzip, which DecompressionStream decodes.
+    let ds;
+    try {
+      ds = new DecompressionStream(enc);
+    } catch {
+      console.warn(`r2 action=skip key=${key} reason=unsupported_encoding encoding=${enc}`);
+      return "";
+    }
+    text = await new Response(obj.body.pipeThrough(ds)).text();
+  } else {
+    text = await obj.text();
+  }
   text = text.trim();
   if (!text) return "";
   if (maxChars > 0 && text.length > maxChars) text = text.slice(0, maxChars);
   return text;
 }
 
+// Bundled layout (R2_LAYOUT=bundle): one object per thread at {prefix}/r/b/{sub}/{sid}.tdb
+// with zlib blocks, a zlib JSON index and a 16-byte trailer (index offset u64, length u32, "TDB1").
+const BUNDLE_TRAILER = 16;
+const BUNDLE_TAIL = 65536;
+
+function bundleKeyFromMatch(prefix, id, md) {
+  if (!prefix) prefix = "staged";
+  const parts = String(id || "").split(":");
+  if (parts.length !== 4) return "";
+  if (parts[0] !== "r") return "";
+  const t = parts[1];
+  if (t !== "s" && t !== "c") return "";
+  const sid = t === "s" ? parts[3] : String((md && md.sid) || "");
+  if (!sid) return "";
+  return `${prefix}/r/b/${parts[2]}/${sid}.tdb`;
+}
+
+async function inflate(bytes) {
+  const s = new Blob([bytes]).stream().pipeThrough(new DecompressionStream("deflate"));
+  return new Uint8Array(await new Response(s).arrayBuffer());
+}
+
+async function r2GetRange(env, key, offset, length, etag) {
+  const obj = await env.STAGED.get(key, { range: { offset, length }, onlyIf: { etagMatches: etag } });
+  if (!obj || !("body" in obj)) return null;
+  return new Uint8Array(await obj.arrayBuffer());
+}
+
+async function r2OpenBundle(env, key) {
+  const obj = await env.STAGED.get(key, { range: { suffix: BUNDLE_TAIL } });
+  if (!obj) return null;
+  const tail = new Uint8Array(await obj.arrayBuffer());
+  if (tail.length < BUNDLE_TRAILER) return null;
+  const tailStart = obj.size - tail.length;
+  const tr = tail.subarray(tail.length - BUNDLE_TRAILER);
+  if (new TextDecoder().decode(tr.subarray(12)) !== "TDB1") return null;
+  const dv = new DataView(tr.buffer, tr.byteOffset, BUNDLE_TRAILER);
+  const off = Number(dv.getBigUint64(0, true));
+  const n = dv.getUint32(8, true);
+  const raw = off >= tailStart
+    ? tail.subarray(off - tailStart, off - tailStart + n)
+    : await r2GetRange(env, key, off, n, obj.etag);
+  if (!raw) return null;
+  const doc = JSON.parse(new TextDecoder().decode(await inflate(raw)));
+  if (doc.codec !== "zlib") return null;
+  const entries = new Map();
+  for (const [t, id, h, bi, o, len] of doc.entries) entries.set(`${t}:${id}`, [h, bi, o, len]);
+  return { key, etag: obj.etag, tailStart, tail, blocks: doc.blocks, entries, plain: new Map() };
+}
+
+async function r2BundleText(env, bnd, t, id, maxChars) {
+  const e = bnd.entries.get(`${t}:${id}`);
+  if (!e) return "";
+  const [, bi, o, len] = e;
+  let plain = bnd.plain.get(bi);
+  if (!plain) {
+    const [boff, blen] = bnd.blocks[bi];
+    const raw = boff >= bnd.tailStart
+      ? bnd.tail.subarray(boff - bnd.tailStart, boff - bnd.tailStart + blen)
+      : await r2GetRange(env, bnd.key, boff, blen, bnd.etag);
+    if (!raw) return "";
+    plain = await inflate(raw);
+    bnd.plain.set(bi, plain);
+  }
+  let text = new TextDecoder().decode(plain.subarray(o, o + len)).trim();
+  if (maxChars > 0 && text.length > maxChars) text = text.slice(0, maxChars);
+  return text;
+}
+
+// Text for one match; bundles caches opened bundles for the duration of a request.
+async function r2GetMatchText(env, id, md, maxChars, bundles) {
+  if (env.R2_LAYOUT === "bundle") {
+    const bkey = bundleKeyFromMatch(env.R2_PREFIX, id, md);
+    if (bkey) {
+      if (!bundles.has(bkey)) bundles.set(bkey, await r2OpenBundle(env, bkey).catch(() => null));
+      const bnd = bundles.get(bkey);
+      if (bnd) {
+        const parts = String(id).split(":");
+        const text = await r2BundleText(env, bnd, parts[1], parts[3], maxChars);
+        if (text) return text;
+      }
+    }
+  }
+  const key = r2KeyFromMatch(env.R2_PREFIX, id, (md && md.h) || "");
+  if (!key) return "";
+  return r2GetText(env, key, maxChars);
+}
+
 async function geminiEmbed(env, text, taskType, dim) {
   const key = env.GEMINI_API_KEY;
   if (!key) throw new Error("missing GEMINI_API_KEY");
@@ -154,18 +256,15 @@ async function handleQuery(req, env) {
   const matches = Array.isArray(res.matches) ? res.matches : [];
 
   const out = [];
+  const bundles = new Map();
   for (const m of matches) {
     const id = m.id || "";
     const score = m.score || 0;
     const md = m.metadata || {};
     const item = { id, score, metadata: md };
     if (withText) {
-      const h = md.h || "";
-      const key = r2KeyFromMatch(env.R2_PREFIX, id, h);
-      if (key) {
-        const t = await r2GetText(env, key, maxChars);
-        if (t) item.text = t;
-      }
+      const t = await r2GetMatchText(env, id, md, maxChars, bundles);
+      if (t) item.text = t;
     }
     out.push(item);
   }
@@ -234,14 +333,12 @@ async function handleAsk(req, env) {
   const sources = [];
 
   let used = 0;
+  const bundles = new Map();
   for (const m of matches) {
     const id = m.id || "";
     const score = m.score || 0;
     const md = m.metadata || {};
-    const h = md.h || "";
-    const key = r2KeyFromMatch(env.R2_PREFIX, id, h);
-    if (!key) continue;
-    const text = await r2GetText(env, key, ctxMaxChars);
+    const text = await r2GetMatchText(env, id, md, ctxMaxChars, bundles);
     if (!text) continue;
 
     const head = `SOURCE id=${id} sub=${md.sub || ""} t=${md.t || ""} sid=${md.sid || ""} score=${score.toFixed(6)}`;
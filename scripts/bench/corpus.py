@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+import argparse
+import datetime
+import hashlib
+import json
+import math
+import random
+import sys
+from pathlib import Path
+
+# Deterministic synthetic Reddit corpus for benchmarks.
+
+KANA = "あいうえおかきくけこさしすせそたちつてとなにぬねのはひふへほまみむめもやゆよらりるれろわをん"
+WORDS = [
+    "今日", "北海道", "雪", "ラーメン", "電車", "仕事", "会社", "ニュース", "日本", "東京",
+    "コンピュータ", "プログラム", "猫", "天気", "選挙", "経済", "円安", "旅行", "温泉", "映画",
+]
+PUNCT = ["。", "、", "！", "？", "w", "\n"]
+
+def log(level, msg):
+    sys.stderr.write(f"[{level}] {msg}\n")
+
+TEXT_DISTS = ("exp", "lognormal", "fixed")
+
+def text_len(rng: random.Random, mean_chars: int, dist: str = "exp") -> int:
+    """Length draw: exp (many short, few long), lognormal (heavier tail, sigma 1) or fixed."""
+    m = max(1, mean_chars)
+    if dist == "fixed":
+        return m
+    if dist == "lognormal":
+        # mean of lognormal(mu, 1) is exp(mu + 0.5)
+        return max(1, int(rng.lognormvariate(math.log(m) - 0.5, 1.0)))
+    return max(1, int(rng.expovariate(1.0 / m)))
+
+def gen_text(rng: random.Random, mean_chars: int, dist: str = "exp") -> str:
+    n = text_len(rng, mean_chars, dist)
+    out = []
+    size = 0
+    while size < n:
+        r = rng.random()
+        if r < 0.55:
+            w = rng.choice(WORDS)
+        elif r < 0.9:
+            w = "".join(rng.choice(KANA) for _ in range(rng.randint(1, 6)))
+        else:
+            w = rng.choice(PUNCT)
+        out.append(w)
+        size += len(w)
+    return "".join(out)[:n]
+
+def gen_id(rng: random.Random, n: int = 7) -> str:
+    return "".join(rng.choice("abcdefghijklmnopqrstuvwxyz0123456789") for _ in range(n))
+
+def iter_threads(subs: int, threads: int, comments: int, mean_chars: int, seed: int, days: int = 7, text_dist: str = "exp"):
+    """Yield (sub, created_unix, sid, submission, comments) per thread.
+
+    submission is (author, title, body) and comments is a list of
+    (comment_id, parent_id, author, body). Output is a pure function of the arguments;
+    text_dist picks the body length distribution (titles stay exponential).
+    """
+    rng = random.Random(seed)
+    base = int(datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc).timestamp())
+    for si in range(subs):
+        sub = f"bench{si}"
+        for _ in range(threads):
+            created = base + rng.randint(0, max(1, days) * 86400 - 1)
+            sid = gen_id(rng)
+            sub_row = (f"u_{gen_id(rng, 5)}", gen_text(rng, 40), gen_text(rng, mean_chars, text_dist))
+            n = max(0, int(rng.gauss(comments, comments / 4.0))) if comments > 0 else 0
+            rows = []
+            ids = []
+            for _ in range(n):
+                cid = gen_id(rng)
+                parent = f"t1_{rng.choice(ids)}" if ids and rng.random() < 0.6 else f"t3_{sid}"
+                rows.append((cid, parent, f"u_{gen_id(rng, 5)}", gen_text(rng, mean_chars, text_dist)))
+                ids.append(cid)
+            yield sub, created, sid, sub_row, rows
+
+def split_created(unix_ts: int):
+    dt = datetime.datetime.fromtimestamp(int(unix_ts), datetime.timezone.utc)
+    return dt.strftime("%Y"), dt.strftime("%m%d"), dt.strftime("%H%M%S")
+
+def _esc(s: str) -> str:
+    return s.replace("'", "''")
+
+def write_staged(root: Path, subs: int, threads: int, comments: int, mean_chars: int, seed: int, compression: str = "zstd",
+                 days: int = 7, text_dist: str = "exp"):
+    """Write an 02_staged tree (r_{sub}/{kind}/{yyyy}/{mmdd}/{hms}_{sid}_{cap14}_{h16}.parquet)."""
+    import duckdb
+
+    con = duckdb.connect(database=":memory:")
+    files = 0
+    n_comments = 0
+    cap14 = "20260108000000"
+    for sub, created, sid, (author, title, body), rows in iter_threads(subs, threads, comments, mean_chars, seed, days, text_dist):
+        y, md, hms = split_created(created)
+        h16 = hashlib.sha256(f"{sub}/{sid}".encode()).hexdigest()[:16]
+        sdir = root / f"r_{sub}" / "submissions" / y / md
+        sdir.mkdir(parents=True, exist_ok=True)
+        out = sdir / f"{hms}_{sid}_{cap14}_{h16}.parquet"
+        con.execute(
+            f"COPY (SELECT ? AS author, ? AS body, ? AS title) TO '{_esc(str(out))}' (FORMAT parquet, COMPRESSION '{compression}')",
+            [author, body, title],
+        )
+        files += 1
+        if not rows:
+            continue
+        cdir = root / f"r_{sub}" / "comments" / y / md
+        cdir.mkdir(parents=True, exist_ok=True)
+        out = cdir / f"{hms}_{sid}_{cap14}_{h16}.parquet"
+        con.execute("CREATE OR REPLACE TEMP TABLE t (author VARCHAR, body VARCHAR, comment_id VARCHAR, parent_id VARCHAR)")
+        con.executemany("INSERT INTO t VALUES (?, ?, ?, ?)", [(a, b, c, p) for c, p, a, b in rows])
+        con.execute(f"COPY t TO '{_esc(str(out))}' (FORMAT parquet, COMPRESSION '{compression}')")
+        files += 1
+        n_comments += len(rows)
+    con.close()
+    return {"files": files, "threads": subs * threads, "comments": n_comments}
+
+def write_arctic(root: Path, subs: int, threads: int, comments: int, mean_chars: int, seed: int, days: int = 7, text_dist: str = "exp"):
+    """Write Arctic Shift style dumps (bench_posts.jsonl, bench_comments.jsonl).
+
+    Comments are shuffled across threads and a few are repeated, like real dumps;
+    lines are ASCII-escaped JSON as the dump tools emit them.
+    """
+    root.mkdir(parents=True, exist_ok=True)
+    rng = random.Random(seed ^ 0x5EED)
+    posts = []
+    rows = []
+    for sub, created, sid, (author, title, body), cs in iter_threads(subs, threads, comments, mean_chars, seed, days, text_dist):
+        retrieved = created + rng.randint(3600, 86400 * 30)
+        posts.append({
+            "id": sid, "subreddit": sub, "subreddit_name_prefixed": f"r/{sub}", "author": author,
+            "title": title, "selftext": body, "created_utc": created, "retrieved_on": retrieved,
+            "score": rng.randint(0, 5000), "upvote_ratio": round(rng.uniform(0.5, 1.0), 2),
+            "num_comments": len(cs), "over_18": rng.random() < 0.05, "edited": False,
+            "media": None, "all_awardings": [], "link_flair_richtext": [{"e": "text", "t": rng.choice(WORDS)}],
+        })
+        for cid, parent, cauthor, cbody in cs:
+            rows.append({
+                "id": cid, "link_id": f"t3_{sid}", "parent_id": parent, "subreddit": sub, "author": cauthor,
+                "body": cbody, "created_utc": created + rng.randint(1, 86400), "retrieved_on": retrieved,
+                "score": rng.randint(-20, 500), "controversiality": int(rng.random() < 0.1),
+                "edited": created + rng.randint(60, 3600) + 0.5 if rng.random() < 0.05 else False,
+            })
+    rng.shuffle(rows)
+    rows += rows[: len(rows) // 50]
+    with (root / "bench_posts.jsonl").open("w", encoding="utf-8") as f:
+        for r in posts:
+            f.write(json.dumps(r) + "\n")
+    with (root / "bench_comments.jsonl").open("w", encoding="utf-8") as f:
+        for r in rows:
+            f.write(json.dumps(r) + "\n")
+    return {"posts": len(posts), "comments": len(rows), "bytes": sum(p.stat().st_size for p in root.glob("bench_*.jsonl"))}
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--layout", choices=["staged", "arctic"], default="staged")
+    ap.add_argument("--root", required=True)
+    ap.add_argument("--subs", type=int, default=2)
+    ap.add_argument("--threads", type=int, default=50)
+    ap.add_argument("--comments", type=int, default=40)
+    ap.add_argument("--mean-chars", type=int, default=120)
+    ap.add_argument("--text-dist", choices=TEXT_DISTS, default="exp", help="body length distribution around --mean-chars")
+    ap.add_argument("--days", type=int, default=7, help="spread thread creation times over this many days")
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    if args.layout == "arctic":
+        st = write_arctic(Path(args.root), args.subs, args.threads, args.comments, args.mean_chars, args.seed, args.days, args.text_dist)
+        log("INFO", f"corpus layout=arctic root={args.root} posts={st['posts']} comments={st['comments']} bytes={st['bytes']}")
+        return 0
+    st = write_staged(Path(args.root), args.subs, args.threads, args.comments, args.mean_chars, args.seed,
+                      days=args.days, text_dist=args.text_dist)
+    log("INFO", f"corpus layout={args.layout} root={args.root} files={st['files']} threads={st['threads']} comments={st['comments']}")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import struct
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+# Stand-in for the Gemini API (models/{model}:embedContent, :batchEmbedContents
+# and :generateContent, any API version). Vectors and answers are a pure function
+# of the input, so reruns and the Vectorize stand-in see identical values.
+# google-genai picks it up through GOOGLE_GEMINI_BASE_URL. GET /_stats returns
+# request counters; POST /_reset clears them.
+
+RE_PATH = re.compile(r"^/[^/]+/models/(?P<model>[^:/]+):(?P<method>embedContent|batchEmbedContents|generateContent)$")
+
+def log(level, msg):
+    sys.stderr.write(f"[{level}] {msg}\n")
+
+def embed_text(text: str, dim: int) -> list[float]:
+    """Unit vector drawn from the text's SHAKE-256 stream (cheap enough not to dominate a bench)."""
+    v = struct.unpack(f"<{dim}h", hashlib.shake_256(text.encode("utf-8")).digest(2 * dim))
+    n = math.sqrt(sum(x * x for x in v)) or 1.0
+    return [round(x / n, 6) for x in v]
+
+def gen_answer(prompt: str, chars: int) -> str:
+    h = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    return (f"stub answer {h[:16]} " * (chars // 29 + 1))[:chars]
+
+class GeminiStub:
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0, fail_every: int = 0, default_dim: int = 768,
+                 gen_latency_ms: float = 0.0, gen_chars: int = 400):
+        self.latency_ms = latency_ms
+        self.gen_latency_ms = gen_latency_ms
+        self.gen_chars = gen_chars
+        self.jitter_ms = jitter_ms
+        self.fail_every = fail_every
+        self.default_dim = default_dim
+        self.lock = threading.Lock()
+        self.stats = {}
+        self.texts = 0
+        self.chars = 0
+        self.requests = 0
+
+    def count(self, op: str, texts: int = 0, chars: int = 0):
+        with self.lock:
+            self.stats[op] = self.stats.get(op, 0) + 1
+            self.texts += texts
+            self.chars += chars
+
+    def delay(self, base_ms: float | None = None):
+        ms = (self.latency_ms if base_ms is None else base_ms) + (random.uniform(0, self.jitter_ms) if self.jitter_ms > 0 else 0.0)
+        if ms > 0:
+            time.sleep(ms / 1000.0)
+
+    def throttled(self) -> bool:
+        """Every fail_every-th request is answered 429, to exercise client retries."""
+        with self.lock:
+            self.requests += 1
+            return self.fail_every > 0 and self.requests % self.fail_every == 0
+
+    def snapshot(self):
+        with self.lock:
+            return {"ops": dict(self.stats), "texts": self.texts, "chars": self.chars}
+
+    def reset(self):
+        with self.lock:
+            self.stats.clear()
+            self.texts = 0
+            self.chars = 0
+            self.requests = 0
+
+def _content_text(content: dict) -> str:
+    return "".join(p.get("text", "") for p in (content or {}).get("parts") or [])
+
+def _mk_handler(stub: GeminiStub):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def _send(self, code: int, doc: dict):
+            body = json.dumps(doc).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.startswith("/_stats"):
+                self._send(200, stub.snapshot())
+                return
+            self._send(404, {"error": {"code": 404, "status": "NOT_FOUND"}})
+
+        def do_POST(self):
+            if self.path.startswith("/_reset"):
+                stub.reset()
+                self._send(200, {})
+                return
+            n = int(self.headers.get("Content-Length", "0") or 0)
+            body = self.rfile.read(n) if n > 0 else b""
+            m = RE_PATH.match(urlsplit(self.path).path)
+            if not m:
+                self._send(404, {"error": {"code": 404, "message": f"unknown path {self.path}", "status": "NOT_FOUND"}})
+                return
+            stub.delay(stub.gen_latency_ms if m.group("method") == "generateContent" else None)
+            if stub.throttled():
+                stub.count("throttled")
+                self._send(429, {"error": {"code": 429, "message": "Resource has been exhausted", "status": "RESOURCE_EXHAUSTED"}})
+                return
+            req = json.loads(body or b"{}")
+            if m.group("method") == "generateContent":
+                prompt = "".join(_content_text(c) for c in req.get("contents") or [])
+                ans = gen_answer(prompt, stub.gen_chars)
+                stub.count("generateContent", 1, len(prompt))
+                self._send(200, {
+                    "candidates": [{"content": {"role": "model", "parts": [{"text": ans}]}, "finishReason": "STOP", "index": 0}],
+                    "usageMetadata": {"promptTokenCount": len(prompt) // 4, "candidatesTokenCount": len(ans) // 4},
+                    "modelVersion": m.group("model"),
+                })
+                return
+            if m.group("method") == "embedContent":
+                reqs = [req]
+            else:
+                reqs = req.get("requests") or []
+            out = []
+            chars = 0
+            for r in reqs:
+                text = _content_text(r.get("content"))
+                chars += len(text)
+                out.append({"values": embed_text(text, int(r.get("outputDimensionality") or stub.default_dim))})
+            stub.count(m.group("method"), len(reqs), chars)
+            if m.group("method") == "embedContent":
+                self._send(200, {"embedding": out[0]})
+            else:
+                self._send(200, {"embeddings": out})
+
+    return Handler
+
+def serve(host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0.0, jitter_ms: float = 0.0, fail_every: int = 0,
+          gen_latency_ms: float = 0.0):
+    """Start the stub on a background thread; returns (stub, server, base_url)."""
+    stub = GeminiStub(latency_ms, jitter_ms, fail_every, gen_latency_ms=gen_latency_ms)
+    srv = ThreadingHTTPServer((host, port), _mk_handler(stub))
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return stub, srv, f"http://{host}:{srv.server_address[1]}"
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=9001)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--gen-latency-ms", type=float, default=0.0, help="latency of generateContent (embed calls use --latency-ms)")
+    ap.add_argument("--fail-every", type=int, default=0, help="answer every Nth request with 429 (0 = never)")
+    args = ap.parse_args()
+
+    _, srv, base = serve(args.host, args.port, args.latency_ms, args.jitter_ms, args.fail_every, args.gen_latency_ms)
+    log("INFO", f"geministub listening base_url={base} latency_ms={args.latency_ms} gen_latency_ms={args.gen_latency_ms} jitter_ms={args.jitter_ms} fail_every={args.fail_every}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        srv.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import corpus  # noqa: E402
+
+IMPORTER = ROOT_DIR / "scripts/tools/import_arctic.py"
+
+def log(level, msg):
+    sys.stderr.write(f"[{level}] {msg}\n")
+
+def tree_digest(root: Path):
+    """Digest of every relative path and file body under root; equal trees give equal digests."""
+    h = hashlib.sha256()
+    n = 0
+    for p in sorted(root.rglob("*.jsonl")):
+        h.update(str(p.relative_to(root)).encode("utf-8") + b"\0")
+        h.update(p.read_bytes() + b"\0")
+        n += 1
+    return h.hexdigest()[:16], n
+
+def tree_names(root: Path, suffix: str):
+    """Set of (thread dir, capture_ts, hash16) for every file under root with suffix."""
+    out = set()
+    for p in root.rglob(f"*{suffix}"):
+        cap, _, h = p.name[: -len(suffix)].partition("_")
+        out.add((str(p.parent.relative_to(root)), cap, h[:16]))
+    return out
+
+def run_import(dumps: Path, out: Path, extra: list[str]):
+    cmd = [sys.executable, str(IMPORTER), "--root", str(out), *extra,
+           str(dumps / "bench_posts.jsonl"), str(dumps / "bench_comments.jsonl")]
+    t0 = time.perf_counter()
+    p = subprocess.run(cmd, capture_output=True, text=True)
+    wall = time.perf_counter() - t0
+    if p.returncode != 0:
+        sys.stderr.write(p.stderr[-4000:])
+        raise RuntimeError(f"importer failed rc={p.returncode}")
+    done = {}
+    for ln in p.stderr.splitlines():
+        for kind in ("posts", "comments"):
+            if ln.startswith(f"[INFO] {kind} done "):
+                done[kind] = dict(kv.split("=", 1) for kv in ln.split()[3:] if "=" in kv)
+    return wall, done
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--subs", type=int, default=4)
+    ap.add_argument("--threads", type=int, default=500)
+    ap.add_argument("--comments", type=int, default=40)
+    ap.add_argument("--mean-chars", type=int, default=160)
+    ap.add_argument("--workers", default="1,2,4", help="worker counts to time with --codec auto")
+    ap.add_argument("--shard-mb", type=int, default=4)
+    ap.add_argument("--group-mem-mb", type=int, default=8, help="also time a pass that spills comment groups at this ceiling (0 to skip)")
+    ap.add_argument("--parquet", choices=["true", "false"], default="true", help="also time --out-format parquet and check its names against 00_raw")
+    ap.add_argument("--out", default="")
+    args = ap.parse_args()
+
+    results = []
+    ok = True
+    with tempfile.TemporaryDirectory(prefix="teidaishu_bench_import_") as td:
+        dumps = Path(td) / "arctic"
+        st = corpus.write_arctic(dumps, args.subs, args.threads, args.comments, args.mean_chars, seed=1)
+        log("INFO", f"corpus posts={st['posts']} comments={st['comments']} bytes={st['bytes']} cpus={os.cpu_count()}")
+
+        passes = [("json", 1, 0)] + [("auto", int(w), 0) for w in args.workers.split(",") if w.strip()]
+        if args.group_mem_mb > 0:
+            passes.append(("auto", 1, args.group_mem_mb))
+        want = None
+        for codec, workers, mem in passes:
+            out = Path(td) / f"00_raw_{codec}_{workers}_{mem}"
+            extra = ["--codec", codec, "--workers", str(workers), "--shard-mb", str(args.shard_mb), "--group-mem-mb", str(mem)]
+            wall, done = run_import(dumps, out, extra)
+            digest, files = tree_digest(out)
+            want = want or digest
+            same = digest == want
+            ok = ok and same
+            lines = sum(int(d.get("scanned", 0)) for d in done.values())
+            row = {"codec": codec, "workers": workers, "group_mem_mb": mem, "wall_s": round(wall, 2), "lines": lines,
+                   "lines_per_s": round(lines / wall), "lines_per_s_core": round(lines / wall / workers),
+                   "files": files, "digest": digest, "same_as_baseline": same, "done": done}
+            results.append(row)
+            log("INFO" if same else "ERROR",
+                f"codec={codec} workers={workers} group_mem_mb={mem} wall_s={wall:.2f} lines_per_s={row['lines_per_s']} "
+                f"lines_per_s_core={row['lines_per_s_core']} files={files} digest={digest} same={same}")
+
+        if args.parquet == "true":
+            out = Path(td) / "01_parquet"
+            wall, done = run_import(dumps, out, ["--out-format", "parquet", "--shard-mb", str(args.shard_mb)])
+            names = tree_names(out, ".parquet")
+            same = names == tree_names(Path(td) / "00_raw_json_1_0", ".jsonl")
+            ok = ok and same
+            lines = sum(int(d.get("scanned", 0)) for d in done.values())
+            results.append({"out_format": "parquet", "workers": 1, "wall_s": round(wall, 2), "lines": lines,
+                            "lines_per_s": round(lines / wall), "files": len(names), "same_names_as_raw": same, "done": done})
+            log("INFO" if same else "ERROR",
+                f"out_format=parquet wall_s={wall:.2f} lines_per_s={lines / wall:.0f} files={len(names)} files_per_s={len(names) / wall:.0f} same_names={same}")
+
+    doc = {"ts": int(time.time()), "cpus": os.cpu_count(), "corpus": st, "results": results}
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(doc, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+    sys.stdout.write(json.dumps(doc, ensure_ascii=False, indent=2) + "\n")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    raise SystemExit(main())
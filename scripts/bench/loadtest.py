@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+import shlex
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import corpus  # noqa: E402
+import geministub  # noqa: E402
+import vectorizestub  # noqa: E402
+
+# Replays a query corpus against the query and ask CLIs at a fixed concurrency
+# (closed loop) or arrival rate (open loop), with Gemini and Vectorize replaced
+# by the latency-injecting stand-ins. Each scenario reports throughput, latency
+# percentiles, errors, the per-stage split from the CLIs' trace records and, for
+# ask, how the 429 retry/backoff settings play out (--gemini-fail-every with a
+# list of --retry-backoff-ms values).
+
+ENTRIES = {
+    "query": ROOT_DIR / "apps/reddit/index/cmd/query/main.py",
+    "ask": ROOT_DIR / "apps/reddit/index/cmd/ask/main.py",
+}
+
+INDEX = "bench"
+EMBED_MODEL = "gemini-embedding-001"
+GEN_MODEL = "gemini-2.5-flash"
+
+# Stages in trace order; "startup" is wall time not covered by the trace's total.
+STAGES = ("startup", "cache", "init", "embed", "vector", "catalog", "hydrate", "gen")
+
+RE_STATUS = re.compile(r"\b([45]\d\d)\b")
+
+def log(level, msg):
+    sys.stderr.write(f"[{level}] {msg}\n")
+
+def pct(xs: list[float], p: float) -> float:
+    """Nearest-rank percentile (same definition as the CLIs' hedge p95)."""
+    if not xs:
+        return 0.0
+    s = sorted(xs)
+    return s[min(len(s) - 1, max(0, math.ceil(p / 100.0 * len(s)) - 1))]
+
+def summarize(xs: list[float]) -> dict:
+    if not xs:
+        return {"n": 0}
+    return {
+        "n": len(xs),
+        "mean": round(sum(xs) / len(xs), 1),
+        "p50": round(pct(xs, 50), 1),
+        "p95": round(pct(xs, 95), 1),
+        "p99": round(pct(xs, 99), 1),
+        "max": round(max(xs), 1),
+    }
+
+def parse_list(s: str, conv) -> list:
+    return [conv(x) for x in s.split(",") if x.strip()]
+
+def seed_index(stub: vectorizestub.VectorizeStub, args) -> list[str]:
+    """Load the corpus into the Vectorize stand-in with the indexer's ids and metadata.
+
+    Returns the thread titles, used as the query corpus when --queries is not given.
+    """
+    ix = stub.indexes.setdefault(INDEX, {})
+    titles = []
+    for sub, _, sid, (_, title, body), rows in corpus.iter_threads(args.subs, args.threads, args.comments, args.mean_chars, args.seed, args.days):
+        text = f"{title}\n{body}"
+        h = hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+        ix[f"r:s:{sub}:{sid}"] = (geministub.embed_text(text, args.embed_dim), {"src": "r", "sub": sub, "t": "s", "sid": sid, "h": h})
+        for cid, parent, _, cbody in rows:
+            h = hashlib.sha256(cbody.encode("utf-8")).hexdigest()[:16]
+            md = {"src": "r", "sub": sub, "t": "c", "sid": sid, "pid": parent, "h": h}
+            ix[f"r:c:{sub}:{cid}"] = (geministub.embed_text(cbody, args.embed_dim), md)
+        titles.append(title)
+    return titles
+
+def entry_cmd(entry: str, q: str, staged: Path, trace_path: Path, latency_path: Path, backoff_ms: int | None, args) -> list[str]:
+    cmd = [sys.executable, str(ENTRIES[entry])]
+    if entry == "query":
+        cmd += [
+            "--index", INDEX,
+            "--gemini-model", EMBED_MODEL,
+            "--embed-dim", str(args.embed_dim),
+            "--with-text",
+            "--format", "jsonl",
+        ]
+        extra = args.query_args
+    else:
+        cmd += [
+            "--index", INDEX,
+            "--embed-model", EMBED_MODEL,
+            "--embed-dim", str(args.embed_dim),
+            "--gen-model", GEN_MODEL,
+            "--embed-retry-max", str(args.retry_max),
+            "--embed-retry-backoff-ms", str(backoff_ms),
+            "--gen-retry-max", str(args.retry_max),
+            "--gen-retry-backoff-ms", str(backoff_ms),
+        ]
+        extra = args.ask_args
+    cmd += [
+        "--staged-root", str(staged),
+        "--compact-root", str(staged.parent / "02c_compact"),
+        "--lookback-days", "0",
+        "--timeout-s", str(args.timeout_s),
+        "--trace", "false",
+        "--trace-path", str(trace_path),
+        "--latency-path", str(latency_path),
+    ]
+    return cmd + shlex.split(extra) + [q]
+
+def err_kind(rc: int, stderr: str) -> str:
+    """Short label for a failed run: the exception (or [ERROR] line) and any HTTP status."""
+    if rc == -1:
+        return "timeout"
+    last = ""
+    for ln in reversed(stderr.splitlines()):
+        if ln.strip():
+            last = ln.strip()
+            break
+    if last.startswith("[ERROR]"):
+        label = last[len("[ERROR]"):].strip().split(" ")[0]
+    else:
+        label = last.split(":", 1)[0].rsplit(".", 1)[-1] or f"rc={rc}"
+    m = RE_STATUS.search(last)
+    return f"{label} {m.group(1)}" if m else label
+
+def read_trace(path: Path) -> dict:
+    out = {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for ln in f:
+                rec = json.loads(ln)
+                out[rec["stage"]] = out.get(rec["stage"], 0.0) + float(rec["ms"])
+    except FileNotFoundError:
+        pass
+    return out
+
+class Scenario:
+    def __init__(self, entry: str, mode: str, load: float, backoff_ms: int | None, td: Path, staged: Path, queries: list[str], env: dict, args):
+        self.entry = entry
+        self.mode = mode
+        self.load = load
+        self.backoff_ms = backoff_ms
+        self.name = f"{entry}_{mode}{load:g}" + (f"_b{backoff_ms}" if backoff_ms is not None else "")
+        self.dir = td / self.name
+        self.dir.mkdir(parents=True)
+        self.staged = staged
+        self.queries = queries
+        self.env = env
+        self.args = args
+        self.runs = [None] * args.requests
+
+    def run_one(self, i: int, due: float):
+        q = self.queries[(i + self.args.query_offset) % len(self.queries)]
+        trace_path = self.dir / f"{i:05d}.trace.jsonl"
+        cmd = entry_cmd(self.entry, q, self.staged, trace_path, self.dir / "latency.json", self.backoff_ms, self.args)
+        start = time.perf_counter()
+        try:
+            p = subprocess.run(cmd, env=self.env, stdin=subprocess.DEVNULL, capture_output=True, text=True, timeout=self.args.request_timeout_s)
+            rc, stderr = p.returncode, p.stderr
+        except subprocess.TimeoutExpired:
+            rc, stderr = -1, ""
+        end = time.perf_counter()
+        stages = read_trace(trace_path)
+        wall_ms = (end - start) * 1000.0
+        if "total" in stages:
+            stages["startup"] = max(0.0, wall_ms - stages["total"])
+        self.runs[i] = {
+            "start": start,
+            "end": end,
+            # Open loop measures from the scheduled arrival, so dispatch lag is not hidden.
+            "latency_ms": (end - due) * 1000.0,
+            "rc": rc,
+            "err": "" if rc == 0 else err_kind(rc, stderr),
+            "degraded": "action=degrade" in stderr,
+            "hedges": stderr.count("action=fire"),
+            "stages": stages,
+        }
+        if rc != 0 and self.args.verbose:
+            log("WARN", f"scenario={self.name} i={i} rc={rc} stderr_tail={stderr[-300:]!r}")
+
+    def closed_loop(self, conc: int):
+        nxt = [0]
+        lock = threading.Lock()
+
+        def worker():
+            while True:
+                with lock:
+                    i = nxt[0]
+                    nxt[0] += 1
+                if i >= len(self.runs):
+                    return
+                self.run_one(i, time.perf_counter())
+
+        ths = [threading.Thread(target=worker, daemon=True) for _ in range(max(1, conc))]
+        for th in ths:
+            th.start()
+        for th in ths:
+            th.join()
+
+    def open_loop(self, qps: float):
+        t0 = time.perf_counter()
+        ths = []
+        for i in range(len(self.runs)):
+            due = t0 + i / qps
+            wait = due - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            th = threading.Thread(target=self.run_one, args=(i, due), daemon=True)
+            th.start()
+            ths.append(th)
+        for th in ths:
+            th.join()
+
+    def run(self, gstub: geministub.GeminiStub, vstub: vectorizestub.VectorizeStub) -> dict:
+        g0 = gstub.snapshot()["ops"]
+        v0 = vstub.snapshot()["ops"]
+        if self.mode == "qps":
+            self.open_loop(self.load)
+        else:
+            self.closed_loop(int(self.load))
+        g1 = gstub.snapshot()["ops"]
+        v1 = vstub.snapshot()["ops"]
+
+        runs = self.runs
+        ok = [r for r in runs if r["rc"] == 0]
+        span = max(r["end"] for r in runs) - min(r["start"] for r in runs)
+        errors = {}
+        for r in runs:
+            if r["err"]:
+                errors[r["err"]] = errors.get(r["err"], 0) + 1
+        stages = {}
+        for st in STAGES:
+            xs = [r["stages"][st] for r in ok if st in r["stages"]]
+            if xs:
+                stages[st] = summarize(xs)
+        return {
+            "scenario": self.name,
+            "entry": self.entry,
+            "mode": self.mode,
+            "load": self.load,
+            "retry_backoff_ms": self.backoff_ms,
+            "requests": len(runs),
+            "ok": len(ok),
+            "error_rate": round(1 - len(ok) / len(runs), 4),
+            "errors": errors,
+            "degraded": sum(1 for r in runs if r["degraded"]),
+            "hedges": sum(r["hedges"] for r in runs),
+            "throughput_rps": round(len(ok) / span, 3) if span > 0 else 0.0,
+            "latency_ms": summarize([r["latency_ms"] for r in ok]),
+            "stages_ms": stages,
+            "gemini_ops": {k: g1.get(k, 0) - g0.get(k, 0) for k in g1 if g1.get(k, 0) != g0.get(k, 0)},
+            "vectorize_ops": {k: v1.get(k, 0) - v0.get(k, 0) for k in v1 if v1.get(k, 0) != v0.get(k, 0)},
+        }
+
+def log_result(r: dict):
+    lat = r["latency_ms"]
+    errs = ",".join(f"{k}:{v}" for k, v in sorted(r["errors"].items())) or "-"
+    log("INFO", f"scenario={r['scenario']} requests={r['requests']} ok={r['ok']} error_rate={r['error_rate']} rps={r['throughput_rps']}"
+                f" p50_ms={lat.get('p50', 0)} p95_ms={lat.get('p95', 0)} p99_ms={lat.get('p99', 0)}"
+                f" throttled={r['gemini_ops'].get('throttled', 0)} hedges={r['hedges']} degraded={r['degraded']} errors={errs}")
+    split = " ".join(f"{st}={s['p50']}/{s['p95']}" for st, s in r["stages_ms"].items())
+    log("INFO", f"scenario={r['scenario']} stages_p50/p95_ms {split}")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--entry", action="append", default=[], choices=sorted(ENTRIES))
+    ap.add_argument("--concurrency", default="1,4", help="closed-loop client counts, comma-separated")
+    ap.add_argument("--qps", default="", help="open-loop arrival rates, comma-separated (replaces --concurrency)")
+    ap.add_argument("--requests", type=int, default=20, help="requests per scenario")
+    ap.add_argument("--queries", default="", help="query corpus, one query per line (default: corpus thread titles)")
+    ap.add_argument("--query-offset", type=int, default=0)
+    ap.add_argument("--subs", type=int, default=2)
+    ap.add_argument("--threads", type=int, default=50)
+    ap.add_argument("--comments", type=int, default=10)
+    ap.add_argument("--mean-chars", type=int, default=160)
+    ap.add_argument("--days", type=int, default=7)
+    ap.add_argument("--compact", choices=["true", "false"], default="false", help="run 02c_compact over the corpus so hydration reads its parts")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--embed-dim", type=int, default=64)
+    ap.add_argument("--gemini-latency-ms", type=float, default=80.0)
+    ap.add_argument("--gemini-gen-latency-ms", type=float, default=800.0)
+    ap.add_argument("--gemini-fail-every", type=int, default=0, help="answer every Nth Gemini request with 429")
+    ap.add_argument("--vectorize-latency-ms", type=float, default=40.0)
+    ap.add_argument("--jitter-ms", type=float, default=20.0)
+    ap.add_argument("--retry-max", type=int, default=6, help="ask --embed-retry-max/--gen-retry-max")
+    ap.add_argument("--retry-backoff-ms", default="1500", help="ask retry backoffs to compare, comma-separated")
+    ap.add_argument("--timeout-s", type=int, default=30, help="passed to the CLIs")
+    ap.add_argument("--request-timeout-s", type=float, default=120.0, help="kill a CLI run after this long")
+    ap.add_argument("--query-args", default="", help="extra query CLI args (e.g. \"--deadline-ms 2000 --hedge false\")")
+    ap.add_argument("--ask-args", default="", help="extra ask CLI args")
+    ap.add_argument("--verbose", action="store_true")
+    ap.add_argument("--out", default="")
+    args = ap.parse_args()
+
+    entries = args.entry or list(ENTRIES)
+    if args.qps:
+        mode, loads = "qps", parse_list(args.qps, float)
+    else:
+        mode, loads = "conc", parse_list(args.concurrency, int)
+    backoffs = parse_list(args.retry_backoff_ms, int)
+    if not loads or not backoffs or args.requests <= 0:
+        raise SystemExit("need at least one load level, one backoff and --requests > 0")
+
+    g, gsrv, gbase = geministub.serve(latency_ms=args.gemini_latency_ms, jitter_ms=args.jitter_ms, fail_every=args.gemini_fail_every,
+                                      gen_latency_ms=args.gemini_gen_latency_ms)
+    v, vsrv, vbase = vectorizestub.serve(latency_ms=args.vectorize_latency_ms, jitter_ms=args.jitter_ms)
+    env = dict(os.environ)
+    env.update({"GOOGLE_GEMINI_BASE_URL": gbase, "GEMINI_API_KEY": "bench", "CF_API_BASE": vbase, "CF_ACCOUNT_ID": "bench", "CF_API_TOKEN": "bench"})
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="teidaishu_bench_loadtest_") as tds:
+        td = Path(tds)
+        staged = td / "02_staged"
+        st = corpus.write_staged(staged, args.subs, args.threads, args.comments, args.mean_chars, args.seed, days=args.days)
+        if args.compact == "true":
+            subprocess.run(
+                [sys.executable, str(ROOT_DIR / "apps/reddit/compact/cmd/compactor/main.py"), "--staged-root", str(staged),
+                 "--compact-root", str(td / "02c_compact"), "--lookback-days", "0", "--discover", "scan"]
+                + [a for d in sorted(staged.glob("r_*")) for a in ("--sub", d.name[2:])],
+                check=True, stderr=None if args.verbose else subprocess.DEVNULL,
+            )
+        titles = seed_index(v, args)
+        queries = titles
+        if args.queries:
+            with open(args.queries, "r", encoding="utf-8") as f:
+                queries = [ln.strip() for ln in f if ln.strip()]
+        if not queries:
+            raise SystemExit("empty query corpus")
+        log("INFO", f"corpus threads={st['threads']} comments={st['comments']} vectors={v.snapshot()['vectors']} queries={len(queries)} cpus={os.cpu_count()}")
+
+        for entry in entries:
+            for load in loads:
+                for backoff in (backoffs if entry == "ask" else [None]):
+                    sc = Scenario(entry, mode, load, backoff, td, staged, queries, env, args)
+                    r = sc.run(g, v)
+                    log_result(r)
+                    results.append(r)
+
+    for srv in (gsrv, vsrv):
+        srv.shutdown()
+    doc = {
+        "ts": int(time.time()),
+        "cpus": os.cpu_count(),
+        "params": {k: getattr(args, k) for k in ("requests", "subs", "threads", "comments", "compact", "embed_dim", "retry_max", "query_args", "ask_args")},
+        "latency_ms": {"gemini_embed": args.gemini_latency_ms, "gemini_gen": args.gemini_gen_latency_ms, "vectorize": args.vectorize_latency_ms, "jitter": args.jitter_ms},
+        "gemini_fail_every": args.gemini_fail_every,
+        "results": results,
+    }
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(doc, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+    sys.stdout.write(json.dumps(doc, ensure_ascii=False, indent=2) + "\n")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
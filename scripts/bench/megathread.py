@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+import argparse
+import hashlib
+import importlib.util
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+
+# Per-thread cost of reading one large 02_staged comments file (a megathread) with
+# the indexer's and uploader's comment readers. Each run is a fresh process, so
+# peak RSS is the reader's own. "fetchall" is the previous reader (every row as a
+# tuple, then strip/truncate/hash in Python), kept as the baseline; "stream" is the
+# app's current reader. Both must yield the same rows.
+
+ENTRIES = {
+    "indexer": ROOT_DIR / "apps/reddit/index/cmd/indexer/main.py",
+    "uploader": ROOT_DIR / "apps/reddit/r2/cmd/uploader/main.py",
+}
+IMPLS = ("fetchall", "stream")
+
+# Downstream buffering: the indexer flushes every get_by_ids batch, the uploader
+# keeps a bounded number of objects in flight.
+BUF_ITEMS = 256
+
+BODY_UNIT = "メガスレ本文のテスト lorem ipsum dolor sit　"
+
+def log(level, msg):
+    sys.stderr.write(f"[{level}] {msg}\n")
+
+def write_megathread(path: Path, comments: int, mean_chars: int, seed: float):
+    """One comments file: every 40th body is blank, the rest are uniform in [1, 2 * mean_chars]."""
+    import duckdb
+
+    reps = mean_chars * 2 // len(BODY_UNIT) + 2
+    con = duckdb.connect(database=":memory:")
+    con.execute("SELECT setseed(?)", [seed])
+    con.execute(
+        "CREATE TEMP TABLE t AS SELECT "
+        "  'u_' || (i % 997) AS author, "
+        "  CASE WHEN i % 40 = 0 THEN ' \n ' "
+        "       ELSE '　' || left(repeat(?, ?), (random() * ? * 2)::INT + 1) || '\n' END AS body, "
+        "  printf('c%07d', i) AS comment_id, "
+        "  CASE WHEN i % 3 = 0 THEN 't3_mega' ELSE printf('t1_c%07d', i // 3) END AS parent_id "
+        "FROM range(?) r(i)",
+        [BODY_UNIT, reps, mean_chars, comments],
+    )
+    out = str(path).replace("'", "''")
+    con.execute(f"COPY t TO '{out}' (FORMAT parquet, COMPRESSION 'zstd')")
+    con.close()
+
+def _fetchall_rows(path: str, max_chars: int):
+    """The previous reader: fetchall, then per-row Python work."""
+    import duckdb
+
+    con = duckdb.connect(database=":memory:")
+    rows = con.execute(
+        "SELECT coalesce(comment_id,''), coalesce(parent_id,''), coalesce(author,''), coalesce(body,'') "
+        "FROM read_parquet(?) WHERE comment_id IS NOT NULL",
+        [path],
+    ).fetchall()
+    con.close()
+    for cid, pid, author, body in rows:
+        text = (body or "").strip()
+        if not text:
+            continue
+        if len(text) > max_chars:
+            text = text[:max_chars]
+        yield cid, pid, text, hashlib.sha256(text.encode("utf-8", errors="ignore")).hexdigest()[:16]
+
+def _rss_mb() -> float:
+    with open("/proc/self/statm", "r") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1048576
+
+def child(impl: str, app: str, path: str, max_chars: int):
+    importlib.import_module("duckdb")  # loaded before the baseline RSS, as in the apps
+
+    spec = importlib.util.spec_from_file_location(f"bench_{app}", ENTRIES[app])
+    mod = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(mod)
+
+    if impl == "fetchall":
+        rows = _fetchall_rows(path, max_chars)
+    elif app == "indexer":
+        rows = mod._iter_comment_rows(path, max_chars)
+    else:
+        rows = ((cid, "", text, h) for cid, text, h in mod._iter_comment_texts(path, max_chars))
+
+    digest = hashlib.sha256()
+    buf = []
+    n = 0
+    base = _rss_mb()
+    t0 = time.perf_counter()
+    for cid, pid, text, h in rows:
+        if app == "indexer":
+            buf.append((f"r:c:bench:{cid}", text, {"src": "r", "sub": "bench", "t": "c", "sid": "mega", "pid": pid, "h": h}))
+        else:
+            buf.append((mod._key_for("c", "bench", cid, h, "reddit/v1"), text.encode("utf-8")))
+        if len(buf) >= BUF_ITEMS:
+            buf = []
+        digest.update(f"{cid}\0{text}\0{h}\n".encode("utf-8"))
+        n += 1
+    wall = time.perf_counter() - t0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    sys.stdout.write(json.dumps({"rows": n, "wall_s": wall, "base_rss_mb": base, "peak_rss_mb": peak, "digest": digest.hexdigest()}) + "\n")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--comments", type=int, default=300000)
+    ap.add_argument("--mean-chars", type=int, default=400)
+    ap.add_argument("--max-chars", type=int, default=600)
+    ap.add_argument("--seed", type=float, default=0.42)
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--app", action="append", default=[], choices=sorted(ENTRIES))
+    ap.add_argument("--impl", action="append", default=[], choices=IMPLS)
+    ap.add_argument("--child", nargs=4, metavar=("IMPL", "APP", "PATH", "MAX_CHARS"), help=argparse.SUPPRESS)
+    ap.add_argument("--write", default="", help=argparse.SUPPRESS)
+    ap.add_argument("--out", default="")
+    args = ap.parse_args()
+
+    if args.child:
+        impl, app, path, max_chars = args.child
+        child(impl, app, path, int(max_chars))
+        return 0
+    if args.write:
+        write_megathread(Path(args.write), args.comments, args.mean_chars, args.seed)
+        return 0
+
+    apps = args.app or list(ENTRIES)
+    impls = args.impl or list(IMPLS)
+    results = []
+    mismatched = 0
+    with tempfile.TemporaryDirectory(prefix="teidaishu_bench_megathread_") as td:
+        path = Path(td) / "000000_mega_20260101000000_0123456789abcdef.parquet"
+        # Written by a child: ru_maxrss is inherited across fork, so building the file
+        # here would set every reader's peak to the writer's.
+        subprocess.run(
+            [sys.executable, __file__, "--write", str(path), "--comments", str(args.comments),
+             "--mean-chars", str(args.mean_chars), "--seed", str(args.seed)],
+            check=True,
+        )
+        log("INFO", f"megathread comments={args.comments} mean_chars={args.mean_chars} bytes={path.stat().st_size}")
+        for app in apps:
+            digests = set()
+            for impl in impls:
+                runs = []
+                for _ in range(max(1, args.runs)):
+                    p = subprocess.run(
+                        [sys.executable, __file__, "--child", impl, app, str(path), str(args.max_chars)],
+                        capture_output=True, text=True, check=True,
+                    )
+                    runs.append(json.loads(p.stdout))
+                digests.update(r["digest"] for r in runs)
+                wall = statistics.median(r["wall_s"] for r in runs)
+                peak = max(r["peak_rss_mb"] for r in runs)
+                growth = max(r["peak_rss_mb"] - r["base_rss_mb"] for r in runs)
+                rows = runs[0]["rows"]
+                results.append({
+                    "app": app,
+                    "impl": impl,
+                    "rows": rows,
+                    "wall_s": round(wall, 3),
+                    "rows_per_s": round(rows / wall, 1) if wall > 0 else 0.0,
+                    "peak_rss_mb": round(peak, 1),
+                    "rss_growth_mb": round(growth, 1),
+                })
+                log("INFO", f"app={app} impl={impl} rows={rows} wall_s={wall:.3f} rows_per_s={rows / wall:.0f} peak_rss_mb={peak:.1f} rss_growth_mb={growth:.1f} runs={len(runs)}")
+            if len(digests) != 1:
+                mismatched += 1
+                log("ERROR", f"app={app} outputs differ between {'/'.join(impls)}")
+
+    doc = {"ts": int(time.time()), "cpus": os.cpu_count(), "params": {k: getattr(args, k) for k in ("comments", "mean_chars", "max_chars", "seed", "runs")}, "results": results}
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(doc, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+    sys.stdout.write(json.dumps(doc, ensure_ascii=False, indent=2) + "\n")
+    return 1 if mismatched else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import corpus  # noqa: E402
+import geministub  # noqa: E402
+import s3stub  # noqa: E402
+import vectorizestub  # noqa: E402
+
+# End-to-end run of the reddit pipeline on a synthetic corpus, with Gemini,
+# Vectorize and R2 replaced by the local stand-ins. Each stage reports wall
+# time, items/s, peak RSS of its process and the requests it made.
+
+IMPORTER = ROOT_DIR / "scripts/tools/import_arctic.py"
+CONVERTER = ROOT_DIR / "apps/reddit/parquet/cmd/converter/main.py"
+STAGER = ROOT_DIR / "apps/reddit/staged/cmd/stager/main.py"
+EXTRACTOR = ROOT_DIR / "apps/reddit/extract/cmd/extractor/main.py"
+INDEXER = ROOT_DIR / "apps/reddit/index/cmd/indexer/main.py"
+UPLOADER = ROOT_DIR / "apps/reddit/r2/cmd/uploader/main.py"
+
+# Throughput is reported against this key of the stage's "done" line.
+ITEM_KEYS = {
+    "import_arctic": "lines",
+    "01_parquet": "wrote",
+    "02_staged": "wrote",
+    "02b_extract": "changed",
+    "03_index": "vectors",
+    "04_r2": "put_ok",
+}
+
+def log(level, msg):
+    sys.stderr.write(f"[{level}] {msg}\n")
+
+def done_fields(stderr: str) -> dict:
+    """key=value pairs of the last "[INFO] done ..." line."""
+    out = {}
+    for ln in stderr.splitlines():
+        if ln.startswith("[INFO] done "):
+            out = dict(kv.split("=", 1) for kv in ln.split()[2:] if "=" in kv)
+    return out
+
+# Stages are started by this small helper, launched before the corpus and the
+# stand-ins grow the bench process: a child's ru_maxrss starts from the RSS
+# high-water mark of whoever forked it, so forking from here would report the
+# bench's memory instead of the stage's.
+LAUNCHER = r"""
+import json, os, subprocess, sys
+for line in sys.stdin:
+    req = json.loads(line)
+    with open(req["stdout"], "w") as of, open(req["stderr"], "w") as ef:
+        p = subprocess.Popen(req["cmd"], env=req["env"], stdout=of, stderr=ef, stdin=subprocess.DEVNULL)
+        _, status, ru = os.wait4(p.pid, 0)
+    sys.stdout.write(json.dumps({"rc": os.waitstatus_to_exitcode(status), "maxrss_kb": ru.ru_maxrss}) + "\n")
+    sys.stdout.flush()
+"""
+
+class Launcher:
+    def __init__(self):
+        self.p = subprocess.Popen([sys.executable, "-c", LAUNCHER], stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+
+    def run(self, cmd: list[str], env: dict, log_path: Path):
+        """Run cmd to completion; returns (rc, wall_s, peak_rss_mb, stdout, stderr)."""
+        out_path = log_path.with_suffix(".stdout")
+        t0 = time.perf_counter()
+        self.p.stdin.write(json.dumps({"cmd": cmd, "env": env, "stdout": str(out_path), "stderr": str(log_path)}) + "\n")
+        self.p.stdin.flush()
+        res = json.loads(self.p.stdout.readline())
+        wall = time.perf_counter() - t0
+        return res["rc"], wall, res["maxrss_kb"] / 1024.0, out_path.read_text(encoding="utf-8"), log_path.read_text(encoding="utf-8")
+
+    def close(self):
+        self.p.stdin.close()
+        self.p.wait()
+
+def ops_delta(before: dict, after: dict) -> dict:
+    return {k: v - before.get(k, 0) for k, v in after.items() if v - before.get(k, 0)}
+
+class Suite:
+    def __init__(self, launcher: Launcher, td: Path, subs: list[str], args, env: dict, stubs: dict):
+        self.launcher = launcher
+        self.td = td
+        self.subs = subs
+        self.args = args
+        self.env = env
+        self.stubs = stubs
+        self.logs = td / "logs"
+        self.logs.mkdir(parents=True, exist_ok=True)
+        self.results = []
+
+    def sub_args(self):
+        out = []
+        for s in self.subs:
+            out += ["--sub", s]
+        return out
+
+    def stage(self, name: str, cmd: list[str], pass_name: str, post=None):
+        before = {k: s.snapshot()["ops"] for k, s in self.stubs.items()}
+        rc, wall, rss, out, err = self.launcher.run(cmd, self.env, self.logs / f"{pass_name}_{name}.log")
+        extra = {}
+        if rc == 0 and post is not None:
+            t0 = time.perf_counter()
+            extra = post(out)
+            wall += time.perf_counter() - t0
+        done = done_fields(err)
+        done.update(extra)
+        if name == "import_arctic":
+            done["lines"] = str(sum(int(v) for k, v in _import_scanned(err).items()))
+        items = int(float(done.get(ITEM_KEYS[name], 0) or 0))
+        requests = {}
+        for k, s in self.stubs.items():
+            d = ops_delta(before[k], s.snapshot()["ops"])
+            if d:
+                requests[k] = d
+        row = {
+            "pass": pass_name, "stage": name, "rc": rc, "wall_s": round(wall, 3), "items": items,
+            "items_per_s": round(items / wall, 1) if wall > 0 else 0.0, "peak_rss_mb": round(rss, 1),
+            "requests": requests, "done": done,
+        }
+        self.results.append(row)
+        if rc != 0:
+            sys.stderr.write(err[-4000:])
+        log("INFO" if rc == 0 else "ERROR",
+            f"pass={pass_name} stage={name} rc={rc} wall_s={wall:.2f} items={items} items_per_s={row['items_per_s']} "
+            f"peak_rss_mb={rss:.0f} requests={sum(sum(d.values()) for d in requests.values())}")
+        return rc == 0
+
+    def upsert(self, stdout: str) -> dict:
+        """What 03_index.sh does with each NDJSON path and extract cursor the indexer prints."""
+        import requests
+
+        vectors = 0
+        url = f"{self.env['CF_API_BASE']}/accounts/{self.env['CF_ACCOUNT_ID']}/vectorize/v2/indexes/bench/upsert"
+        for path in (ln.strip() for ln in stdout.splitlines()):
+            if not path:
+                continue
+            if path.startswith("cursor "):
+                cur = self.td / "03_index" / "_extract_cursor.json"
+                cur.parent.mkdir(parents=True, exist_ok=True)
+                cur.write_text(path[len("cursor "):] + "\n", encoding="utf-8")
+                continue
+            with open(path, "rb") as f:
+                body = f.read()
+            vectors += body.count(b"\n")
+            r = requests.post(url, data=body, headers={"Content-Type": "application/x-ndjson"}, timeout=60)
+            r.raise_for_status()
+            os.remove(path)
+        return {"vectors": str(vectors)}
+
+    def run_pass(self, pass_name: str, dumps: Path) -> bool:
+        a = self.args
+        td = self.td
+        ok = self.stage("import_arctic", [sys.executable, str(IMPORTER), "--root", str(td / "00_raw"), "--workers", str(a.workers),
+                                          str(dumps / "bench_posts.jsonl"), str(dumps / "bench_comments.jsonl")], pass_name)
+        ok = ok and self.stage("01_parquet", [sys.executable, str(CONVERTER), "--raw-root", str(td / "00_raw"), "--parquet-root", str(td / "01_parquet"),
+                                              "--lookback-days", "0", *self.sub_args()], pass_name)
+        ok = ok and self.stage("02_staged", [sys.executable, str(STAGER), "--parquet-root", str(td / "01_parquet"), "--staged-root", str(td / "02_staged"),
+                                             "--lookback-days", "0", *self.sub_args()], pass_name)
+        ok = ok and self.stage("02b_extract", [sys.executable, str(EXTRACTOR), "--staged-root", str(td / "02_staged"), "--extract-root", str(td / "02b_extract"),
+                                               "--lookback-days", "0", "--max-chars", "65536", *self.sub_args()], pass_name)
+        ok = ok and self.stage("03_index", [
+            sys.executable, str(INDEXER), "--staged-root", str(td / "02_staged"), "--index-root", str(td / "03_index"),
+            "--lookback-days", "0", "--index-name", "bench", "--vector-dim", str(a.embed_dim), "--gemini-model", "gemini-embedding-001",
+            "--embed-dim", str(a.embed_dim), "--task-type", "RETRIEVAL_DOCUMENT", "--embed-batch-size", str(a.embed_batch_size),
+            "--get-by-ids-batch-size", "256", "--max-chars", "65536", "--max-vectors-per-run", "10485760",
+            "--embed-sleep-ms", "0", "--embed-jitter-ms", "0", "--embed-retry-max", "4", "--embed-retry-backoff-ms", "50",
+            "--on-embed-429", "stop", "--extract-root", str(td / "02b_extract"), "--extract-cursor", str(td / "03_index" / "_extract_cursor.json"),
+            *self.sub_args()], pass_name, post=self.upsert)
+        ok = ok and self.stage("04_r2", [
+            sys.executable, str(UPLOADER), "--staged-root", str(td / "02_staged"), "--lookback-days", "0", "--bucket", "bench",
+            "--prefix", "reddit/v1", "--max-chars", "65536", "--max-objects-per-run", "0", "--check-exists", "true",
+            "--exists-mode", "list", "--concurrency", str(a.r2_concurrency),
+            "--extract-root", str(td / "02b_extract"), "--extract-cursor", str(td / "cache" / "r2_extract_cursor.json"),
+            *self.sub_args()], pass_name)
+        return ok
+
+def _import_scanned(stderr: str) -> dict:
+    out = {}
+    for ln in stderr.splitlines():
+        for kind in ("posts", "comments"):
+            if ln.startswith(f"[INFO] {kind} done "):
+                kv = dict(x.split("=", 1) for x in ln.split()[3:] if "=" in x)
+                out[kind] = int(kv.get("scanned", 0))
+    return out
+
+def compare(prev: dict, cur: dict):
+    """Print items/s, wall and RSS against a previous run of the same suite."""
+    old = {(r["pass"], r["stage"]): r for r in prev.get("results", []) if "stage" in r}
+    lines = []
+    for r in cur["results"]:
+        o = old.get((r["pass"], r["stage"]))
+        if o is None:
+            continue
+        pct = lambda a, b: f"{(a - b) / b * 100:+.0f}%" if b else "n/a"
+        lines.append(f"  {r['pass']:<5} {r['stage']:<13} items_per_s {o['items_per_s']:>9} -> {r['items_per_s']:>9} ({pct(r['items_per_s'], o['items_per_s'])})"
+                     f"  wall_s {o['wall_s']:>7} -> {r['wall_s']:>7}  peak_rss_mb {o['peak_rss_mb']:>6} -> {r['peak_rss_mb']:>6}")
+    if lines:
+        sys.stderr.write(f"[INFO] compare baseline_ts={prev.get('ts')} corpus_same={prev.get('params') == cur.get('params')}\n")
+        sys.stderr.write("\n".join(lines) + "\n")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--subs", type=int, default=2)
+    ap.add_argument("--threads", type=int, default=150)
+    ap.add_argument("--comments", type=int, default=20)
+    ap.add_argument("--mean-chars", type=int, default=160)
+    ap.add_argument("--text-dist", choices=corpus.TEXT_DISTS, default="exp")
+    ap.add_argument("--days", type=int, default=7)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--workers", type=int, default=1, help="import_arctic workers")
+    ap.add_argument("--embed-dim", type=int, default=1536)
+    ap.add_argument("--embed-batch-size", type=int, default=20)
+    ap.add_argument("--r2-concurrency", type=int, default=16)
+    ap.add_argument("--gemini-latency-ms", type=float, default=50.0)
+    ap.add_argument("--gemini-fail-every", type=int, default=0, help="answer every Nth embed request with 429")
+    ap.add_argument("--vectorize-latency-ms", type=float, default=30.0)
+    ap.add_argument("--r2-latency-ms", type=float, default=15.0)
+    ap.add_argument("--rerun", choices=["true", "false"], default="true", help="also time a second pass with nothing new")
+    ap.add_argument("--baseline", default="", help="previous result to compare against (default: the current --out file)")
+    ap.add_argument("--keep", default="", help="copy the work tree (data and per-stage logs) here")
+    ap.add_argument("--out", default="")
+    args = ap.parse_args()
+
+    launcher = Launcher()
+    baseline_path = args.baseline or args.out
+    prev = None
+    if baseline_path and os.path.isfile(baseline_path):
+        with open(baseline_path, "r", encoding="utf-8") as f:
+            prev = json.load(f)
+
+    g, gsrv, gbase = geministub.serve(latency_ms=args.gemini_latency_ms, fail_every=args.gemini_fail_every)
+    v, vsrv, vbase = vectorizestub.serve(latency_ms=args.vectorize_latency_ms)
+    s3, ssrv, sbase = s3stub.serve(latency_ms=args.r2_latency_ms)
+    env = dict(os.environ)
+    env.update({
+        "GOOGLE_GEMINI_BASE_URL": gbase, "GEMINI_API_KEY": "bench",
+        "CF_API_BASE": vbase, "CF_ACCOUNT_ID": "bench", "CF_API_TOKEN": "bench",
+        "R2_ENDPOINT": sbase, "R2_ACCESS_KEY_ID": "bench", "R2_SECRET_ACCESS_KEY": "bench",
+    })
+    params = {k: getattr(args, k) for k in ("subs", "threads", "comments", "mean_chars", "text_dist", "days", "seed", "embed_dim")}
+    ok = True
+    with tempfile.TemporaryDirectory(prefix="teidaishu_bench_pipeline_") as tds:
+        td = Path(tds)
+        dumps = td / "arctic"
+        st = corpus.write_arctic(dumps, args.subs, args.threads, args.comments, args.mean_chars, args.seed, args.days, args.text_dist)
+        log("INFO", f"corpus posts={st['posts']} comments={st['comments']} bytes={st['bytes']} text_dist={args.text_dist} cpus={os.cpu_count()}")
+        suite = Suite(launcher, td, [f"bench{i}" for i in range(args.subs)], args, env, {"gemini": g, "vectorize": v, "r2": s3})
+        t0 = time.perf_counter()
+        ok = suite.run_pass("cold", dumps)
+        cold_wall = time.perf_counter() - t0
+        if ok and args.rerun == "true":
+            ok = suite.run_pass("rerun", dumps)
+        if args.keep:
+            os.makedirs(args.keep, exist_ok=True)
+            subprocess.run(["cp", "-a", f"{tds}/.", args.keep], check=False)
+
+    launcher.close()
+    for srv in (gsrv, vsrv, ssrv):
+        srv.shutdown()
+    doc = {
+        "ts": int(time.time()), "cpus": os.cpu_count(), "params": params, "corpus": st,
+        "latency_ms": {"gemini": args.gemini_latency_ms, "vectorize": args.vectorize_latency_ms, "r2": args.r2_latency_ms},
+        "cold_wall_s": round(cold_wall, 2), "stubs": {"gemini": g.snapshot(), "vectorize": v.snapshot(), "r2": s3.snapshot()["ops"]},
+        "results": suite.results,
+    }
+    if prev is not None:
+        compare(prev, doc)
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(doc, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+    sys.stdout.write(json.dumps(doc, ensure_ascii=False, indent=2) + "\n")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    raise SystemExit(main())
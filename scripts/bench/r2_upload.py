@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, str(ROOT_DIR / "scripts/tools"))
+
+import corpus  # noqa: E402
+import r2_bundle  # noqa: E402
+import s3stub  # noqa: E402
+
+UPLOADER = ROOT_DIR / "apps/reddit/r2/cmd/uploader/main.py"
+
+def log(level, msg):
+    sys.stderr.write(f"[{level}] {msg}\n")
+
+def run_uploader(staged: Path, endpoint: str, subs: list[str], extra: list[str]):
+    env = dict(os.environ)
+    env["R2_ENDPOINT"] = endpoint
+    env["R2_ACCESS_KEY_ID"] = "bench"
+    env["R2_SECRET_ACCESS_KEY"] = "bench"
+    cmd = [
+        sys.executable, str(UPLOADER),
+        "--staged-root", str(staged),
+        "--lookback-days", "0",
+        "--bucket", "bench",
+        "--prefix", "reddit/v1",
+        "--max-chars", "65536",
+        "--check-exists", "true",
+        *extra,
+    ]
+    for s in subs:
+        cmd += ["--sub", s]
+    t0 = time.perf_counter()
+    p = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - t0
+    if p.returncode != 0:
+        sys.stderr.write(p.stderr[-4000:])
+        raise RuntimeError(f"uploader failed rc={p.returncode}")
+    done = ""
+    for ln in p.stderr.splitlines():
+        if ln.startswith("[INFO] done "):
+            done = ln[len("[INFO] done "):]
+        elif ln.startswith("[INFO] bytes "):
+            done = f"{done} {ln[len('[INFO] bytes '):]}".strip()
+    return wall, done
+
+def bench_s3(endpoint: str):
+    os.environ["R2_ENDPOINT"] = endpoint
+    os.environ["R2_ACCESS_KEY_ID"] = "bench"
+    os.environ["R2_SECRET_ACCESS_KEY"] = "bench"
+    return r2_bundle.mk_s3()
+
+def check_texts(stub, endpoint: str) -> bool:
+    """Read every per-object text back through the reader and check it against its key hash."""
+    s3 = bench_s3(endpoint)
+    with stub.lock:
+        keys = sorted(k for (b, k) in stub.objects if b == "bench" and k.endswith(".txt"))
+    bad = 0
+    for key in keys:
+        text = r2_bundle.read_text(s3, "bench", key)
+        if hashlib.sha256(text.encode("utf-8")).hexdigest()[:16] != key.rsplit("/", 1)[1][: -len(".txt")]:
+            bad += 1
+    log("INFO" if bad == 0 else "ERROR", f"text_check objects={len(keys)} bad={bad}")
+    return bad == 0
+
+def check_bundles(stub, endpoint: str) -> bool:
+    """Read every bundle back through the range reader and check each text hash."""
+    s3 = bench_s3(endpoint)
+    with stub.lock:
+        keys = sorted(k for (b, k) in stub.objects if b == "bench" and k.endswith(".tdb"))
+    before = stub.snapshot()["ops"].get("get", 0)
+    entries = 0
+    bad = 0
+    for key in keys:
+        whole = r2_bundle.read_thread(s3, "bench", key)
+        bnd = r2_bundle.open_bundle(s3, "bench", key)
+        got = r2_bundle.read_entries(s3, "bench", bnd, [(t, eid) for t, eid, _, _ in whole])
+        for t, eid, h, text in whole:
+            entries += 1
+            if hashlib.sha256(text.encode("utf-8")).hexdigest()[:16] != h or got.get((t, eid)) != text:
+                bad += 1
+    gets = stub.snapshot()["ops"].get("get", 0) - before
+    log("INFO" if bad == 0 else "ERROR", f"bundle_check bundles={len(keys)} entries={entries} bad={bad} gets={gets}")
+    return bad == 0
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--subs", type=int, default=2)
+    ap.add_argument("--threads", type=int, default=40)
+    ap.add_argument("--comments", type=int, default=25)
+    ap.add_argument("--mean-chars", type=int, default=120)
+    ap.add_argument("--latency-ms", type=float, default=15.0, help="injected per-request latency of the S3 stand-in")
+    ap.add_argument("--concurrency", default="1,4,16,32")
+    ap.add_argument("--exists-mode", default="head,list", help="existence check modes to time on the rerun pass")
+    ap.add_argument("--manifest", choices=["true", "false"], default="true", help="also time a rerun backed by the upload manifest")
+    ap.add_argument("--bundle", choices=["true", "false"], default="true", help="also upload and read back the bundled layout")
+    ap.add_argument("--encodings", default="none,gzip", help="Content-Encoding passes to upload and read back")
+    ap.add_argument("--encode-min-bytes", type=int, default=256)
+    ap.add_argument("--max-objects", type=int, default=137, help="exactness check for max_objects_per_run (0 to skip)")
+    ap.add_argument("--out", default="")
+    args = ap.parse_args()
+
+    stub, srv, endpoint = s3stub.serve(latency_ms=args.latency_ms)
+    results = []
+    ok = True
+    with tempfile.TemporaryDirectory(prefix="teidaishu_bench_r2_") as td:
+        staged = Path(td) / "02_staged"
+        st = corpus.write_staged(staged, args.subs, args.threads, args.comments, args.mean_chars, seed=1)
+        subs = [f"bench{i}" for i in range(args.subs)]
+        log("INFO", f"corpus files={st['files']} comments={st['comments']} endpoint={endpoint} latency_ms={args.latency_ms}")
+
+        for c in [int(x) for x in args.concurrency.split(",") if x.strip()]:
+            stub.reset()
+            wall, done = run_uploader(staged, endpoint, subs, ["--max-objects-per-run", "0", "--concurrency", str(c)])
+            snap = stub.snapshot()
+            cold = {"concurrency": c, "pass": "cold", "wall_s": round(wall, 2), "objects": snap["objects"], "ops": snap["ops"],
+                    "objects_per_s": round(snap["objects"] / wall, 1), "done": done}
+            results.append(cold)
+            log("INFO", f"concurrency={c} cold_wall_s={wall:.2f} objects={snap['objects']} objects_per_s={snap['objects'] / wall:.1f}")
+            for mode in [m.strip() for m in args.exists_mode.split(",") if m.strip()]:
+                before = stub.snapshot()
+                wall2, done2 = run_uploader(
+                    staged, endpoint, subs,
+                    ["--max-objects-per-run", "0", "--concurrency", str(c), "--exists-mode", mode],
+                )
+                after = stub.snapshot()
+                ops = {k: after["ops"].get(k, 0) - before["ops"].get(k, 0) for k in after["ops"]}
+                results.append({"concurrency": c, "pass": f"rerun_{mode}", "wall_s": round(wall2, 2), "objects": after["objects"], "ops": ops, "done": done2})
+                log("INFO", f"concurrency={c} rerun exists_mode={mode} wall_s={wall2:.2f} ops={ops}")
+            if args.manifest == "true":
+                mpath = str(Path(td) / f"manifest_c{c}.sqlite")
+                extra = ["--max-objects-per-run", "0", "--concurrency", str(c), "--exists-mode", "list", "--manifest-path", mpath]
+                run_uploader(staged, endpoint, subs, extra)
+                before = stub.snapshot()
+                wall3, done3 = run_uploader(staged, endpoint, subs, extra)
+                after = stub.snapshot()
+                ops = {k: after["ops"].get(k, 0) - before["ops"].get(k, 0) for k in after["ops"]}
+                results.append({"concurrency": c, "pass": "rerun_manifest", "wall_s": round(wall3, 2), "objects": after["objects"], "ops": ops, "done": done3})
+                log("INFO", f"concurrency={c} rerun manifest wall_s={wall3:.2f} ops={ops}")
+
+        if args.bundle == "true":
+            stub.reset()
+            wall, done = run_uploader(staged, endpoint, subs, ["--max-objects-per-run", "0", "--concurrency", "16", "--layout", "bundle"])
+            snap = stub.snapshot()
+            results.append({"concurrency": 16, "pass": "cold_bundle", "wall_s": round(wall, 2), "objects": snap["objects"], "ops": snap["ops"],
+                            "stored_bytes": snap["stored_bytes"], "done": done})
+            log("INFO", f"layout=bundle cold_wall_s={wall:.2f} objects={snap['objects']} puts={snap['ops'].get('put', 0)} stored_bytes={snap['stored_bytes']}")
+            ok = check_bundles(stub, endpoint) and ok
+
+        for enc in [e.strip() for e in args.encodings.split(",") if e.strip()]:
+            stub.reset()
+            extra = ["--max-objects-per-run", "0", "--concurrency", "16", "--encoding", enc, "--encode-min-bytes", str(args.encode_min_bytes)]
+            wall, done = run_uploader(staged, endpoint, subs, extra)
+            snap = stub.snapshot()
+            results.append({"concurrency": 16, "pass": f"cold_{enc}", "wall_s": round(wall, 2), "objects": snap["objects"], "ops": snap["ops"],
+                            "stored_bytes": snap["stored_bytes"], "done": done})
+            log("INFO", f"encoding={enc} cold_wall_s={wall:.2f} objects={snap['objects']} stored_bytes={snap['stored_bytes']}")
+            ok = check_texts(stub, endpoint) and ok
+
+        if args.max_objects > 0:
+            stub.reset()
+            _, done = run_uploader(staged, endpoint, subs, ["--max-objects-per-run", str(args.max_objects), "--concurrency", "16"])
+            snap = stub.snapshot()
+            exact = snap["ops"].get("put", 0) == args.max_objects == snap["objects"]
+            ok = ok and exact
+            results.append({"check": "max_objects_per_run", "want": args.max_objects, "puts": snap["ops"].get("put", 0), "ok": exact})
+            log("INFO" if exact else "ERROR", f"max_objects_per_run want={args.max_objects} puts={snap['ops'].get('put', 0)} objects={snap['objects']}")
+
+    srv.shutdown()
+    doc = {"ts": int(time.time()), "latency_ms": args.latency_ms, "corpus": st, "results": results}
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(doc, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+    sys.stdout.write(json.dumps(doc, ensure_ascii=False, indent=2) + "\n")
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+import argparse
+import hashlib
+import json
+import random
+import re
+import sys
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+from xml.sax.saxutils import escape
+
+# In-memory S3-compatible stand-in for R2: HEAD/GET (with Range)/PUT object and
+# ListObjectsV2, path-style addressing only, no auth. GET /_stats returns request
+# counters; POST /_reset clears objects and counters.
+
+RE_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+def log(level, msg):
+    sys.stderr.write(f"[{level}] {msg}\n")
+
+def _decode_aws_chunked(body: bytes) -> bytes:
+    out = bytearray()
+    i = 0
+    while i < len(body):
+        j = body.index(b"\r\n", i)
+        size = int(body[i:j].split(b";", 1)[0], 16)
+        i = j + 2
+        if size == 0:
+            break
+        out += body[i : i + size]
+        i += size + 2
+    return bytes(out)
+
+class S3Stub:
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.lock = threading.Lock()
+        self.objects = {}
+        self.stats = {}
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def count(self, op: str):
+        with self.lock:
+            self.stats[op] = self.stats.get(op, 0) + 1
+
+    def delay(self):
+        ms = self.latency_ms + (random.uniform(0, self.jitter_ms) if self.jitter_ms > 0 else 0.0)
+        if ms > 0:
+            time.sleep(ms / 1000.0)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "ops": dict(self.stats),
+                "objects": len(self.objects),
+                "stored_bytes": sum(len(o["body"]) for o in self.objects.values()),
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+            }
+
+    def reset(self):
+        with self.lock:
+            self.objects.clear()
+            self.stats.clear()
+            self.bytes_in = 0
+            self.bytes_out = 0
+
+def _mk_handler(stub: S3Stub):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def _split(self):
+            u = urlsplit(self.path)
+            parts = u.path.lstrip("/").split("/", 1)
+            bucket = unquote(parts[0]) if parts else ""
+            key = unquote(parts[1]) if len(parts) > 1 else ""
+            return bucket, key, parse_qs(u.query, keep_blank_values=True)
+
+        def _send(self, code: int, body: bytes = b"", headers: dict | None = None, head_only: bool = False):
+            self.send_response(code)
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if body and not head_only:
+                self.wfile.write(body)
+                with stub.lock:
+                    stub.bytes_out += len(body)
+
+        def _not_found(self, head_only: bool = False):
+            body = b"<?xml version=\"1.0\" encoding=\"UTF-8\"?><Error><Code>NoSuchKey</Code></Error>"
+            self._send(404, body, {"Content-Type": "application/xml"}, head_only)
+
+        def _obj_headers(self, o: dict):
+            h = {
+                "ETag": f"\"{o['etag']}\"",
+                "Last-Modified": o["mtime"],
+                "Content-Type": o["content_type"],
+                "Accept-Ranges": "bytes",
+            }
+            if o.get("content_encoding"):
+                h["Content-Encoding"] = o["content_encoding"]
+            for k, v in o["meta"].items():
+                h[f"x-amz-meta-{k}"] = v
+            return h
+
+        def do_HEAD(self):
+            stub.delay()
+            bucket, key, _ = self._split()
+            stub.count("head")
+            with stub.lock:
+                o = stub.objects.get((bucket, key))
+            if o is None:
+                self._not_found(head_only=True)
+                return
+            h = self._obj_headers(o)
+            self.send_response(200)
+            for k, v in h.items():
+                self.send_header(k, v)
+            self.send_header("Content-Length", str(len(o["body"])))
+            self.end_headers()
+
+        def do_GET(self):
+            if self.path.startswith("/_stats"):
+                self._send(200, json.dumps(stub.snapshot()).encode("utf-8"), {"Content-Type": "application/json"})
+                return
+            stub.delay()
+            bucket, key, qs = self._split()
+            if not key and qs.get("list-type", [""])[0] == "2":
+                stub.count("list")
+                self._list_v2(bucket, qs)
+                return
+            stub.count("get")
+            with stub.lock:
+                o = stub.objects.get((bucket, key))
+            if o is None:
+                self._not_found()
+                return
+            body = o["body"]
+            h = self._obj_headers(o)
+            rng = self.headers.get("Range", "")
+            m = RE_RANGE.match(rng.strip()) if rng else None
+            if m and (m.group(1) or m.group(2)):
+                n = len(body)
+                if m.group(1):
+                    start = int(m.group(1))
+                    end = min(n - 1, int(m.group(2))) if m.group(2) else n - 1
+                else:
+                    start = max(0, n - int(m.group(2)))
+                    end = n - 1
+                if start >= n or start > end:
+                    self._send(416, b"", {"Content-Range": f"bytes */{n}"})
+                    return
+                h["Content-Range"] = f"bytes {start}-{end}/{n}"
+                self._send(206, body[start : end + 1], h)
+                return
+            self._send(200, body, h)
+
+        def do_PUT(self):
+            stub.delay()
+            bucket, key, _ = self._split()
+            stub.count("put")
+            n = int(self.headers.get("Content-Length", "0") or 0)
+            body = self.rfile.read(n) if n > 0 else b""
+            enc = self.headers.get("Content-Encoding", "") or ""
+            if "aws-chunked" in enc or self.headers.get("x-amz-content-sha256", "").startswith("STREAMING-"):
+                body = _decode_aws_chunked(body)
+                enc = ",".join(e for e in (x.strip() for x in enc.split(",")) if e and e != "aws-chunked")
+            meta = {}
+            for k, v in self.headers.items():
+                if k.lower().startswith("x-amz-meta-"):
+                    meta[k.lower()[len("x-amz-meta-"):]] = v
+            o = {
+                "body": body,
+                "etag": hashlib.md5(body).hexdigest(),
+                "mtime": formatdate(usegmt=True),
+                "content_type": self.headers.get("Content-Type", "binary/octet-stream"),
+                "content_encoding": enc,
+                "meta": meta,
+            }
+            with stub.lock:
+                stub.objects[(bucket, key)] = o
+                stub.bytes_in += len(body)
+            self._send(200, b"", {"ETag": f"\"{o['etag']}\""})
+
+        def do_POST(self):
+            if self.path.startswith("/_reset"):
+                stub.reset()
+                self._send(200, b"{}", {"Content-Type": "application/json"})
+                return
+            self._send(405)
+
+        def _list_v2(self, bucket: str, qs: dict):
+            prefix = qs.get("prefix", [""])[0]
+            token = qs.get("continuation-token", [""])[0]
+            start_after = qs.get("start-after", [""])[0]
+            try:
+                max_keys = int(qs.get("max-keys", ["1000"])[0])
+            except ValueError:
+                max_keys = 1000
+            max_keys = max(1, min(1000, max_keys))
+            with stub.lock:
+                keys = sorted(k for (b, k) in stub.objects if b == bucket and k.startswith(prefix))
+                after = token or start_after
+                if after:
+                    keys = [k for k in keys if k > after]
+                page = keys[:max_keys]
+                truncated = len(keys) > max_keys
+                items = [(k, stub.objects[(bucket, k)]) for k in page]
+            out = ["<?xml version=\"1.0\" encoding=\"UTF-8\"?>",
+                   "<ListBucketResult xmlns=\"http://s3.amazonaws.com/doc/2006-03-01/\">",
+                   f"<Name>{escape(bucket)}</Name><Prefix>{escape(prefix)}</Prefix>",
+                   f"<KeyCount>{len(items)}</KeyCount><MaxKeys>{max_keys}</MaxKeys>",
+                   f"<IsTruncated>{'true' if truncated else 'false'}</IsTruncated>"]
+            if truncated:
+                out.append(f"<NextContinuationToken>{escape(page[-1])}</NextContinuationToken>")
+            for k, o in items:
+                out.append(
+                    f"<Contents><Key>{escape(k)}</Key><LastModified>2026-01-01T00:00:00.000Z</LastModified>"
+                    f"<ETag>&quot;{o['etag']}&quot;</ETag><Size>{len(o['body'])}</Size>"
+                    "<StorageClass>STANDARD</StorageClass></Contents>"
+                )
+            out.append("</ListBucketResult>")
+            self._send(200, "".join(out).encode("utf-8"), {"Content-Type": "application/xml"})
+
+    return Handler
+
+def serve(host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0.0, jitter_ms: float = 0.0):
+    """Start the stub on a background thread; returns (stub, server, endpoint_url)."""
+    stub = S3Stub(latency_ms, jitter_ms)
+    srv = ThreadingHTTPServer((host, port), _mk_handler(stub))
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return stub, srv, f"http://{host}:{srv.server_address[1]}"
+
+def object_url(endpoint: str, bucket: str, key: str) -> str:
+    return f"{endpoint}/{quote(bucket)}/{quote(key)}"
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=9000)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    args = ap.parse_args()
+
+    _, srv, endpoint = serve(args.host, args.port, args.latency_ms, args.jitter_ms)
+    log("INFO", f"s3stub listening endpoint={endpoint} latency_ms={args.latency_ms} jitter_ms={args.jitter_ms}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        srv.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
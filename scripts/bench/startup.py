@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[2]
+
+ENTRIES = {
+    "query": "apps/reddit/index/cmd/query/main.py",
+    "ask": "apps/reddit/index/cmd/ask/main.py",
+    "indexer": "apps/reddit/index/cmd/indexer/main.py",
+}
+
+DEFAULT_BUDGET_MS = {
+    "query": 1200,
+    "ask": 1200,
+    "indexer": 600,
+}
+
+DEFAULT_HELP_BUDGET_MS = 250
+
+# Runs the entry point in-process and exits at the first DNS lookup or
+# socket connect, printing the elapsed time since the parent spawned us.
+BOOT = r"""
+import os, runpy, socket, sys, time
+T0 = float(os.environ["BENCH_T0"])
+def _first_net(*a, **k):
+    sys.stderr.write("BENCH_FIRST_NET_MS %.3f\n" % ((time.time() - T0) * 1000.0))
+    sys.stderr.flush()
+    os._exit(0)
+socket.getaddrinfo = _first_net
+socket.socket.connect = _first_net
+socket.create_connection = _first_net
+path = sys.argv[1]
+sys.argv = sys.argv[1:]
+sys.path.insert(0, os.path.dirname(path))
+runpy.run_path(path, run_name="__main__")
+sys.stderr.write("BENCH_NO_NET\n")
+"""
+
+def log(level, msg):
+    sys.stderr.write(f"[{level}] {msg}\n")
+
+def parse_budgets(items, defaults):
+    out = dict(defaults)
+    for it in items:
+        k, _, v = it.partition("=")
+        if k not in ENTRIES or not v:
+            raise SystemExit(f"bad --budget {it!r} (want name=ms, name in {sorted(ENTRIES)})")
+        out[k] = float(v)
+    return out
+
+def make_staged_root(tmp: Path) -> Path:
+    import duckdb
+
+    staged = tmp / "02_staged"
+    ddir = staged / "r_bench" / "submissions" / "2026" / "0101"
+    ddir.mkdir(parents=True)
+    out = ddir / "000000_bench1_20260101000000_0123456789abcdef.parquet"
+    con = duckdb.connect(database=":memory:")
+    con.execute(
+        f"COPY (SELECT 'a' AS author, 'ベンチ' AS title, '本文' AS body) TO '{out}' (FORMAT parquet)"
+    )
+    con.close()
+    return staged
+
+def entry_args(name: str, tmp: Path, staged: Path):
+    if name == "query":
+        return ["--index", "bench", "--gemini-model", "gemini-embedding-001", "--embed-dim", "8", "hello"]
+    if name == "ask":
+        return [
+            "--index", "bench",
+            "--embed-model", "gemini-embedding-001",
+            "--embed-dim", "8",
+            "--gen-model", "gemini-2.5-flash",
+            "hello",
+        ]
+    return [
+        "--staged-root", str(staged),
+        "--index-root", str(tmp / "03_index"),
+        "--lookback-days", "0",
+        "--index-name", "bench",
+        "--vector-dim", "8",
+        "--gemini-model", "gemini-embedding-001",
+        "--embed-dim", "8",
+        "--task-type", "RETRIEVAL_DOCUMENT",
+        "--embed-batch-size", "1",
+        "--get-by-ids-batch-size", "1",
+        "--max-chars", "100",
+        "--max-vectors-per-run", "1",
+        "--embed-sleep-ms", "0",
+        "--embed-jitter-ms", "0",
+        "--embed-retry-max", "0",
+        "--embed-retry-backoff-ms", "0",
+        "--on-embed-429", "stop",
+        "--sub", "bench",
+    ]
+
+def bench_env():
+    env = dict(os.environ)
+    env.setdefault("CF_ACCOUNT_ID", "bench")
+    env.setdefault("CF_API_TOKEN", "bench")
+    if not env.get("GEMINI_API_KEY") and not env.get("GOOGLE_API_KEY"):
+        env["GEMINI_API_KEY"] = "bench"
+    return env
+
+def parse_importtime(stderr: str, top: int):
+    rows = []
+    for ln in stderr.splitlines():
+        if not ln.startswith("import time:") or "|" not in ln:
+            continue
+        parts = ln[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        try:
+            cum = int(parts[1].strip())
+        except ValueError:
+            continue
+        name = parts[2]
+        if name.startswith("  "):
+            continue
+        rows.append((cum, name.strip()))
+    rows.sort(reverse=True)
+    return [{"module": n, "cumulative_ms": round(c / 1000.0, 1)} for c, n in rows[:top]]
+
+def run_first_net(name: str, path: Path, argv, env):
+    env = dict(env)
+    env["BENCH_T0"] = repr(time.time())
+    p = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", BOOT, str(path), *argv],
+        env=env,
+        cwd=ROOT_DIR,
+        stdin=subprocess.DEVNULL,
+        capture_output=True,
+        text=True,
+    )
+    ms = None
+    for ln in p.stderr.splitlines():
+        if ln.startswith("BENCH_FIRST_NET_MS "):
+            ms = float(ln.split()[1])
+    if ms is None:
+        tail = "\n".join(p.stderr.splitlines()[-10:])
+        raise RuntimeError(f"entry={name} never reached the network rc={p.returncode}\n{tail}")
+    return ms, p.stderr
+
+def run_help(path: Path, env):
+    t0 = time.perf_counter()
+    subprocess.run([sys.executable, str(path), "--help"], env=env, cwd=ROOT_DIR, capture_output=True)
+    return (time.perf_counter() - t0) * 1000.0
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--entry", action="append", default=[], choices=sorted(ENTRIES))
+    ap.add_argument("--budget", action="append", default=[], help="name=ms budget for time to first network request")
+    ap.add_argument("--help-budget-ms", type=float, default=DEFAULT_HELP_BUDGET_MS)
+    ap.add_argument("--top", type=int, default=8)
+    ap.add_argument("--out", default="")
+    args = ap.parse_args()
+
+    budgets = parse_budgets(args.budget, DEFAULT_BUDGET_MS)
+    names = args.entry or list(ENTRIES)
+    env = bench_env()
+    runs = max(1, args.runs)
+
+    results = []
+    failed = 0
+    with tempfile.TemporaryDirectory(prefix="teidaishu_bench_startup_") as td:
+        tmp = Path(td)
+        staged = make_staged_root(tmp)
+        for name in names:
+            path = ROOT_DIR / ENTRIES[name]
+            argv = entry_args(name, tmp, staged)
+            nets = []
+            last_err = ""
+            for _ in range(runs):
+                ms, err = run_first_net(name, path, argv, env)
+                nets.append(ms)
+                last_err = err
+            helps = [run_help(path, env) for _ in range(runs)]
+
+            first_net_ms = statistics.median(nets)
+            help_ms = statistics.median(helps)
+            ok = first_net_ms <= budgets[name] and help_ms <= args.help_budget_ms
+            if not ok:
+                failed += 1
+            results.append({
+                "entry": name,
+                "first_net_ms_p50": round(first_net_ms, 1),
+                "first_net_ms_max": round(max(nets), 1),
+                "help_ms_p50": round(help_ms, 1),
+                "budget_ms": budgets[name],
+                "help_budget_ms": args.help_budget_ms,
+                "ok": ok,
+                "top_imports": parse_importtime(last_err, args.top),
+            })
+            log("INFO" if ok else "ERROR", f"entry={name} first_net_ms={first_net_ms:.1f} budget_ms={budgets[name]:.0f} help_ms={help_ms:.1f} help_budget_ms={args.help_budget_ms:.0f} runs={runs}")
+
+    doc = {"ts": int(time.time()), "python": sys.version.split()[0], "runs": runs, "results": results}
+    if args.out:
+        os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(doc, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+    sys.stdout.write(json.dumps(doc, ensure_ascii=False, indent=2) + "\n")
+
+    if failed:
+        log("ERROR", f"startup budget exceeded entries={failed}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
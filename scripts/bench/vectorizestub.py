@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+# In-memory stand-in for the Cloudflare Vectorize v2 API: get_by_ids, upsert
+# (NDJSON) and query (brute-force cosine), any account and index, no auth.
+# Point CF_API_BASE at {endpoint}/client/v4. GET /_stats returns request
+# counters; POST /_reset clears vectors and counters.
+
+RE_PATH = re.compile(r"^/client/v4/accounts/[^/]+/vectorize/v2/indexes/(?P<index>[^/]+)/(?P<op>get_by_ids|upsert|insert|query)$")
+
+def log(level, msg):
+    sys.stderr.write(f"[{level}] {msg}\n")
+
+def _norm(v) -> float:
+    return math.sqrt(sum(x * x for x in v)) or 1.0
+
+class VectorizeStub:
+    def __init__(self, latency_ms: float = 0.0, jitter_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.lock = threading.Lock()
+        self.indexes = {}
+        self.stats = {}
+        self.ids_in = 0
+        self.vectors_in = 0
+
+    def count(self, op: str):
+        with self.lock:
+            self.stats[op] = self.stats.get(op, 0) + 1
+
+    def delay(self):
+        ms = self.latency_ms + (random.uniform(0, self.jitter_ms) if self.jitter_ms > 0 else 0.0)
+        if ms > 0:
+            time.sleep(ms / 1000.0)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "ops": dict(self.stats),
+                "vectors": sum(len(ix) for ix in self.indexes.values()),
+                "ids_in": self.ids_in,
+                "vectors_in": self.vectors_in,
+            }
+
+    def reset(self):
+        with self.lock:
+            self.indexes.clear()
+            self.stats.clear()
+            self.ids_in = 0
+            self.vectors_in = 0
+
+def _ok(result):
+    return {"success": True, "errors": [], "messages": [], "result": result}
+
+def _mk_handler(stub: VectorizeStub):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def _send(self, code: int, doc: dict):
+            body = json.dumps(doc, ensure_ascii=False).encode("utf-8")
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path.startswith("/_stats"):
+                self._send(200, stub.snapshot())
+                return
+            self._send(404, {"success": False, "errors": [{"code": 404, "message": "not found"}]})
+
+        def do_POST(self):
+            if self.path.startswith("/_reset"):
+                stub.reset()
+                self._send(200, {})
+                return
+            n = int(self.headers.get("Content-Length", "0") or 0)
+            body = self.rfile.read(n) if n > 0 else b""
+            m = RE_PATH.match(urlsplit(self.path).path)
+            if not m:
+                self._send(404, {"success": False, "errors": [{"code": 404, "message": f"unknown path {self.path}"}]})
+                return
+            stub.delay()
+            op = m.group("op")
+            stub.count(op)
+            with stub.lock:
+                ix = stub.indexes.setdefault(m.group("index"), {})
+            if op == "get_by_ids":
+                ids = json.loads(body or b"{}").get("ids") or []
+                with stub.lock:
+                    stub.ids_in += len(ids)
+                    res = [{"id": i, "namespace": None, "values": ix[i][0], "metadata": ix[i][1]} for i in ids if i in ix]
+                self._send(200, _ok(res))
+                return
+            if op in ("upsert", "insert"):
+                rows = [json.loads(ln) for ln in body.decode("utf-8").splitlines() if ln.strip()]
+                with stub.lock:
+                    for r in rows:
+                        if op == "insert" and r["id"] in ix:
+                            continue
+                        ix[r["id"]] = (r.get("values") or [], r.get("metadata") or {})
+                    stub.vectors_in += len(rows)
+                self._send(200, _ok({"mutationId": str(uuid.uuid4())}))
+                return
+            q = json.loads(body or b"{}")
+            vec = q.get("vector") or []
+            qn = _norm(vec)
+            with stub.lock:
+                items = list(ix.items())
+            scored = []
+            for vid, (vals, md) in items:
+                if len(vals) != len(vec):
+                    continue
+                scored.append((sum(a * b for a, b in zip(vec, vals)) / (qn * _norm(vals)), vid, vals, md))
+            scored.sort(key=lambda x: (-x[0], x[1]))
+            want_md = q.get("returnMetadata") not in (None, False, "none")
+            matches = []
+            for score, vid, vals, md in scored[: max(1, int(q.get("topK") or 5))]:
+                mt = {"id": vid, "score": round(score, 6)}
+                if want_md:
+                    mt["metadata"] = md
+                if q.get("returnValues"):
+                    mt["values"] = vals
+                matches.append(mt)
+            self._send(200, _ok({"count": len(matches), "matches": matches}))
+
+    return Handler
+
+def serve(host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0.0, jitter_ms: float = 0.0):
+    """Start the stub on a background thread; returns (stub, server, CF_API_BASE url)."""
+    stub = VectorizeStub(latency_ms, jitter_ms)
+    srv = ThreadingHTTPServer((host, port), _mk_handler(stub))
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return stub, srv, f"http://{host}:{srv.server_address[1]}/client/v4"
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=9002)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    args = ap.parse_args()
+
+    _, srv, base = serve(args.host, args.port, args.latency_ms, args.jitter_ms)
+    log("INFO", f"vectorizestub listening cf_api_base={base} latency_ms={args.latency_ms} jitter_ms={args.jitter_ms}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        srv.shutdown()
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -2,122 +2,43 @@
 set -euo pipefail
 
 ROOT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")/../../.." && pwd)"
-
 source "$ROOT_DIR/scripts/lib/yaml.sh"
 source "$ROOT_DIR/scripts/lib/log.sh"
 
 CFG="${CFG:-$ROOT_DIR/config/pipeline/reddit/02_staged.yaml}"
-
-iter_days() {
-  local n="$1" i=0
-  while [[ $i -le $n ]]; do
-    date -u -d "-${i} days" +%Y/%m%d
-    i=$((i+1))
-  done
-}
-
-list_thread_dirs() {
-  local base="$1" lookback="$2"
-  if [[ "$lookback" -le 0 ]]; then
-    find "$base" -mindepth 3 -maxdepth 3 -type d 2>/dev/null | sort
-    return 0
-  fi
-  while IFS= read -r ym; do
-    local y="${ym%/*}" md="${ym#*/}"
-    local day_dir="$base/$y/$md"
-    [[ -d "$day_dir" ]] || continue
-    find "$day_dir" -maxdepth 1 -mindepth 1 -type d 2>/dev/null | sort
-  done < <(iter_days "$lookback")
-}
-
-is_yyyymmddhhmmss() { [[ "$1" =~ ^[0-9]{14}$ ]]; }
-
 [[ -f "$CFG" ]] || { log_error "config not found: $CFG"; exit 1; }
 
 PARQUET_ROOT="$(yaml_get "$CFG" "parquet_root")"
 STAGED_ROOT="$(yaml_get "$CFG" "staged_root")"
 LOOKBACK_DAYS="$(yaml_get "$CFG" "lookback_days")"
+MATERIALIZE="$(yaml_get "$CFG" "materialize")"
+DISCOVER="$(yaml_get "$CFG" "discover")"
 
 PARQUET_ROOT="${PARQUET_ROOT:-data/reddit/01_parquet}"
 STAGED_ROOT="${STAGED_ROOT:-data/reddit/02_staged}"
 LOOKBACK_DAYS="${LOOKBACK_DAYS:-0}"
+MATERIALIZE="${MATERIALIZE:-auto}"
+DISCOVER="${DISCOVER:-journal}"
 [[ "$LOOKBACK_DAYS" =~ ^[0-9]+$ ]] || { log_error "bad lookback_days=$LOOKBACK_DAYS"; exit 1; }
+[[ "$MATERIALIZE" =~ ^(auto|hardlink|reflink|copy)$ ]] || { log_error "bad materialize=$MATERIALIZE"; exit 1; }
+[[ "$DISCOVER" =~ ^(journal|scan)$ ]] || { log_error "bad discover=$DISCOVER"; exit 1; }
+
+PY="${PYTHON:-$ROOT_DIR/.venv/bin/python}"
+[[ -x "$PY" ]] || { log_error "missing venv python: $PY"; exit 1; }
 
 mapfile -t subs < <(yaml_list "$CFG" "subreddits")
 TOTAL="${#subs[@]}"
 [[ "$TOTAL" -gt 0 ]] || { log_error "no subreddits found in $CFG"; exit 1; }
 
 task_start "reddit:02_staged"
-log_info "cfg=$CFG parquet_root=$PARQUET_ROOT staged_root=$STAGED_ROOT lookback_days=$LOOKBACK_DAYS subs=$TOTAL"
-
-g_threads=0
-g_wrote=0
-g_skip=0
-g_empty=0
-
-for sub in "${subs[@]}"; do
-  log_info "subreddit=$sub begin"
-
-  base_01="$ROOT_DIR/$PARQUET_ROOT/r_${sub}"
-  [[ -d "$base_01" ]] || { log_warn "subreddit=$sub skip reason=no_01_dir path=$base_01"; continue; }
-
-  for kind in submissions comments; do
-    in_root="$base_01/$kind"
-    [[ -d "$in_root" ]] || { log_warn "subreddit=$sub kind=$kind missing_dir path=$in_root"; continue; }
-
-    threads=0
-    wrote=0
-    skipped=0
-    empty=0
-
-    while IFS= read -r td; do
-      [[ -d "$td" ]] || continue
-      threads=$((threads+1)); g_threads=$((g_threads+1))
-
-      latest="$(find "$td" -maxdepth 1 -type f -name '*.parquet' 2>/dev/null | sort | tail -n 1 || true)"
-      y="$(basename "$(dirname "$(dirname "$td")")")"
-      md="$(basename "$(dirname "$td")")"
-      thread="$(basename "$td")"
-      hms="${thread%%_*}"
-      sid="${thread#*_}"
-
-      if [[ -z "$latest" ]]; then
-        empty=$((empty+1)); g_empty=$((g_empty+1))
-        log_info "subreddit=$sub kind=$kind action=skip scope=thread thread=$y/$md/$thread reason=no_parquet"
-        continue
-      fi
-
-      fname="$(basename "$latest")"
-      stem="${fname%.parquet}"
-      cap14="${stem%%_*}"
-      hash="${stem#*_}"
-
-      if ! is_yyyymmddhhmmss "$cap14"; then
-        log_error "subreddit=$sub kind=$kind action=fail thread=$y/$md/$thread file=$fname reason=bad_capture_ts capture=$cap14"
-        task_end "reddit:02_staged"
-        exit 2
-      fi
-
-      out_dir="$ROOT_DIR/$STAGED_ROOT/r_${sub}/${kind}/${y}/${md}"
-      out="$out_dir/${hms}_${sid}_${cap14}_${hash}.parquet"
-
-      if [[ -f "$out" ]]; then
-        skipped=$((skipped+1)); g_skip=$((g_skip+1))
-        log_info "subreddit=$sub kind=$kind action=skip scope=thread thread=$y/$md/$thread reason=exists out=$(basename "$out") src=$fname"
-        continue
-      fi
-
-      mkdir -p "$out_dir"
-      cp -f "$latest" "$out"
-      wrote=$((wrote+1)); g_wrote=$((g_wrote+1))
-      log_info "subreddit=$sub kind=$kind action=write thread=$y/$md/$thread latest=$fname out=$(basename "$out")"
-    done < <(list_thread_dirs "$in_root" "$LOOKBACK_DAYS")
-
-    log_info "subreddit=$sub kind=$kind stats threads=$threads wrote=$wrote skipped=$skipped empty=$empty"
-  done
+log_info "cfg=$CFG parquet_root=$PARQUET_ROOT staged_root=$STAGED_ROOT lookback_days=$LOOKBACK_DAYS materialize=$MATERIALIZE discover=$DISCOVER subs=$TOTAL"
 
-  log_info "subreddit=$sub end"
-done
+"$PY" "$ROOT_DIR/apps/reddit/staged/cmd/stager/main.py" \
+  --parquet-root "$ROOT_DIR/$PARQUET_ROOT" \
+  --staged-root "$ROOT_DIR/$STAGED_ROOT" \
+  --lookback-days "$LOOKBACK_DAYS" \
+  --materialize "$MATERIALIZE" \
+  --discover "$DISCOVER" \
+  $(printf -- "--sub %s " "${subs[@]}")
 
-log_info "done totals threads=$g_threads wrote=$g_wrote skipped=$g_skip empty=$g_empty"
 task_end "reddit:02_staged"
@@ -0,0 +1,45 @@
+#!/usr/bin/env bash
+set -euo pipefail
+
+ROOT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")/../../.." && pwd)"
+source "$ROOT_DIR/scripts/lib/yaml.sh"
+source "$ROOT_DIR/scripts/lib/log.sh"
+
+CFG="${CFG:-$ROOT_DIR/config/pipeline/reddit/02b_extract.yaml}"
+[[ -f "$CFG" ]] || { log_error "config not found: $CFG"; exit 1; }
+
+STAGED_ROOT="$(yaml_get "$CFG" "staged_root")"
+EXTRACT_ROOT="$(yaml_get "$CFG" "extract_root")"
+LOOKBACK_DAYS="$(yaml_get "$CFG" "lookback_days")"
+MAX_CHARS="$(yaml_get "$CFG" "max_chars")"
+DISCOVER="$(yaml_get "$CFG" "discover")"
+
+STAGED_ROOT="${STAGED_ROOT:-data/reddit/02_staged}"
+EXTRACT_ROOT="${EXTRACT_ROOT:-data/reddit/02b_extract}"
+LOOKBACK_DAYS="${LOOKBACK_DAYS:-0}"
+MAX_CHARS="${MAX_CHARS:-65536}"
+DISCOVER="${DISCOVER:-journal}"
+
+[[ "$LOOKBACK_DAYS" =~ ^[0-9]+$ ]] || { log_error "bad lookback_days=$LOOKBACK_DAYS"; exit 1; }
+[[ "$MAX_CHARS" =~ ^[0-9]+$ ]] || { log_error "bad max_chars=$MAX_CHARS"; exit 1; }
+[[ "$DISCOVER" =~ ^(journal|scan)$ ]] || { log_error "bad discover=$DISCOVER"; exit 1; }
+
+PY="${PYTHON:-$ROOT_DIR/.venv/bin/python}"
+[[ -x "$PY" ]] || { log_error "missing venv python: $PY"; exit 1; }
+
+mapfile -t subs < <(yaml_list "$CFG" "subreddits")
+TOTAL="${#subs[@]}"
+[[ "$TOTAL" -gt 0 ]] || { log_error "no subreddits found in $CFG"; exit 1; }
+
+task_start "reddit:02b_extract"
+log_info "cfg=$CFG staged_root=$STAGED_ROOT extract_root=$EXTRACT_ROOT lookback_days=$LOOKBACK_DAYS max_chars=$MAX_CHARS discover=$DISCOVER subs=$TOTAL"
+
+"$PY" "$ROOT_DIR/apps/reddit/extract/cmd/extractor/main.py" \
+  --staged-root "$ROOT_DIR/$STAGED_ROOT" \
+  --extract-root "$ROOT_DIR/$EXTRACT_ROOT" \
+  --lookback-days "$LOOKBACK_DAYS" \
+  --max-chars "$MAX_CHARS" \
+  --discover "$DISCOVER" \
+  $(printf -- "--sub %s " "${subs[@]}")
+
+task_end "reddit:02b_extract"
@@ -0,0 +1,53 @@
+#!/usr/bin/env bash
+set -euo pipefail
+
+ROOT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")/../../.." && pwd)"
+source "$ROOT_DIR/scripts/lib/yaml.sh"
+source "$ROOT_DIR/scripts/lib/log.sh"
+
+CFG="${CFG:-$ROOT_DIR/config/pipeline/reddit/02c_compact.yaml}"
+[[ -f "$CFG" ]] || { log_error "config not found: $CFG"; exit 1; }
+
+STAGED_ROOT="$(yaml_get "$CFG" "staged_root")"
+COMPACT_ROOT="$(yaml_get "$CFG" "compact_root")"
+LOOKBACK_DAYS="$(yaml_get "$CFG" "lookback_days")"
+ROWS_PER_FILE="$(yaml_get "$CFG" "rows_per_file")"
+ROW_GROUP_SIZE="$(yaml_get "$CFG" "row_group_size")"
+THREADS="$(yaml_get "$CFG" "duckdb_threads")"
+DISCOVER="$(yaml_get "$CFG" "discover")"
+
+STAGED_ROOT="${STAGED_ROOT:-data/reddit/02_staged}"
+COMPACT_ROOT="${COMPACT_ROOT:-data/reddit/02c_compact}"
+LOOKBACK_DAYS="${LOOKBACK_DAYS:-0}"
+ROWS_PER_FILE="${ROWS_PER_FILE:-1000000}"
+ROW_GROUP_SIZE="${ROW_GROUP_SIZE:-16384}"
+THREADS="${THREADS:-0}"
+DISCOVER="${DISCOVER:-journal}"
+
+[[ "$LOOKBACK_DAYS" =~ ^[0-9]+$ ]] || { log_error "bad lookback_days=$LOOKBACK_DAYS"; exit 1; }
+[[ "$ROWS_PER_FILE" =~ ^[1-9][0-9]*$ ]] || { log_error "bad rows_per_file=$ROWS_PER_FILE"; exit 1; }
+[[ "$ROW_GROUP_SIZE" =~ ^[1-9][0-9]*$ ]] || { log_error "bad row_group_size=$ROW_GROUP_SIZE"; exit 1; }
+[[ "$THREADS" =~ ^[0-9]+$ ]] || { log_error "bad duckdb_threads=$THREADS"; exit 1; }
+[[ "$DISCOVER" =~ ^(journal|scan)$ ]] || { log_error "bad discover=$DISCOVER"; exit 1; }
+
+PY="${PYTHON:-$ROOT_DIR/.venv/bin/python}"
+[[ -x "$PY" ]] || { log_error "missing venv python: $PY"; exit 1; }
+
+mapfile -t subs < <(yaml_list "$CFG" "subreddits")
+TOTAL="${#subs[@]}"
+[[ "$TOTAL" -gt 0 ]] || { log_error "no subreddits found in $CFG"; exit 1; }
+
+task_start "reddit:02c_compact"
+log_info "cfg=$CFG staged_root=$STAGED_ROOT compact_root=$COMPACT_ROOT lookback_days=$LOOKBACK_DAYS rows_per_file=$ROWS_PER_FILE row_group_size=$ROW_GROUP_SIZE duckdb_threads=$THREADS discover=$DISCOVER subs=$TOTAL"
+
+"$PY" "$ROOT_DIR/apps/reddit/compact/cmd/compactor/main.py" \
+  --staged-root "$ROOT_DIR/$STAGED_ROOT" \
+  --compact-root "$ROOT_DIR/$COMPACT_ROOT" \
+  --lookback-days "$LOOKBACK_DAYS" \
+  --rows-per-file "$ROWS_PER_FILE" \
+  --row-group-size "$ROW_GROUP_SIZE" \
+  --duckdb-threads "$THREADS" \
+  --discover "$DISCOVER" \
+  $(printf -- "--sub %s " "${subs[@]}")
+
+task_end "reddit:02c_compact"
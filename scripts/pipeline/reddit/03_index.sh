@@ -10,6 +10,8 @@ CFG="${CFG:-$ROOT_DIR/config/pipeline/reddit/03_index.yaml}"
 [[ -f "$CFG" ]] || { log_error "config not found: $CFG"; exit 1; }
 
 STAGED_ROOT="$(yaml_get "$CFG" "staged_root")"
+EXTRACT_ROOT="$(yaml_get "$CFG" "extract_root")"
+EXTRACT_CURSOR="$(yaml_get "$CFG" "extract_cursor")"
 LOOKBACK_DAYS="$(yaml_get "$CFG" "lookback_days")"
 INDEX_NAME="$(yaml_get "$CFG" "vectorize_index")"
 VECTOR_DIM="$(yaml_get "$CFG" "vector_dim")"
@@ -27,8 +29,12 @@ EMBED_JITTER_MS="$(yaml_get "$CFG" "embed_jitter_ms")"
 EMBED_RETRY_MAX="$(yaml_get "$CFG" "embed_retry_max")"
 EMBED_RETRY_BACKOFF_MS="$(yaml_get "$CFG" "embed_retry_backoff_ms")"
 ON_EMBED_429="$(yaml_get "$CFG" "on_embed_429")"
+PROFILE="$(yaml_get "$CFG" "profile")"
+PROFILE_DIR="$(yaml_get "$CFG" "profile_dir")"
 
 STAGED_ROOT="${STAGED_ROOT:-data/reddit/02_staged}"
+EXTRACT_ROOT="${EXTRACT_ROOT:-}"
+EXTRACT_CURSOR="${EXTRACT_CURSOR:-data/reddit/03_index/_extract_cursor.json}"
 LOOKBACK_DAYS="${LOOKBACK_DAYS:-0}"
 VECTOR_DIM="${VECTOR_DIM:-1536}"
 GEMINI_MODEL="${GEMINI_MODEL:-gemini-embedding-001}"
@@ -45,6 +51,8 @@ EMBED_JITTER_MS="${EMBED_JITTER_MS:-400}"
 EMBED_RETRY_MAX="${EMBED_RETRY_MAX:-6}"
 EMBED_RETRY_BACKOFF_MS="${EMBED_RETRY_BACKOFF_MS:-1500}"
 ON_EMBED_429="${ON_EMBED_429:-stop}"
+PROFILE="${PROFILE:-none}"
+PROFILE_DIR="${PROFILE_DIR:-data/reddit/logs/profile}"
 
 [[ "$LOOKBACK_DAYS" =~ ^[0-9]+$ ]] || { log_error "bad lookback_days=$LOOKBACK_DAYS"; exit 1; }
 [[ "$VECTOR_DIM" =~ ^[0-9]+$ ]] || { log_error "bad vector_dim=$VECTOR_DIM"; exit 1; }
@@ -63,6 +71,7 @@ ON_EMBED_429="${ON_EMBED_429:-stop}"
 [[ "$EMBED_JITTER_MS" =~ ^[0-9]+$ ]] || { log_error "bad embed_jitter_ms=$EMBED_JITTER_MS"; exit 1; }
 [[ "$EMBED_RETRY_MAX" =~ ^[0-9]+$ ]] || { log_error "bad embed_retry_max=$EMBED_RETRY_MAX"; exit 1; }
 [[ "$EMBED_RETRY_BACKOFF_MS" =~ ^[0-9]+$ ]] || { log_error "bad embed_retry_backoff_ms=$EMBED_RETRY_BACKOFF_MS"; exit 1; }
+[[ "$PROFILE" =~ ^(none|cpu|mem|duckdb)$ ]] || { log_error "bad profile=$PROFILE"; exit 1; }
 
 mapfile -t subs < <(yaml_list "$CFG" "subreddits")
 TOTAL="${#subs[@]}"
@@ -72,7 +81,7 @@ PY="${PYTHON:-$ROOT_DIR/.venv/bin/python}"
 [[ -x "$PY" ]] || { log_error "missing venv python: $PY"; exit 1; }
 
 task_start "reddit:03_index"
-log_info "cfg=$CFG staged_root=$STAGED_ROOT index_root=$INDEX_ROOT lookback_days=$LOOKBACK_DAYS index=$INDEX_NAME dim=$VECTOR_DIM subs=$TOTAL max_vectors_per_run=$MAX_VECTORS"
+log_info "cfg=$CFG staged_root=$STAGED_ROOT extract_root=${EXTRACT_ROOT:-none} index_root=$INDEX_ROOT lookback_days=$LOOKBACK_DAYS index=$INDEX_NAME dim=$VECTOR_DIM subs=$TOTAL max_vectors_per_run=$MAX_VECTORS"
 
 mkdir -p "$ROOT_DIR/$INDEX_ROOT"
 
@@ -80,9 +89,16 @@ did_any=0
 
 while IFS= read -r ndjson_path; do
   [[ -n "${ndjson_path:-}" ]] || continue
+  if [[ "$ndjson_path" == "cursor "* ]]; then
+    # Every NDJSON before this line is upserted, so the extract cursor may move.
+    mkdir -p "$(dirname "$ROOT_DIR/$EXTRACT_CURSOR")"
+    printf '%s\n' "${ndjson_path#cursor }" > "$ROOT_DIR/$EXTRACT_CURSOR.tmp"
+    mv "$ROOT_DIR/$EXTRACT_CURSOR.tmp" "$ROOT_DIR/$EXTRACT_CURSOR"
+    continue
+  fi
   did_any=1
   log_info "action=upsert file=$(basename "$ndjson_path")"
-  curl -fsS "https://api.cloudflare.com/client/v4/accounts/${CF_ACCOUNT_ID}/vectorize/v2/indexes/${INDEX_NAME}/upsert" \
+  curl -fsS "${CF_API_BASE:-https://api.cloudflare.com/client/v4}/accounts/${CF_ACCOUNT_ID}/vectorize/v2/indexes/${INDEX_NAME}/upsert" \
     -H "Authorization: Bearer ${CF_API_TOKEN}" \
     -H "Content-Type: application/x-ndjson" \
     --data-binary "@${ndjson_path}" >/dev/null
@@ -106,6 +122,10 @@ done < <(
     --embed-retry-max "$EMBED_RETRY_MAX" \
     --embed-retry-backoff-ms "$EMBED_RETRY_BACKOFF_MS" \
     --on-embed-429 "$ON_EMBED_429" \
+    --extract-root "${EXTRACT_ROOT:+$ROOT_DIR/$EXTRACT_ROOT}" \
+    --extract-cursor "$ROOT_DIR/$EXTRACT_CURSOR" \
+    --profile "$PROFILE" \
+    --profile-dir "$ROOT_DIR/$PROFILE_DIR" \
     $(printf -- "--sub %s " "${subs[@]}")
 )
 
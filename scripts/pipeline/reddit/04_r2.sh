@@ -9,29 +9,61 @@ CFG="${CFG:-$ROOT_DIR/config/pipeline/reddit/04_r2.yaml}"
 [[ -f "$CFG" ]] || { log_error "config not found: $CFG"; exit 1; }
 
 STAGED_ROOT="$(yaml_get "$CFG" "staged_root")"
+EXTRACT_ROOT="$(yaml_get "$CFG" "extract_root")"
+EXTRACT_CURSOR="$(yaml_get "$CFG" "extract_cursor")"
 LOOKBACK_DAYS="$(yaml_get "$CFG" "lookback_days")"
 R2_BUCKET="$(yaml_get "$CFG" "r2_bucket")"
 R2_PREFIX="$(yaml_get "$CFG" "r2_prefix")"
 MAX_CHARS="$(yaml_get "$CFG" "max_chars")"
 MAX_OBJECTS="$(yaml_get "$CFG" "max_objects_per_run")"
 CHECK_EXISTS="$(yaml_get "$CFG" "check_exists")"
-PUT_SLEEP_MS="$(yaml_get "$CFG" "put_sleep_ms")"
-PUT_JITTER_MS="$(yaml_get "$CFG" "put_jitter_ms")"
+EXISTS_MODE="$(yaml_get "$CFG" "exists_mode")"
+LIST_MAX_KEYS="$(yaml_get "$CFG" "list_max_keys")"
+LAYOUT="$(yaml_get "$CFG" "layout")"
+BUNDLE_BLOCK_BYTES="$(yaml_get "$CFG" "bundle_block_bytes")"
+ENCODING="$(yaml_get "$CFG" "encoding")"
+ENCODE_MIN_BYTES="$(yaml_get "$CFG" "encode_min_bytes")"
+MANIFEST_PATH="$(yaml_get "$CFG" "manifest_path")"
+CONCURRENCY="$(yaml_get "$CFG" "concurrency")"
+MAX_INFLIGHT="$(yaml_get "$CFG" "max_inflight")"
+PUT_RATE="$(yaml_get "$CFG" "put_rate")"
+PROFILE="$(yaml_get "$CFG" "profile")"
+PROFILE_DIR="$(yaml_get "$CFG" "profile_dir")"
 
 STAGED_ROOT="${STAGED_ROOT:-data/reddit/02_staged}"
+EXTRACT_ROOT="${EXTRACT_ROOT:-}"
+EXTRACT_CURSOR="${EXTRACT_CURSOR:-data/reddit/cache/r2_extract_cursor.json}"
 LOOKBACK_DAYS="${LOOKBACK_DAYS:-0}"
 R2_PREFIX="${R2_PREFIX:-reddit/v1}"
 MAX_CHARS="${MAX_CHARS:-20000}"
 MAX_OBJECTS="${MAX_OBJECTS:-0}"
 CHECK_EXISTS="${CHECK_EXISTS:-true}"
-PUT_SLEEP_MS="${PUT_SLEEP_MS:-0}"
-PUT_JITTER_MS="${PUT_JITTER_MS:-0}"
+EXISTS_MODE="${EXISTS_MODE:-head}"
+LIST_MAX_KEYS="${LIST_MAX_KEYS:-50000000}"
+LAYOUT="${LAYOUT:-objects}"
+BUNDLE_BLOCK_BYTES="${BUNDLE_BLOCK_BYTES:-16384}"
+ENCODING="${ENCODING:-none}"
+ENCODE_MIN_BYTES="${ENCODE_MIN_BYTES:-1024}"
+MANIFEST_PATH="${MANIFEST_PATH:-}"
+CONCURRENCY="${CONCURRENCY:-16}"
+MAX_INFLIGHT="${MAX_INFLIGHT:-0}"
+PUT_RATE="${PUT_RATE:-0}"
+PROFILE="${PROFILE:-none}"
+PROFILE_DIR="${PROFILE_DIR:-data/reddit/logs/profile}"
 
 [[ "$LOOKBACK_DAYS" =~ ^[0-9]+$ ]] || { log_error "bad lookback_days=$LOOKBACK_DAYS"; exit 1; }
 [[ "$MAX_CHARS" =~ ^[0-9]+$ ]] || { log_error "bad max_chars=$MAX_CHARS"; exit 1; }
 [[ "$MAX_OBJECTS" =~ ^[0-9]+$ ]] || { log_error "bad max_objects_per_run=$MAX_OBJECTS"; exit 1; }
-[[ "$PUT_SLEEP_MS" =~ ^[0-9]+$ ]] || { log_error "bad put_sleep_ms=$PUT_SLEEP_MS"; exit 1; }
-[[ "$PUT_JITTER_MS" =~ ^[0-9]+$ ]] || { log_error "bad put_jitter_ms=$PUT_JITTER_MS"; exit 1; }
+[[ "$EXISTS_MODE" == "head" || "$EXISTS_MODE" == "list" ]] || { log_error "bad exists_mode=$EXISTS_MODE"; exit 1; }
+[[ "$LIST_MAX_KEYS" =~ ^[0-9]+$ ]] || { log_error "bad list_max_keys=$LIST_MAX_KEYS"; exit 1; }
+[[ "$LAYOUT" == "objects" || "$LAYOUT" == "bundle" ]] || { log_error "bad layout=$LAYOUT"; exit 1; }
+[[ "$BUNDLE_BLOCK_BYTES" =~ ^[0-9]+$ ]] || { log_error "bad bundle_block_bytes=$BUNDLE_BLOCK_BYTES"; exit 1; }
+[[ "$ENCODING" == "none" || "$ENCODING" == "gzip" ]] || { log_error "bad encoding=$ENCODING"; exit 1; }
+[[ "$ENCODE_MIN_BYTES" =~ ^[0-9]+$ ]] || { log_error "bad encode_min_bytes=$ENCODE_MIN_BYTES"; exit 1; }
+[[ "$CONCURRENCY" =~ ^[0-9]+$ ]] || { log_error "bad concurrency=$CONCURRENCY"; exit 1; }
+[[ "$MAX_INFLIGHT" =~ ^[0-9]+$ ]] || { log_error "bad max_inflight=$MAX_INFLIGHT"; exit 1; }
+[[ "$PUT_RATE" =~ ^[0-9]+(\.[0-9]+)?$ ]] || { log_error "bad put_rate=$PUT_RATE"; exit 1; }
+[[ "$PROFILE" =~ ^(none|cpu|mem|duckdb)$ ]] || { log_error "bad profile=$PROFILE"; exit 1; }
 
 [[ -n "${R2_BUCKET:-}" ]] || { log_error "missing config: r2_bucket"; exit 1; }
 [[ -n "${R2_ACCESS_KEY_ID:-}" ]] || { log_error "missing env: R2_ACCESS_KEY_ID"; exit 1; }
@@ -45,7 +77,7 @@ TOTAL="${#subs[@]}"
 [[ "$TOTAL" -gt 0 ]] || { log_error "no subreddits found in $CFG"; exit 1; }
 
 task_start "reddit:04_r2"
-log_info "cfg=$CFG staged_root=$STAGED_ROOT lookback_days=$LOOKBACK_DAYS bucket=$R2_BUCKET prefix=$R2_PREFIX subs=$TOTAL max_objects_per_run=$MAX_OBJECTS check_exists=$CHECK_EXISTS"
+log_info "cfg=$CFG staged_root=$STAGED_ROOT extract_root=${EXTRACT_ROOT:-none} lookback_days=$LOOKBACK_DAYS bucket=$R2_BUCKET prefix=$R2_PREFIX subs=$TOTAL max_objects_per_run=$MAX_OBJECTS check_exists=$CHECK_EXISTS exists_mode=$EXISTS_MODE layout=$LAYOUT encoding=$ENCODING manifest=${MANIFEST_PATH:-none} concurrency=$CONCURRENCY put_rate=$PUT_RATE"
 
 "$PY" "$ROOT_DIR/apps/reddit/r2/cmd/uploader/main.py" \
   --staged-root "$ROOT_DIR/$STAGED_ROOT" \
@@ -55,8 +87,20 @@ log_info "cfg=$CFG staged_root=$STAGED_ROOT lookback_days=$LOOKBACK_DAYS bucket=
   --max-chars "$MAX_CHARS" \
   --max-objects-per-run "$MAX_OBJECTS" \
   --check-exists "$CHECK_EXISTS" \
-  --put-sleep-ms "$PUT_SLEEP_MS" \
-  --put-jitter-ms "$PUT_JITTER_MS" \
+  --exists-mode "$EXISTS_MODE" \
+  --list-max-keys "$LIST_MAX_KEYS" \
+  --layout "$LAYOUT" \
+  --bundle-block-bytes "$BUNDLE_BLOCK_BYTES" \
+  --encoding "$ENCODING" \
+  --encode-min-bytes "$ENCODE_MIN_BYTES" \
+  --extract-root "${EXTRACT_ROOT:+$ROOT_DIR/$EXTRACT_ROOT}" \
+  --extract-cursor "$ROOT_DIR/$EXTRACT_CURSOR" \
+  --manifest-path "${MANIFEST_PATH:+$ROOT_DIR/$MANIFEST_PATH}" \
+  --concurrency "$CONCURRENCY" \
+  --max-inflight "$MAX_INFLIGHT" \
+  --put-rate "$PUT_RATE" \
+  --profile "$PROFILE" \
+  --profile-dir "$ROOT_DIR/$PROFILE_DIR" \
   $(printf -- "--sub %s " "${subs[@]}")
 
 task_end "reddit:04_r2"
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+import argparse
+import datetime as dt
+import json
+import os
+import queue
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[3]
+CFG_DIR = ROOT_DIR / "config" / "pipeline" / "reddit"
+STAGE_DIR = ROOT_DIR / "scripts" / "pipeline" / "reddit"
+
+# Stage graph. per_sub stages run one node per subreddit with a single-sub copy of
+# their yaml; the others run once over all subs. A stage's per-run budget key is
+# split across its sub nodes so a DAG run spends no more than one stage run would.
+STAGES = {
+    "00_raw": {"per_sub": True, "deps": [], "res": ["reddit"]},
+    "01_parquet": {"per_sub": True, "deps": ["00_raw"], "res": ["cpu"]},
+    "02_staged": {"per_sub": True, "deps": ["01_parquet"], "res": ["cpu"]},
+    "02b_extract": {"per_sub": True, "deps": ["02_staged"], "res": ["cpu", "extract_state"]},
+    "02c_compact": {"per_sub": True, "deps": ["02_staged"], "res": ["cpu"]},
+    "03_index": {"per_sub": True, "deps": ["02b_extract"], "res": ["gemini", "vectorize", "index_state"], "budget": "max_vectors_per_run"},
+    "04_r2": {"per_sub": True, "deps": ["02b_extract"], "res": ["r2", "r2_state"], "budget": "max_objects_per_run"},
+}
+RESOURCES = ["cpu", "reddit", "gemini", "vectorize", "r2"]
+# Always held by one node at a time: state a stage's sub nodes share.
+# extract_state: 02b_extract's run seq (_state.sqlite). index_state: the 03_index
+# extract cursor file. r2_state: the 04_r2 extract cursor file and manifest.
+LOCKS = ["extract_state", "index_state", "r2_state"]
+
+def log(level, msg):
+    sys.stderr.write(f"[{level}] {msg}\n")
+    sys.stderr.flush()
+
+def _unquote(s: str) -> str:
+    s = s.strip()
+    if len(s) >= 2 and s[0] == s[-1] and s[0] in "\"'":
+        s = s[1:-1]
+    return s
+
+def _lines(path: Path):
+    for line in path.read_text(encoding="utf-8").splitlines():
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        yield line
+
+def yaml_get(path: Path, key: str, default: str = "") -> str:
+    """Same lookup as scripts/lib/yaml.sh yaml_get: first `key: value` line."""
+    m_key = re.compile(rf"^\s*{re.escape(key)}:\s*")
+    for line in _lines(path):
+        m = m_key.match(line)
+        if m:
+            v = _unquote(line[m.end():])
+            return v if v else default
+    return default
+
+def yaml_list(path: Path, key: str):
+    """Same lookup as scripts/lib/yaml.sh yaml_list: `key:` then indented `- item` lines."""
+    out = []
+    inside = False
+    m_key = re.compile(rf"^\s*{re.escape(key)}:\s*$")
+    for line in _lines(path):
+        if m_key.match(line):
+            inside = True
+            continue
+        if inside and not line[0].isspace():
+            inside = False
+        if inside:
+            m = re.match(r"^\s*-\s+(.*)$", line)
+            if m and _unquote(m.group(1)):
+                out.append(_unquote(m.group(1)))
+    return out
+
+def split_budget(total: int, n: int):
+    """Shares of a per-run budget for n nodes; 0 (none or unlimited) stays 0 for all."""
+    if total <= 0:
+        return [total] * n
+    q, r = divmod(total, n)
+    return [max(1, q + (1 if i < r else 0)) for i in range(n)]
+
+def single_sub_config(path: Path, sub: str, budget=None) -> str:
+    """The stage yaml with its subreddits block narrowed to one sub.
+
+    budget is (key, value) to replace the first `key:` line with, as yaml_get reads it.
+    """
+    out = []
+    inside = False
+    for line in path.read_text(encoding="utf-8").splitlines():
+        if budget and re.match(rf"^\s*{re.escape(budget[0])}:", line):
+            line = f"{budget[0]}: {budget[1]}"
+            budget = None
+        if re.match(r"^\s*subreddits:\s*$", line):
+            inside = True
+            out += ["subreddits:", f"  - {sub}"]
+            continue
+        if inside:
+            if not line.strip() or line.lstrip().startswith("#") or line[0].isspace():
+                continue
+            inside = False
+        out.append(line)
+    return "\n".join(out) + "\n"
+
+class Node:
+    def __init__(self, stage: str, sub: str):
+        self.stage = stage
+        self.sub = sub
+        self.name = f"{stage}[{sub}]" if sub else stage
+        self.res = STAGES[stage]["res"]
+        self.deps = []
+        self.state = "pending"
+        self.rc = None
+        self.t_ready = None
+        self.t_start = None
+        self.t_end = None
+        self.log_path = None
+        self.height = 0
+        self.budget = None
+
+def build_graph(stages, only_subs):
+    nodes = {}
+    by_stage = {}
+    for st in stages:
+        spec = STAGES[st]
+        if spec["per_sub"]:
+            subs = yaml_list(CFG_DIR / f"{st}.yaml", "subreddits")
+            if only_subs:
+                subs = [s for s in subs if s in only_subs]
+            by_stage[st] = [Node(st, s) for s in subs]
+            key = spec.get("budget")
+            total = yaml_get(CFG_DIR / f"{st}.yaml", key) if key else ""
+            if re.fullmatch(r"[0-9]+", total) and subs:
+                for n, share in zip(by_stage[st], split_budget(int(total), len(subs))):
+                    n.budget = (key, share)
+        else:
+            by_stage[st] = [Node(st, "")]
+        for n in by_stage[st]:
+            nodes[n.name] = n
+
+    def upstream(st):
+        # Stages left out of this run are bridged to their own upstream.
+        out = []
+        for u in STAGES[st]["deps"]:
+            out += [u] if u in by_stage else upstream(u)
+        return out
+
+    for st in stages:
+        for n in by_stage[st]:
+            for u in upstream(st):
+                for d in by_stage[u]:
+                    if not n.sub or not d.sub or d.sub == n.sub:
+                        n.deps.append(d)
+
+    # Longest chain below each node; ready nodes on long chains start first.
+    for st in reversed(stages):
+        for n in by_stage[st]:
+            for d in n.deps:
+                d.height = max(d.height, n.height + 1)
+    return [n for st in stages for n in by_stage[st]]
+
+def run_node(n: Node, run_dir: Path, done: "queue.Queue"):
+    cfg = CFG_DIR / f"{n.stage}.yaml"
+    env = dict(os.environ)
+    tmp_cfg = None
+    if n.sub:
+        fd, tmp_cfg = tempfile.mkstemp(prefix=f".{n.stage}_{n.sub}_", suffix=".yaml", dir=run_dir)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(single_sub_config(cfg, n.sub, n.budget))
+        env["CFG"] = tmp_cfg
+    else:
+        env["CFG"] = str(cfg)
+    try:
+        with open(n.log_path, "wb") as lf:
+            p = subprocess.run(["bash", str(STAGE_DIR / f"{n.stage}.sh")], cwd=ROOT_DIR, env=env,
+                               stdin=subprocess.DEVNULL, stdout=lf, stderr=subprocess.STDOUT)
+        n.rc = p.returncode
+    except OSError as e:
+        log("ERROR", f"dag node={n.name} action=fail reason=spawn err={e}")
+        n.rc = 127
+    finally:
+        if tmp_cfg:
+            os.remove(tmp_cfg)
+    n.t_end = time.monotonic()
+    done.put(n)
+
+def _tail(path: Path, lines: int = 20):
+    try:
+        return path.read_text(encoding="utf-8", errors="replace").splitlines()[-lines:]
+    except FileNotFoundError:
+        return []
+
+def schedule(nodes, limits, run_dir: Path, t0: float):
+    free = dict(limits)
+    done = queue.Queue()
+    pending = list(nodes)
+    running = 0
+    while pending or running:
+        progressed = True
+        while progressed:
+            progressed = False
+            for n in list(pending):
+                bad = [d for d in n.deps if d.state in ("failed", "skipped")]
+                if bad:
+                    n.state = "skipped"
+                    pending.remove(n)
+                    progressed = True
+                    log("WARN", f"dag node={n.name} action=skip reason=upstream_failed upstream={bad[0].name}")
+                elif n.t_ready is None and all(d.state == "ok" for d in n.deps):
+                    n.t_ready = max([d.t_end for d in n.deps], default=t0)
+        ready = sorted((n for n in pending if n.t_ready is not None), key=lambda n: (-n.height, nodes.index(n)))
+        for n in ready:
+            if all(free[r] > 0 for r in n.res):
+                for r in n.res:
+                    free[r] -= 1
+                pending.remove(n)
+                n.state = "running"
+                n.t_start = time.monotonic()
+                n.log_path = run_dir / f"{n.stage}{'__' + n.sub if n.sub else ''}.log"
+                running += 1
+                log("INFO", f"dag node={n.name} action=start res={'+'.join(n.res)} waited_s={n.t_start - n.t_ready:.1f} log={n.log_path}")
+                threading.Thread(target=run_node, args=(n, run_dir, done), daemon=True).start()
+        if not running:
+            break
+        n = done.get()
+        running -= 1
+        for r in n.res:
+            free[r] += 1
+        n.state = "ok" if n.rc == 0 else "failed"
+        if n.rc == 0:
+            log("INFO", f"dag node={n.name} action=done elapsed_s={n.t_end - n.t_start:.1f}")
+        else:
+            log("ERROR", f"dag node={n.name} action=fail rc={n.rc} elapsed_s={n.t_end - n.t_start:.1f} log={n.log_path}")
+            for line in _tail(n.log_path):
+                log("ERROR", f"dag node={n.name} | {line}")
+
+def critical_path(nodes):
+    """Walk back from the last finisher through the dependency that released it."""
+    ran = [n for n in nodes if n.t_end is not None]
+    if not ran:
+        return []
+    n = max(ran, key=lambda x: x.t_end)
+    path = [n]
+    while True:
+        deps = [d for d in n.deps if d.t_end is not None]
+        if not deps:
+            break
+        n = max(deps, key=lambda x: x.t_end)
+        path.append(n)
+    return path[::-1]
+
+def report(nodes, t0: float, t1: float, run_dir: Path):
+    rows = []
+    for n in nodes:
+        rows.append({
+            "node": n.name, "stage": n.stage, "sub": n.sub, "state": n.state, "rc": n.rc, "res": n.res,
+            "deps": [d.name for d in n.deps],
+            "start_s": round(n.t_start - t0, 3) if n.t_start is not None else None,
+            "wait_s": round(n.t_start - n.t_ready, 3) if n.t_start is not None else None,
+            "elapsed_s": round(n.t_end - n.t_start, 3) if n.t_end is not None else None,
+        })
+    path = critical_path(nodes)
+    wall = t1 - t0
+    busy = sum(r["elapsed_s"] or 0.0 for r in rows)
+
+    w = max([len(r["node"]) for r in rows] + [4])
+    rw = max([len("+".join(r["res"])) for r in rows] + [16])
+    print(f"{'node':<{w}}  {'state':<7}  {'res':<{rw}}  {'start_s':>8}  {'wait_s':>7}  {'elapsed_s':>9}")
+    for r in rows:
+        f = lambda v: "-" if v is None else f"{v:.1f}"
+        print(f"{r['node']:<{w}}  {r['state']:<7}  {'+'.join(r['res']):<{rw}}  {f(r['start_s']):>8}  {f(r['wait_s']):>7}  {f(r['elapsed_s']):>9}")
+    print()
+    print("critical path:")
+    prev_end = t0
+    for n in path:
+        wait = n.t_start - max(prev_end, n.t_ready)
+        note = f"  (+{wait:.1f}s waiting for {'+'.join(n.res)})" if wait >= 0.05 else ""
+        print(f"  {n.name:<{w}}  {n.t_end - n.t_start:8.1f}s{note}")
+        prev_end = n.t_end
+    cp = sum(n.t_end - n.t_start for n in path)
+    print(f"  {'total':<{w}}  {cp:8.1f}s")
+    print()
+    print(f"wall_s={wall:.1f} node_s={busy:.1f} critical_s={cp:.1f} parallelism={busy / max(wall, 1e-9):.2f}")
+
+    doc = {
+        "started_at": dt.datetime.now(dt.UTC).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "wall_s": round(wall, 3), "node_s": round(busy, 3), "critical_s": round(cp, 3),
+        "critical_path": [n.name for n in path], "nodes": rows,
+    }
+    with open(run_dir / "report.json", "w", encoding="utf-8") as f:
+        json.dump(doc, f, ensure_ascii=False, indent=2)
+        f.write("\n")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--config", default=str(CFG_DIR / "dag.yaml"))
+    ap.add_argument("--stages", default="", help="comma separated stages (default: the config list)")
+    ap.add_argument("--sub", action="append", default=[], help="only these subreddits for per-sub stages")
+    ap.add_argument("--dry-run", action="store_true", help="print the graph and exit")
+    args = ap.parse_args()
+
+    cfg = Path(args.config)
+    if not cfg.is_file():
+        log("ERROR", f"config not found: {cfg}")
+        return 1
+    stages = [s for s in args.stages.split(",") if s] if args.stages else yaml_list(cfg, "stages")
+    stages = stages or list(STAGES)
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        log("ERROR", f"unknown stages={','.join(unknown)}")
+        return 1
+    stages = [s for s in STAGES if s in stages]
+    limits = {}
+    for r in RESOURCES:
+        v = yaml_get(cfg, f"limit_{r}", "1")
+        if not re.fullmatch(r"[1-9][0-9]*", v):
+            log("ERROR", f"bad limit_{r}={v}")
+            return 1
+        limits[r] = int(v)
+    limits.update({r: 1 for r in LOCKS})
+
+    nodes = build_graph(stages, set(args.sub))
+    if not nodes:
+        log("ERROR", "no nodes to run")
+        return 1
+    log("INFO", f"dag cfg={cfg} stages={','.join(stages)} nodes={len(nodes)} " + " ".join(f"limit_{r}={v}" for r, v in limits.items()))
+    if args.dry_run:
+        for n in nodes:
+            budget = f"  {n.budget[0]}={n.budget[1]}" if n.budget else ""
+            print(f"{n.name}  res={'+'.join(n.res)}  deps={','.join(d.name for d in n.deps) or '-'}{budget}")
+        return 0
+
+    log_root = ROOT_DIR / yaml_get(cfg, "log_root", "data/reddit/logs/dag")
+    run_dir = log_root / dt.datetime.now(dt.UTC).strftime("%Y%m%dT%H%M%SZ")
+    run_dir.mkdir(parents=True, exist_ok=True)
+    t0 = time.monotonic()
+    schedule(nodes, limits, run_dir, t0)
+    t1 = time.monotonic()
+    report(nodes, t0, t1, run_dir)
+
+    bad = [n for n in nodes if n.state != "ok"]
+    log("INFO" if not bad else "ERROR", f"dag done nodes={len(nodes)} ok={len(nodes) - len(bad)} failed_or_skipped={len(bad)} "
+        f"wall_s={t1 - t0:.1f} report={run_dir / 'report.json'}")
+    return 2 if bad else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
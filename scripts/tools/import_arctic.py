@@ -1,11 +1,48 @@
 import argparse
+import collections
 import datetime
+import gzip
 import hashlib
+import io
 import json
 import os
+import pickle
+import re
+import shutil
+import sqlite3
 import sys
+import tempfile
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# orjson writes floats outside [1e-4, 1e16) differently from json.dumps
+# (0.00001 vs 1e-05, 1e16 vs 1e+16); canonical bytes containing one of those
+# shapes are re-encoded with the stdlib so hashes never change.
+RE_FAST_FLOAT_UNSAFE = re.compile(rb"\d[eE]|0\.0000")
+
+DUMP_READ_BYTES = 16 * 1024 * 1024
+# Arctic Shift / Pushshift dumps are compressed with --long=31.
+ZSTD_MAX_WINDOW = 1 << 31
+
+# Columns of the 01_parquet layout, as the 01_parquet converter selects them from a raw file.
+PARQUET_COLUMNS = {
+    "submissions": ("author", "body", "title"),
+    "comments": ("author", "body", "comment_id", "parent_id"),
+}
+
+# apps/reddit, so the modules shared with the reddit commands import as internal.*.
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "apps" / "reddit"))
+
+from internal import profiling
+from internal.journal import journal_append, journal_open
+
 def log(level, msg):
     sys.stderr.write(f"[{level}] {msg}\n")
 
@@ -30,15 +67,132 @@ def norm_sub(s):
         s = s[2:]
     return s.strip()
 
-def has_hash_file(dir_path: Path, h: str) -> bool:
-    if not dir_path.is_dir():
-        return False
-    needle = "_" + h
-    with os.scandir(dir_path) as it:
-        for e in it:
-            if e.is_file() and e.name.endswith(".jsonl") and needle in e.name:
-                return True
-    return False
+class ImportIndex:
+    """SQLite store of post creation times and written (thread dir, hash) pairs for one --root.
+
+    Comment-only imports resolve thread dirs from it, and dedup checks become
+    primary-key lookups instead of a scandir of the thread dir per record. A
+    tree written before the index existed is scanned once on first use.
+    """
+
+    def __init__(self, path: Path, root: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.root = root
+        self.con = sqlite3.connect(str(path), timeout=5.0)
+        self.con.execute("PRAGMA journal_mode=WAL")
+        self.con.execute("PRAGMA synchronous=NORMAL")
+        self.con.execute(
+            "CREATE TABLE IF NOT EXISTS posts ("
+            "sub TEXT NOT NULL, pid TEXT NOT NULL, created INTEGER NOT NULL, "
+            "PRIMARY KEY (sub, pid)) WITHOUT ROWID"
+        )
+        self.con.execute("CREATE TABLE IF NOT EXISTS hashes (dir TEXT NOT NULL, h BLOB NOT NULL, PRIMARY KEY (dir, h)) WITHOUT ROWID")
+        self.con.execute("CREATE TABLE IF NOT EXISTS meta (k TEXT PRIMARY KEY, v TEXT NOT NULL)")
+        self.con.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            "file TEXT PRIMARY KEY, fp TEXT NOT NULL, state TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self.con.commit()
+        self.spill_root = path.parent / "_import_spill"
+
+    def get_meta(self, k: str) -> str:
+        row = self.con.execute("SELECT v FROM meta WHERE k = ?", [k]).fetchone()
+        return row[0] if row else ""
+
+    def set_meta(self, k: str, v: str):
+        self.con.execute("INSERT OR REPLACE INTO meta (k, v) VALUES (?, ?)", [k, v])
+
+    def created(self, sub: str, pid: str):
+        row = self.con.execute("SELECT created FROM posts WHERE sub = ? AND pid = ?", [sub, pid]).fetchone()
+        return row[0] if row else None
+
+    def note_post(self, sub: str, pid: str, created: int):
+        self.con.execute(
+            "INSERT INTO posts (sub, pid, created) VALUES (?, ?, ?) "
+            "ON CONFLICT (sub, pid) DO UPDATE SET created = min(created, excluded.created)",
+            [sub, pid, created],
+        )
+
+    def _rel(self, d: Path) -> str:
+        return d.relative_to(self.root).as_posix()
+
+    def has_hash(self, d: Path, h: str) -> bool:
+        row = self.con.execute("SELECT 1 FROM hashes WHERE dir = ? AND h = ?", [self._rel(d), bytes.fromhex(h)]).fetchone()
+        return row is not None
+
+    def add_hash(self, d: Path, h: str):
+        self.con.execute("INSERT OR IGNORE INTO hashes (dir, h) VALUES (?, ?)", [self._rel(d), bytes.fromhex(h)])
+
+    def load_checkpoint(self, file: str, fp: str):
+        """Return the saved state for file, or None when absent or the file changed since."""
+        row = self.con.execute("SELECT fp, state FROM checkpoints WHERE file = ?", [file]).fetchone()
+        if row is None:
+            return None
+        if row[0] != fp:
+            log("WARN", f"checkpoint action=discard file={file} reason=file_changed")
+            return None
+        return json.loads(row[1])
+
+    def save_checkpoint(self, file: str, fp: str, state: dict):
+        # Not committed here: the caller commits it together with the posts and
+        # hashes written up to state["offset"].
+        self.con.execute(
+            "INSERT OR REPLACE INTO checkpoints (file, fp, state, updated_at) VALUES (?, ?, ?, ?)",
+            [file, fp, json.dumps(state, separators=(",", ":")), time.time()],
+        )
+
+    def spill_dir(self, file: str) -> Path:
+        """Fixed spill location for a dump, so a resumed run finds the runs its checkpoint names."""
+        return self.spill_root / hashlib.sha256(file.encode("utf-8")).hexdigest()[:16]
+
+    def count_posts(self) -> int:
+        return self.con.execute("SELECT count(*) FROM posts").fetchone()[0]
+
+    def commit(self):
+        self.con.commit()
+
+    def close(self):
+        self.con.commit()
+        self.con.close()
+
+    def bootstrap(self, rebuild: bool = False):
+        """Load the posts and hashes already on disk under root; runs once per index unless rebuild."""
+        if self.get_meta("bootstrapped") and not rebuild:
+            return
+        t0 = time.perf_counter()
+        if rebuild:
+            self.con.execute("DELETE FROM posts")
+            self.con.execute("DELETE FROM hashes")
+        n_dirs = 0
+        n_hashes = 0
+        for sd in sorted(self.root.glob("r_*")):
+            sub = sd.name[2:]
+            for kind in ("submissions", "comments"):
+                for td in sd.glob(f"{kind}/*/*/*"):
+                    y, md, name = td.parts[-3:]
+                    hms, _, pid = name.partition("_")
+                    if not pid or not td.is_dir():
+                        continue
+                    n_dirs += 1
+                    with os.scandir(td) as it:
+                        for e in it:
+                            stem, dot, ext = e.name.rpartition(".")
+                            if not dot or ext not in ("jsonl", "parquet") or "_" not in stem or stem.startswith("."):
+                                continue
+                            try:
+                                self.add_hash(td, stem.split("_", 1)[1])
+                                n_hashes += 1
+                            except ValueError:
+                                continue
+                    if kind == "submissions":
+                        try:
+                            dt = datetime.datetime.strptime(f"{y}{md}{hms}", "%Y%m%d%H%M%S")
+                        except ValueError:
+                            continue
+                        self.note_post(sub, pid, int(dt.replace(tzinfo=datetime.timezone.utc).timestamp()))
+        self.set_meta("bootstrapped", str(int(time.time())))
+        self.commit()
+        log("INFO", f"index bootstrap root={self.root} dirs={n_dirs} hashes={n_hashes} posts={self.count_posts()} elapsed_s={time.perf_counter() - t0:.2f}")
 
 def sha256_bytes(b: bytes) -> str:
     return hashlib.sha256(b).hexdigest()
@@ -63,206 +217,755 @@ def hash_comments(rows):
     data = ("\n".join(buf)).encode("utf-8", "ignore")
     return sha256_bytes(data)
 
-def write_one_jsonl(path: Path, line: str) -> bool:
+def parse_line(s: str, fast: bool):
+    """Parse one dump line; returns (obj, parsed_by_orjson), obj is None on bad input."""
+    if fast:
+        try:
+            return orjson.loads(s), True
+        except Exception:
+            pass
     try:
-        with path.open("x", encoding="utf-8") as w:
-            w.write(line)
-            if not line.endswith("\n"):
-                w.write("\n")
-        return True
-    except FileExistsError:
-        return False
+        return json.loads(s), False
+    except Exception:
+        return None, False
+
+def canon_bytes(obj, fast: bool) -> bytes:
+    """Canonical JSON bytes as hashed by hash_post/hash_comments.
+
+    With fast set (obj came from orjson.loads) orjson does the encoding, unless
+    its output holds a float shape that json.dumps spells differently.
+    """
+    if fast:
+        try:
+            b = orjson.dumps(obj, option=orjson.OPT_SORT_KEYS)
+        except Exception:
+            b = b""
+        if b and not RE_FAST_FLOAT_UNSAFE.search(b):
+            return b
+    return json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8", "ignore")
+
+def pq_str(v) -> str:
+    if v is None:
+        return ""
+    return v if isinstance(v, str) else json.dumps(v, ensure_ascii=False)
+
+def post_record(obj, fast: bool, fmt: str = "jsonl"):
+    """Reduce a parsed submission to (sub, pid, created, capture_ts, hash, payload) or None.
+
+    payload is the raw line, or the 01_parquet column values with fmt parquet.
+    """
+    if not isinstance(obj, dict):
+        return None
 
-def write_many_jsonl(path: Path, rows) -> bool:
+    sub = norm_sub(obj.get("subreddit") or obj.get("subreddit_name_prefixed") or "")
+    if not sub:
+        return None
+
+    pid = obj.get("id")
+    created = obj.get("created_utc")
+    if not pid or created is None:
+        return None
     try:
-        with path.open("x", encoding="utf-8") as w:
-            for r in rows:
-                w.write(json.dumps(r, ensure_ascii=False))
-                w.write("\n")
-        return True
-    except FileExistsError:
+        created_int = int(float(created))
+    except Exception:
+        return None
+    if created_int <= 0:
+        return None
+
+    retrieved = obj.get("retrieved_utc")
+    if retrieved is None:
+        retrieved = obj.get("retrieved_on")
+    if retrieved is None:
+        retrieved = datetime.datetime.now(datetime.timezone.utc).timestamp()
+
+    capture_ts = ts_fmt(retrieved) or ts_fmt(created_int)
+    h = sha256_bytes(canon_bytes(obj, fast))
+    if fmt == "parquet":
+        return sub, pid, created_int, capture_ts, h, (pq_str(obj.get("author")), pq_str(obj.get("selftext")), pq_str(obj.get("title")))
+    return sub, pid, created_int, capture_ts, h, json.dumps(obj, ensure_ascii=False)
+
+def comment_record(obj, fast: bool, fmt: str = "jsonl"):
+    """Reduce a parsed comment to ((sub, pid), (cid, sort_key, retrieved, canon, payload)) or None.
+
+    Rows without an id still count towards the thread capture time, so they
+    are kept with empty payload.
+    """
+    if not isinstance(obj, dict):
+        return None
+
+    sub = norm_sub(obj.get("subreddit") or "")
+    if not sub:
+        return None
+
+    link_id = obj.get("link_id")
+    if not isinstance(link_id, str) or not link_id.startswith("t3_"):
+        return None
+    pid = link_id.split("_", 1)[1]
+
+    t = None
+    v = obj.get("retrieved_utc")
+    if v is None:
+        v = obj.get("retrieved_on")
+    if v is not None:
+        try:
+            t = int(float(v))
+        except Exception:
+            t = None
+
+    cid = obj.get("id")
+    if not cid:
+        return (sub, pid), (None, None, t, b"", "")
+    if fmt == "parquet":
+        payload = (pq_str(obj.get("author")), pq_str(obj.get("body")), pq_str(cid), pq_str(obj.get("parent_id")))
+    else:
+        payload = json.dumps(obj, ensure_ascii=False)
+    return (sub, pid), (cid, comment_sort_key(obj), t, canon_bytes(obj, fast), payload)
+
+def write_jsonl(path: Path, lines) -> bool:
+    """Create path with one line per item; False if it already exists.
+
+    The body goes to a dot-prefixed temp file that os.link publishes, which
+    fails like open("x") on an existing path, so a crash mid-write never
+    leaves a truncated file that later runs would take for the real one.
+    """
+    if path.exists():
         return False
+    tmp = path.with_name(f".{path.name}.tmp")
+    try:
+        with tmp.open("w", encoding="utf-8") as w:
+            for ln in lines:
+                w.write(ln)
+                if not ln.endswith("\n"):
+                    w.write("\n")
+        try:
+            os.link(tmp, path)
+        except FileExistsError:
+            return False
+        return True
+    finally:
+        tmp.unlink(missing_ok=True)
+
+def write_one_jsonl(path: Path, line: str) -> bool:
+    return write_jsonl(path, [line])
+
+def write_many_jsonl(path: Path, lines) -> bool:
+    return write_jsonl(path, lines)
+
+def sql_esc(s) -> str:
+    return str(s).replace("'", "''")
+
+class ParquetBatch:
+    """Buffered thread files for the 01_parquet layout, written set-based.
+
+    Each flush spools the buffered rows to one NDJSON file and runs a single
+    DuckDB COPY partitioned by output file into a scratch dir under root; every
+    partition is then linked to its final name, which skips names that already
+    exist, so no per-thread .jsonl or per-file COPY is involved.
+    """
+
+    def __init__(self, root: Path, kind: str, compression: str, level: int, threads: int, max_files: int):
+        self.root = root
+        self.kind = kind
+        self.cols = PARQUET_COLUMNS[kind]
+        self.copy_opts = f"FORMAT parquet, COMPRESSION '{compression}'"
+        if compression.lower() == "zstd" and level > 0:
+            self.copy_opts += f", COMPRESSION_LEVEL {level}"
+        self.con = profiling.duckdb_connect()
+        if threads > 0:
+            self.con.execute(f"SET threads={threads}")
+        self.max_files = max(1, max_files)
+        self.items = {}
+        self.journal = journal_open(root / "_journal.sqlite")
+        for d in root.glob(".import_parquet_*"):
+            shutil.rmtree(d, ignore_errors=True)
+
+    def pending(self, d: Path, h: str) -> bool:
+        return (d, h) in self.items
+
+    def add(self, d: Path, h: str, out: Path, rows):
+        self.items[(d, h)] = (out, rows)
+
+    def full(self) -> bool:
+        return len(self.items) >= self.max_files
+
+    def flush(self):
+        """Write every buffered file; returns [(dir, hash, wrote)] for the index."""
+        if not self.items:
+            return []
+        items = list(self.items.items())
+        self.items = {}
+        tmp = Path(tempfile.mkdtemp(prefix=".import_parquet_", dir=self.root))
+        try:
+            spool = tmp / "rows.ndjson"
+            with spool.open("w", encoding="utf-8") as f:
+                for k, (_, (_, rows)) in enumerate(items):
+                    for i, r in enumerate(rows):
+                        d = {"k": k, "i": i}
+                        d.update(zip(self.cols, r))
+                        f.write(json.dumps(d))
+                        f.write("\n")
+            spec = ", ".join(["k: 'BIGINT'", "i: 'BIGINT'"] + [f"{c}: 'VARCHAR'" for c in self.cols])
+            self.con.execute(
+                f"COPY (SELECT k, {', '.join(self.cols)} FROM read_json('{sql_esc(spool)}', format='newline_delimited', columns={{{spec}}}) ORDER BY k, i) "
+                f"TO '{sql_esc(tmp / 'out')}' ({self.copy_opts}, PARTITION_BY (k), FILENAME_PATTERN 'data')"
+            )
+            done = []
+            for k, ((d, h), (out, rows)) in enumerate(items):
+                src = sorted((tmp / "out" / f"k={k}").glob("*.parquet"))
+                if not src and not rows:
+                    # No rows means no partition (a thread without comment ids); the
+                    # converter still writes a 0-row file for those, so do the same.
+                    empty = tmp / f"empty_{k}.parquet"
+                    nulls = ", ".join(f"NULL::VARCHAR AS {c}" for c in self.cols)
+                    self.con.execute(f"COPY (SELECT {nulls} LIMIT 0) TO '{sql_esc(empty)}' ({self.copy_opts})")
+                    src = [empty]
+                if len(src) != 1:
+                    raise RuntimeError(f"parquet batch produced {len(src)} files for {out}")
+                out.parent.mkdir(parents=True, exist_ok=True)
+                try:
+                    os.link(src[0], out)
+                    done.append((d, h, True))
+                except FileExistsError:
+                    done.append((d, h, False))
+            # Existing names are journaled too: they may come from a run that died before this point.
+            rels = sorted({out.parent.relative_to(self.root) for _, (out, _) in items})
+            journal_append(self.journal, [(r.parts[0][2:], self.kind, str(r)) for r in rels])
+            return done
+        finally:
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    def close(self):
+        self.con.close()
+        self.journal.close()
+
+def flush_parquet(pq: ParquetBatch, index: ImportIndex) -> int:
+    wrote = 0
+    for d, h, ok in pq.flush():
+        index.add_hash(d, h)
+        wrote += ok
+    return wrote
 
 def thread_dir(root: Path, sub: str, kind: str, created_unix: int, pid: str) -> Path:
     y, md, hms = split_created(created_unix)
     return root / f"r_{sub}" / kind / y / md / f"{hms}_{pid}"
 
-def import_posts(path: Path, root: Path, post_index: dict, report_every: int):
-    wrote = 0
-    scanned = 0
-    with path.open("r", encoding="utf-8", errors="ignore") as f:
-        for line in f:
-            scanned += 1
-            if report_every > 0 and scanned % report_every == 0:
-                log("INFO", f"posts progress file={path} scanned={scanned} wrote={wrote}")
-            s = line.strip()
-            if not s:
-                continue
-            try:
-                obj = json.loads(s)
-            except Exception:
-                continue
-            if not isinstance(obj, dict):
+def plan_shards(size: int, shard_bytes: int):
+    """Split [0, size) into byte ranges; lines belong to the range their first byte falls in."""
+    if size <= 0:
+        return []
+    n = max(1, -(-size // max(1, shard_bytes)))
+    step = -(-size // n)
+    return [(a, min(size, a + step)) for a in range(0, size, step)]
+
+def dump_codec(path: Path) -> str:
+    name = path.name.lower()
+    if name.endswith(".zst"):
+        return "zst"
+    if name.endswith(".gz"):
+        return "gz"
+    return ""
+
+def dump_kind(path: Path) -> str:
+    """Classify a dump as posts or comments from its name, ignoring compression suffixes."""
+    name = path.name
+    if "_posts" in name or "_submissions" in name:
+        return "posts"
+    if "_comments" in name:
+        return "comments"
+    return ""
+
+def open_dump(path: Path):
+    """Open a dump for streaming binary reads, decompressing .zst (multi-frame, long window) and .gz."""
+    codec = dump_codec(path)
+    if codec == "zst":
+        import zstandard
+
+        dctx = zstandard.ZstdDecompressor(max_window_size=ZSTD_MAX_WINDOW)
+        return dctx.stream_reader(path.open("rb"), read_size=DUMP_READ_BYTES, read_across_frames=True, closefd=True)
+    if codec == "gz":
+        return io.BufferedReader(gzip.open(path, "rb"), buffer_size=DUMP_READ_BYTES)
+    return path.open("rb", buffering=DUMP_READ_BYTES)
+
+def plan_jobs(path: Path, args, offset: int = 0):
+    """Yield shard jobs (path, start, end, fast, blob, fmt) for one dump from a shard-end offset.
+
+    Plain files are split into byte ranges the workers read themselves;
+    compressed files are decompressed here as one stream and handed out as
+    newline-aligned blobs of about --shard-mb, with offsets in decompressed bytes
+    (resuming still decompresses the skipped prefix, but does not parse it).
+    """
+    if not dump_codec(path):
+        for a, b in plan_shards(path.stat().st_size - offset, args.shard_bytes):
+            yield str(path), offset + a, offset + b, args.fast, None, args.out_format
+        return
+    off = offset
+    rest = b""
+    with open_dump(path) as f:
+        left = offset
+        while left > 0:
+            n = len(f.read(min(left, DUMP_READ_BYTES)))
+            if n == 0:
+                break
+            left -= n
+        while True:
+            chunk = f.read(args.shard_bytes)
+            if not chunk:
+                break
+            buf = rest + chunk if rest else chunk
+            cut = buf.rfind(b"\n") + 1
+            if cut == 0:
+                rest = buf
                 continue
+            yield str(path), off, off + cut, args.fast, buf[:cut], args.out_format
+            off += cut
+            rest = buf[cut:]
+    if rest:
+        yield str(path), off, off + len(rest), args.fast, rest, args.out_format
+
+def iter_job_lines(job):
+    path, start, end, _, blob, _ = job
+    if blob is None:
+        yield from iter_shard_lines(path, start, end)
+        return
+    lines = blob.split(b"\n")
+    if lines and not lines[-1]:
+        lines.pop()
+    for raw in lines:
+        yield raw.decode("utf-8", "ignore").strip()
+
+def iter_shard_lines(path: str, start: int, end: int):
+    """Yield stripped lines starting inside [start, end), reading past end to finish the last one."""
+    with open(path, "rb", buffering=DUMP_READ_BYTES) as f:
+        if start > 0:
+            f.seek(start - 1)
+            f.readline()
+        pos = f.tell()
+        while pos < end:
+            raw = f.readline()
+            if not raw:
+                break
+            pos += len(raw)
+            yield raw.decode("utf-8", "ignore").strip()
+
+def posts_shard(job):
+    fast = job[3]
+    scanned = 0
+    recs = []
+    for s in iter_job_lines(job):
+        scanned += 1
+        if not s:
+            continue
+        rec = post_record(*parse_line(s, fast), job[5])
+        if rec is not None:
+            recs.append(rec)
+    return job[2], scanned, recs
 
-            sub = norm_sub(obj.get("subreddit") or obj.get("subreddit_name_prefixed") or "")
-            if not sub:
-                continue
+def comments_shard(job):
+    fast = job[3]
+    scanned = 0
+    groups = {}
+    for s in iter_job_lines(job):
+        scanned += 1
+        if not s:
+            continue
+        rec = comment_record(*parse_line(s, fast), job[5])
+        if rec is not None:
+            groups.setdefault(rec[0], []).append(rec[1])
+    return job[2], scanned, groups
+
+def map_ordered(pool, fn, jobs, window: int):
+    """Run fn over jobs, yielding results in job order with at most window in flight."""
+    if pool is None:
+        yield from map(fn, jobs)
+        return
+    pending = collections.deque()
+    for job in jobs:
+        pending.append(pool.submit(fn, job))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def log_done(kind: str, path: Path, scanned: int, extra: str, t0: float, workers: int, shards: int, fast: bool):
+    elapsed = max(1e-9, time.perf_counter() - t0)
+    lps = scanned / elapsed
+    log(
+        "INFO",
+        f"{kind} done file={path} scanned={scanned} {extra} shards={shards} workers={workers} "
+        f"codec={'orjson' if fast else 'json'} elapsed_s={elapsed:.2f} lines_per_s={lps:.0f} lines_per_s_core={lps / workers:.0f}",
+    )
+
+def checkpoint_state(index: ImportIndex, path: Path, args):
+    """Return (file key, fingerprint, state) for a dump, resuming a saved state under --resume."""
+    key = str(path.resolve())
+    st = path.stat()
+    fp = f"{st.st_size}:{st.st_mtime_ns}"
+    state = index.load_checkpoint(key, fp) if args.resume else None
+    if state is None or not state.get("spill"):
+        shutil.rmtree(index.spill_dir(key), ignore_errors=True)
+    if state is not None:
+        log("INFO", f"checkpoint action=resume file={path} phase={state['phase']} offset={state['offset']} scanned={state['scanned']}")
+        return key, fp, state
+    return key, fp, {"phase": "scan", "offset": 0, "scanned": 0, "wrote": 0, "skipped": 0}
+
+def import_posts(path: Path, root: Path, index: ImportIndex, args, pool, pq: ParquetBatch | None = None):
+    t0 = time.perf_counter()
+    key, fp, st = checkpoint_state(index, path, args)
+    if st["phase"] == "done":
+        log("INFO", f"posts skip file={path} reason=checkpoint_done scanned={st['scanned']} wrote={st['wrote']}")
+        return
+    wrote = st["wrote"]
+    scanned = st["scanned"]
+    offset = st["offset"]
+    ckpt_at = offset
+    shards = 0
+    for end, n, recs in map_ordered(pool, posts_shard, plan_jobs(path, args, offset), args.workers * 2):
+        shards += 1
+        last = scanned
+        scanned += n
+        offset = end
+        if args.report_every > 0 and scanned // args.report_every > last // args.report_every:
+            log("INFO", f"posts progress file={path} scanned={scanned} wrote={wrote}")
+        for sub, pid, created_int, capture_ts, h, line in recs:
+            index.note_post(sub, pid, created_int)
 
-            pid = obj.get("id")
-            created = obj.get("created_utc")
-            if not pid or created is None:
-                continue
-            try:
-                created_int = int(float(created))
-            except Exception:
+            subdir = thread_dir(root, sub, "submissions", created_int, pid)
+            if pq is not None:
+                h16 = h[:16]
+                if index.has_hash(subdir, h16) or pq.pending(subdir, h16):
+                    continue
+                pq.add(subdir, h16, subdir / f"{capture_ts}_{h16}.parquet", [line])
+                if pq.full():
+                    wrote += flush_parquet(pq, index)
                 continue
-            if created_int <= 0:
+            if index.has_hash(subdir, h):
                 continue
-
-            k = (sub, pid)
-            if k not in post_index or created_int < post_index[k]:
-                post_index[k] = created_int
-
-            retrieved = obj.get("retrieved_utc")
-            if retrieved is None:
-                retrieved = obj.get("retrieved_on")
-            if retrieved is None:
-                retrieved = datetime.datetime.now(datetime.timezone.utc).timestamp()
-
-            capture_ts = ts_fmt(retrieved) or ts_fmt(created_int)
-            h = hash_post(obj)
-
-            subdir = thread_dir(root, sub, "submissions", created_int, pid)
             subdir.mkdir(parents=True, exist_ok=True)
 
-            if has_hash_file(subdir, h):
-                continue
-
             out_path = subdir / f"{capture_ts}_{h}.jsonl"
-            if write_one_jsonl(out_path, json.dumps(obj, ensure_ascii=False)):
+            if write_one_jsonl(out_path, line):
                 wrote += 1
+            index.add_hash(subdir, h)
+        if pq is not None:
+            wrote += flush_parquet(pq, index)
+        if args.checkpoint_bytes > 0 and offset - ckpt_at >= args.checkpoint_bytes:
+            index.save_checkpoint(key, fp, {"phase": "scan", "offset": offset, "scanned": scanned, "wrote": wrote, "skipped": 0})
+            ckpt_at = offset
+        index.commit()
+
+    index.save_checkpoint(key, fp, {"phase": "done", "offset": offset, "scanned": scanned, "wrote": wrote, "skipped": 0})
+    index.commit()
+    log_done("posts", path, scanned, f"wrote={wrote}", t0, args.workers, shards, args.fast)
+
+def write_comment_thread(root: Path, index: ImportIndex, sub: str, pid: str, rows, now_ts: int, pq: ParquetBatch | None = None) -> bool:
+    """Dedup, sort and hash one thread's comment records and write them; False when skipped.
+
+    With pq the thread is queued on the batch instead; the caller flushes it.
+    """
+    created_int = index.created(sub, pid)
+    if created_int is None:
+        log("WARN", f"comments skip sub={sub} post={pid} reason=no_post_created")
+        return False
 
-    log("INFO", f"posts done file={path} scanned={scanned} wrote={wrote}")
-
-def import_comments(path: Path, root: Path, post_index: dict, report_every: int):
-    groups = {}
-    scanned = 0
-    with path.open("r", encoding="utf-8", errors="ignore") as f:
-        for line in f:
-            scanned += 1
-            if report_every > 0 and scanned % report_every == 0:
-                log("INFO", f"comments progress file={path} scanned={scanned} threads={len(groups)}")
-            s = line.strip()
-            if not s:
-                continue
-            try:
-                obj = json.loads(s)
-            except Exception:
-                continue
-            if not isinstance(obj, dict):
-                continue
+    cap_ts = None
+    for _, _, t, _, _ in rows:
+        if t is not None and (cap_ts is None or t > cap_ts):
+            cap_ts = t
+    if cap_ts is None:
+        cap_ts = now_ts
 
-            sub = norm_sub(obj.get("subreddit") or "")
-            if not sub:
-                continue
+    capture_ts = ts_fmt(cap_ts) or ts_fmt(created_int)
 
-            link_id = obj.get("link_id")
-            if not isinstance(link_id, str) or not link_id.startswith("t3_"):
-                continue
-            pid = link_id.split("_", 1)[1]
-            groups.setdefault((sub, pid), []).append(obj)
-
-    now_ts = int(datetime.datetime.now(datetime.timezone.utc).timestamp())
-    wrote_threads = 0
-    skipped_threads = 0
-
-    for (sub, pid), rows in groups.items():
-        created_int = post_index.get((sub, pid))
-        if created_int is None:
-            log("WARN", f"comments skip sub={sub} post={pid} reason=no_post_created")
-            skipped_threads += 1
+    seen = set()
+    uniq = []
+    for r in rows:
+        cid = r[0]
+        if not cid:
             continue
-
-        cap_ts = None
-        for r in rows:
-            v = r.get("retrieved_utc")
-            if v is None:
-                v = r.get("retrieved_on")
-            if v is None:
-                continue
-            try:
-                t = int(float(v))
-            except Exception:
-                continue
-            if cap_ts is None or t > cap_ts:
-                cap_ts = t
-        if cap_ts is None:
-            cap_ts = now_ts
-
-        capture_ts = ts_fmt(cap_ts) or ts_fmt(created_int)
-
-        seen = set()
-        uniq = []
-        for r in rows:
-            cid = r.get("id")
-            if not cid:
-                continue
-            if cid in seen:
-                continue
-            seen.add(cid)
-            uniq.append(r)
-
-        uniq.sort(key=comment_sort_key)
-        h = hash_comments(uniq)
-
-        subdir = thread_dir(root, sub, "comments", created_int, pid)
-        subdir.mkdir(parents=True, exist_ok=True)
-
-        if has_hash_file(subdir, h):
-            skipped_threads += 1
+        if cid in seen:
             continue
-
-        out_path = subdir / f"{capture_ts}_{h}.jsonl"
-        if write_many_jsonl(out_path, uniq):
-            wrote_threads += 1
-        else:
-            skipped_threads += 1
-
-    log("INFO", f"comments done file={path} scanned={scanned} threads_wrote={wrote_threads} threads_skipped={skipped_threads}")
+        seen.add(cid)
+        uniq.append(r)
+
+    uniq.sort(key=lambda r: r[1])
+    h = sha256_bytes(b"\n".join(r[3] for r in uniq))
+
+    subdir = thread_dir(root, sub, "comments", created_int, pid)
+    if pq is not None:
+        # Like the jsonl path, a thread without comment ids still gets a (0-row) file.
+        h16 = h[:16]
+        if index.has_hash(subdir, h16) or pq.pending(subdir, h16):
+            return False
+        pq.add(subdir, h16, subdir / f"{capture_ts}_{h16}.parquet", [r[4] for r in uniq])
+        return True
+    if index.has_hash(subdir, h):
+        return False
+    subdir.mkdir(parents=True, exist_ok=True)
+
+    out_path = subdir / f"{capture_ts}_{h}.jsonl"
+    ok = write_many_jsonl(out_path, (r[4] for r in uniq))
+    index.add_hash(subdir, h)
+    return ok
+
+def rec_bytes(rec) -> int:
+    """Rough in-memory footprint of one comment record, used against --group-mem-mb."""
+    payload = rec[4]
+    n = len(payload) if isinstance(payload, str) else sum(len(v) for v in payload)
+    return len(rec[3]) + 2 * n + 256
+
+class CommentSpill:
+    """Comment records partitioned by crc32(sub/pid) into append-only pickle runs.
+
+    Appends preserve file order within every thread, so replaying a partition
+    rebuilds exactly the rows the in-memory grouping would have held. state()
+    after flush() is what a checkpoint needs to reopen the runs after the
+    process dies; like the index (synchronous=NORMAL) it is not fsynced.
+    """
+
+    def __init__(self, d: Path, partitions: int, sizes: dict | None = None):
+        d.mkdir(parents=True, exist_ok=True)
+        self.dir = d
+        self.partitions = partitions
+        self.files = {}
+        self.sizes = {}
+        if sizes is not None:
+            keep = {int(n): int(v) for n, v in sizes.items()}
+            for n, v in keep.items():
+                p = d / f"{n:05d}.pkl"
+                if not p.is_file() or p.stat().st_size < v:
+                    raise ValueError(f"spill run {p} is shorter than its checkpoint")
+            for p in d.glob("*.pkl"):
+                n = int(p.stem)
+                if n not in keep:
+                    p.unlink()
+                    continue
+                with p.open("r+b") as f:
+                    f.truncate(keep[n])
+            self.sizes = keep
+
+    @property
+    def spilled_bytes(self) -> int:
+        return sum(self.sizes.values())
+
+    def spill(self, groups: dict):
+        parts = {}
+        for (sub, pid), rows in groups.items():
+            n = zlib.crc32(f"{sub}/{pid}".encode("utf-8")) % self.partitions
+            parts.setdefault(n, []).append(((sub, pid), rows))
+        for n, items in parts.items():
+            f = self.files.get(n)
+            if f is None:
+                f = self.files[n] = (self.dir / f"{n:05d}.pkl").open("ab")
+            pickle.dump(items, f, protocol=pickle.HIGHEST_PROTOCOL)
+            self.sizes[n] = f.tell()
+
+    def flush(self):
+        for f in self.files.values():
+            f.flush()
+
+    def state(self) -> dict:
+        return {"dir": str(self.dir), "partitions": self.partitions, "sizes": {str(n): v for n, v in self.sizes.items()}}
+
+    def iter_partitions(self, start: int = 0):
+        """Yield (position, groups) per partition in partition order, from position start."""
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+        for pos, n in enumerate(sorted(self.sizes)):
+            if pos < start:
+                continue
+            groups = {}
+            with (self.dir / f"{n:05d}.pkl").open("rb") as f:
+                while f.tell() < self.sizes[n]:
+                    for k, rows in pickle.load(f):
+                        groups.setdefault(k, []).extend(rows)
+            yield pos, groups
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+        self.files = {}
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+def import_comments(path: Path, root: Path, index: ImportIndex, args, pool, pq: ParquetBatch | None = None):
+    t0 = time.perf_counter()
+    key, fp, st = checkpoint_state(index, path, args)
+    if st["phase"] == "done":
+        log("INFO", f"comments skip file={path} reason=checkpoint_done scanned={st['scanned']} threads_wrote={st['wrote']}")
+        return
+    # Only sizes spill partitions; compressed dumps expand roughly 8x.
+    size = path.stat().st_size * (8 if dump_codec(path) else 1)
+    mem_limit = args.group_mem_mb * 1024 * 1024
+    # Mid-file checkpoints need the grouped rows on disk, so they come with
+    # external grouping; in-memory grouping only records finished files.
+    durable = args.checkpoint_bytes > 0 and mem_limit > 0
+    spill_dir = index.spill_dir(key)
+    spill = None
+    if st.get("spill"):
+        try:
+            spill = CommentSpill(spill_dir, st["spill"]["partitions"], st["spill"]["sizes"])
+        except ValueError as e:
+            log("WARN", f"checkpoint action=discard file={path} reason={e}")
+            shutil.rmtree(spill_dir, ignore_errors=True)
+            st = {"phase": "scan", "offset": 0, "scanned": 0, "wrote": 0, "skipped": 0}
+    groups = {}
+    held = 0
+    threads = 0
+    scanned = st["scanned"]
+    offset = st["offset"]
+    ckpt_at = offset
+    shards = 0
+    wrote_threads = st["wrote"]
+    skipped_threads = st["skipped"]
+    ok = False
+    try:
+        if st["phase"] == "scan":
+            for end, n, part in map_ordered(pool, comments_shard, plan_jobs(path, args, offset), args.workers * 2):
+                shards += 1
+                last = scanned
+                scanned += n
+                offset = end
+                for k, rows in part.items():
+                    if k not in groups:
+                        threads += 1
+                    groups.setdefault(k, []).extend(rows)
+                    if mem_limit > 0:
+                        held += sum(rec_bytes(r) for r in rows)
+                flush = durable and offset - ckpt_at >= args.checkpoint_bytes
+                if mem_limit > 0 and (held > mem_limit or flush):
+                    if spill is None:
+                        partitions = args.group_partitions or max(16, min(4096, -(-3 * size // mem_limit)))
+                        spill = CommentSpill(spill_dir if durable else Path(tempfile.mkdtemp(prefix="import_arctic_", dir=args.spill_dir or None)), partitions)
+                        log("INFO", f"comments spill file={path} dir={spill.dir} partitions={partitions} group_mem_mb={args.group_mem_mb}")
+                    spill.spill(groups)
+                    groups = {}
+                    held = 0
+                if flush:
+                    spill.flush()
+                    index.save_checkpoint(key, fp, {"phase": "scan", "offset": offset, "scanned": scanned, "wrote": 0, "skipped": 0, "spill": spill.state()})
+                    index.commit()
+                    ckpt_at = offset
+                if args.report_every > 0 and scanned // args.report_every > last // args.report_every:
+                    log("INFO", f"comments progress file={path} scanned={scanned} threads={threads if spill else len(groups)}")
+
+            if spill is not None:
+                spill.spill(groups)
+                groups = {}
+                if durable:
+                    spill.flush()
+                    st = {"phase": "write", "offset": offset, "scanned": scanned, "wrote": 0, "skipped": 0, "next": 0, "spill": spill.state()}
+                    index.save_checkpoint(key, fp, st)
+                    index.commit()
+
+        now_ts = int(datetime.datetime.now(datetime.timezone.utc).timestamp())
+        batches = spill.iter_partitions(st.get("next", 0)) if spill is not None else [(0, groups)]
+        for pos, batch in batches:
+            for (sub, pid), rows in batch.items():
+                if write_comment_thread(root, index, sub, pid, rows, now_ts, pq):
+                    wrote_threads += 1
+                else:
+                    skipped_threads += 1
+                if pq is not None and pq.full():
+                    flush_parquet(pq, index)
+            if pq is not None:
+                flush_parquet(pq, index)
+            if durable and spill is not None:
+                st.update({"wrote": wrote_threads, "skipped": skipped_threads, "next": pos + 1})
+                index.save_checkpoint(key, fp, st)
+            index.commit()
+
+        index.save_checkpoint(key, fp, {"phase": "done", "offset": offset, "scanned": scanned, "wrote": wrote_threads, "skipped": skipped_threads})
+        index.commit()
+        ok = True
+    finally:
+        if spill is not None and (ok or not durable):
+            spill.close()
+
+    extra = f"threads_wrote={wrote_threads} threads_skipped={skipped_threads}"
+    if spill is not None:
+        extra += f" spill_partitions={spill.partitions} spill_mb={spill.spilled_bytes / 1048576:.1f}"
+    log_done("comments", path, scanned, extra, t0, args.workers, shards, args.fast)
 
 def main():
     ap = argparse.ArgumentParser()
-    ap.add_argument("--root", default="data/reddit/00_raw")
+    ap.add_argument("--root", default="", help="output tree (default: data/reddit/00_raw, or data/reddit/01_parquet with --out-format parquet)")
+    ap.add_argument("--out-format", choices=["jsonl", "parquet"], default="jsonl", help="parquet writes the 01_parquet layout directly, skipping 00_raw")
+    ap.add_argument("--compression", default="zstd", help="parquet compression codec")
+    ap.add_argument("--compression-level", type=int, default=22, help="zstd level for parquet (22 matches the 01_parquet stage; 0 = DuckDB default)")
+    ap.add_argument("--parquet-batch-files", type=int, default=4096, help="parquet files written per DuckDB COPY")
+    ap.add_argument("--duckdb-threads", type=int, default=0, help="DuckDB threads for parquet writes (0 = DuckDB default)")
     ap.add_argument("--report-every", type=int, default=200000)
+    ap.add_argument("--workers", type=int, default=1, help="parse/hash processes (0 = one per CPU)")
+    ap.add_argument("--shard-mb", type=int, default=64, help="byte-range shard size; shards are cut at newlines")
+    ap.add_argument("--codec", choices=["auto", "json"], default="auto", help="auto uses orjson when installed")
+    ap.add_argument("--group-mem-mb", type=int, default=0, help="spill comment groups to disk partitions above this size (0 = keep all in memory)")
+    ap.add_argument("--group-partitions", type=int, default=0, help="spill partitions (0 = derive from dump size and --group-mem-mb)")
+    ap.add_argument("--spill-dir", default="", help="parent dir for spill partitions (default: system temp dir)")
+    ap.add_argument("--index-path", default="", help="post/hash index (default: {root}/_import_index.sqlite)")
+    ap.add_argument("--rebuild-index", action="store_true", help="rescan --root into the index before importing")
+    ap.add_argument("--checkpoint-mb", type=int, default=256, help="save a resumable checkpoint every N MB of input (0 = only per finished file)")
+    ap.add_argument("--resume", action="store_true", help="continue each dump from its last checkpoint and skip finished ones")
+    ap.add_argument("--profile", choices=["none", "cpu", "mem", "duckdb"], default="none")
+    ap.add_argument("--profile-dir", default="data/reddit/logs/profile")
     ap.add_argument("paths", nargs="+")
     args = ap.parse_args()
+    profiling.start("import_arctic", args.profile, args.profile_dir)
 
-    root = Path(args.root)
+    if not re.fullmatch(r"[A-Za-z0-9_]+", args.compression):
+        log("ERROR", f"invalid --compression={args.compression}")
+        return 2
+    root = Path(args.root or ("data/reddit/01_parquet" if args.out_format == "parquet" else "data/reddit/00_raw"))
     root.mkdir(parents=True, exist_ok=True)
 
-    post_index = {}
+    args.workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    args.shard_bytes = max(1, args.shard_mb) * 1024 * 1024
+    args.fast = args.codec == "auto" and orjson is not None
+    args.checkpoint_bytes = max(0, args.checkpoint_mb) * 1024 * 1024
 
     post_files = []
     comment_files = []
     for p in args.paths:
-        name = os.path.basename(p)
-        if "_posts" in name:
+        kind = dump_kind(Path(p))
+        if kind == "posts":
             post_files.append(Path(p))
-        elif "_comments" in name:
+        elif kind == "comments":
             comment_files.append(Path(p))
 
-    if not post_files:
-        log("ERROR", "no *_posts files provided")
+    if not post_files and not comment_files:
+        log("ERROR", "no *_posts / *_submissions / *_comments files provided")
         return 2
 
-    for pf in post_files:
-        import_posts(pf, root, post_index, args.report_every)
-
-    for cf in comment_files:
-        import_comments(cf, root, post_index, args.report_every)
+    index = ImportIndex(Path(args.index_path) if args.index_path else root / "_import_index.sqlite", root)
+    index.bootstrap(args.rebuild_index)
+    profiling.mark("index")
+    if not post_files and index.count_posts() == 0:
+        log("ERROR", "no *_posts files provided and the post index is empty")
+        index.close()
+        return 2
 
-    log("INFO", f"done posts_index={len(post_index)}")
+    log("INFO", f"start root={root} out_format={args.out_format} posts={len(post_files)} comments={len(comment_files)} workers={args.workers} shard_mb={args.shard_mb} codec={'orjson' if args.fast else 'json'} group_mem_mb={args.group_mem_mb} resume={args.resume}")
+    pool = ProcessPoolExecutor(max_workers=args.workers) if args.workers > 1 else None
+    pqs = {}
+    if args.out_format == "parquet":
+        for kind in PARQUET_COLUMNS:
+            pqs[kind] = ParquetBatch(root, kind, args.compression, args.compression_level, args.duckdb_threads, args.parquet_batch_files)
+    try:
+        for pf in post_files:
+            import_posts(pf, root, index, args, pool, pqs.get("submissions"))
+            profiling.mark(f"posts:{pf.name}")
+
+        for cf in comment_files:
+            import_comments(cf, root, index, args, pool, pqs.get("comments"))
+            profiling.mark(f"comments:{cf.name}")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        for pq in pqs.values():
+            pq.close()
+        posts_total = index.count_posts()
+        index.close()
+
+    log("INFO", f"done posts_index={posts_total}")
     return 0
 
 if __name__ == "__main__":
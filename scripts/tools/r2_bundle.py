@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+import argparse
+import gzip
+import json
+import os
+import struct
+import sys
+import zlib
+
+# Reader for the bundled R2 layout written by the uploader with --layout bundle:
+# one object per thread at {prefix}/r/b/{sub}/{sid}.tdb holding zlib blocks of
+# concatenated texts, a zlib JSON index and a fixed trailer. Single entries are
+# served with range reads, whole threads with one GET. read_text covers the
+# per-object layout, including gzip Content-Encoding.
+
+BUNDLE_MAGIC = b"TDB1"
+BUNDLE_TRAILER = struct.Struct("<QI4s")
+TAIL_BYTES = 65536
+
+def log(level, msg):
+    sys.stderr.write(f"[{level}] {msg}\n")
+
+def mk_s3():
+    import boto3
+    from botocore.config import Config
+
+    ak = os.environ.get("R2_ACCESS_KEY_ID", "")
+    sk = os.environ.get("R2_SECRET_ACCESS_KEY", "")
+    if not ak or not sk:
+        raise SystemExit("missing R2_ACCESS_KEY_ID or R2_SECRET_ACCESS_KEY")
+    endpoint = os.environ.get("R2_ENDPOINT", "").strip()
+    if not endpoint:
+        acc = os.environ.get("CF_ACCOUNT_ID", "").strip()
+        if acc:
+            endpoint = f"https://{acc}.r2.cloudflarestorage.com"
+    if not endpoint:
+        raise SystemExit("missing R2_ENDPOINT (or CF_ACCOUNT_ID to derive endpoint)")
+    cfg = Config(signature_version="s3v4", retries={"max_attempts": 3, "mode": "standard"})
+    return boto3.client(
+        "s3",
+        endpoint_url=endpoint,
+        region_name="auto",
+        aws_access_key_id=ak,
+        aws_secret_access_key=sk,
+        config=cfg,
+    )
+
+def bundle_key(prefix: str, sub: str, sid: str) -> str:
+    prefix = (prefix or "").strip().strip("/")
+    base = f"r/b/{sub}/{sid}.tdb"
+    return f"{prefix}/{base}" if prefix else base
+
+def resolve(vid: str, meta: dict, prefix: str):
+    """Map a vector id (r:{t}:{sub}:{id}) and its metadata to (bundle_key, t, id).
+
+    Comments need meta["sid"] to find their thread. Returns None when the id
+    cannot be resolved.
+    """
+    parts = str(vid).split(":")
+    if len(parts) != 4 or parts[0] != "r" or parts[1] not in ("s", "c"):
+        return None
+    _, t, sub, eid = parts
+    sid = eid if t == "s" else str((meta or {}).get("sid") or "")
+    if not sid:
+        return None
+    return bundle_key(prefix, sub, sid), t, eid
+
+def _get(s3, bucket: str, key: str, rng: str = "", etag: str = ""):
+    kw = {"Bucket": bucket, "Key": key}
+    if rng:
+        kw["Range"] = rng
+    if etag:
+        kw["IfMatch"] = etag
+    r = s3.get_object(**kw)
+    data = r["Body"].read()
+    size = len(data)
+    cr = str(r.get("ContentRange") or "")
+    if "/" in cr:
+        size = int(cr.rsplit("/", 1)[1])
+    return data, size, str(r.get("ETag") or "").strip('"')
+
+def _parse_trailer(tail: bytes):
+    off, n, magic = BUNDLE_TRAILER.unpack(tail[-BUNDLE_TRAILER.size :])
+    if magic != BUNDLE_MAGIC:
+        raise ValueError(f"bad bundle magic {magic!r}")
+    return off, n
+
+def _parse_index(raw: bytes) -> dict:
+    doc = json.loads(zlib.decompress(raw))
+    if doc.get("codec") != "zlib":
+        raise ValueError(f"unsupported bundle codec {doc.get('codec')!r}")
+    return doc
+
+def decode_bundle(data: bytes):
+    """Decode a whole bundle into [(t, id, h, text), ...] in stored order."""
+    off, n = _parse_trailer(data)
+    doc = _parse_index(data[off : off + n])
+    blocks = [zlib.decompress(data[b[0] : b[0] + b[1]]) for b in doc["blocks"]]
+    return [(t, eid, h, blocks[bi][o : o + ln].decode("utf-8")) for t, eid, h, bi, o, ln in doc["entries"]]
+
+def open_bundle(s3, bucket: str, key: str, tail_bytes: int = TAIL_BYTES) -> dict:
+    """Fetch the index of a bundle with one suffix range read (two for huge indexes).
+
+    The returned handle pins the ETag so later block reads fail rather than mix
+    two versions of a rewritten bundle.
+    """
+    tail, size, etag = _get(s3, bucket, key, f"bytes=-{max(BUNDLE_TRAILER.size, tail_bytes)}")
+    tail_start = size - len(tail)
+    off, n = _parse_trailer(tail)
+    if off >= tail_start:
+        raw = tail[off - tail_start : off - tail_start + n]
+    else:
+        raw, _, _ = _get(s3, bucket, key, f"bytes={off}-{off + n - 1}", etag)
+    doc = _parse_index(raw)
+    entries = {(t, eid): (h, bi, o, ln) for t, eid, h, bi, o, ln in doc["entries"]}
+    return {"key": key, "etag": etag, "size": size, "blocks": doc["blocks"], "entries": entries, "tail_start": tail_start, "tail": tail}
+
+def read_entries(s3, bucket: str, bnd: dict, want):
+    """Read texts for (t, id) pairs from an opened bundle; returns {(t, id): text}.
+
+    Needed blocks already inside the fetched tail are reused, the rest are read
+    with one range request per run of adjacent blocks.
+    """
+    need = {}
+    for tid in want:
+        e = bnd["entries"].get(tuple(tid))
+        if e is not None:
+            need.setdefault(e[1], []).append((tuple(tid), e))
+    blocks = bnd["blocks"]
+    data = {}
+    fetch = []
+    for bi in sorted(need):
+        boff, blen, _ = blocks[bi]
+        if boff >= bnd["tail_start"]:
+            s = boff - bnd["tail_start"]
+            data[bi] = bnd["tail"][s : s + blen]
+        elif fetch and fetch[-1][-1] == bi - 1:
+            fetch[-1].append(bi)
+        else:
+            fetch.append([bi])
+    for run in fetch:
+        start = blocks[run[0]][0]
+        end = blocks[run[-1]][0] + blocks[run[-1]][1] - 1
+        raw, _, _ = _get(s3, bucket, bnd["key"], f"bytes={start}-{end}", bnd["etag"])
+        for bi in run:
+            s = blocks[bi][0] - start
+            data[bi] = raw[s : s + blocks[bi][1]]
+    out = {}
+    for bi, items in need.items():
+        plain = zlib.decompress(data[bi])
+        for tid, (_, _, o, ln) in items:
+            out[tid] = plain[o : o + ln].decode("utf-8")
+    return out
+
+def decode_body(data: bytes, encoding: str) -> bytes:
+    encoding = (encoding or "").strip().lower()
+    if encoding in ("", "identity"):
+        return data
+    if encoding == "gzip":
+        return gzip.decompress(data)
+    raise ValueError(f"unsupported Content-Encoding {encoding!r}")
+
+def read_text(s3, bucket: str, key: str) -> str:
+    """Read one per-object text, undoing any Content-Encoding set by the uploader."""
+    r = s3.get_object(Bucket=bucket, Key=key)
+    return decode_body(r["Body"].read(), str(r.get("ContentEncoding") or "")).decode("utf-8")
+
+def read_thread(s3, bucket: str, key: str):
+    data, _, _ = _get(s3, bucket, key)
+    return decode_bundle(data)
+
+def get_texts(s3, bucket: str, prefix: str, matches):
+    """Resolve (vid, meta) pairs to texts, opening each bundle once; returns {vid: text}."""
+    by_key = {}
+    for vid, meta in matches:
+        r = resolve(vid, meta, prefix)
+        if r is not None:
+            by_key.setdefault(r[0], []).append((vid, (r[1], r[2])))
+    out = {}
+    for key, items in by_key.items():
+        try:
+            bnd = open_bundle(s3, bucket, key)
+            got = read_entries(s3, bucket, bnd, [tid for _, tid in items])
+        except Exception as e:
+            code = str(getattr(e, "response", {}).get("Error", {}).get("Code", ""))
+            if code not in ("404", "NoSuchKey", "NotFound", "412", "PreconditionFailed"):
+                raise
+            log("WARN", f"bundle action=skip key={key} reason={code}")
+            continue
+        for vid, tid in items:
+            if tid in got:
+                out[vid] = got[tid]
+    return out
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--bucket", required=True)
+    ap.add_argument("--prefix", default="reddit/v1")
+    sp = ap.add_subparsers(dest="cmd", required=True)
+    g = sp.add_parser("get", help="print the text of one vector id")
+    g.add_argument("vid")
+    g.add_argument("--sid", default="", help="thread id (required for comments)")
+    x = sp.add_parser("text", help="print one per-object text by key")
+    x.add_argument("key")
+    t = sp.add_parser("thread", help="print every entry of a thread bundle as jsonl")
+    t.add_argument("sub")
+    t.add_argument("sid")
+    args = ap.parse_args()
+
+    s3 = mk_s3()
+    if args.cmd == "get":
+        got = get_texts(s3, args.bucket, args.prefix, [(args.vid, {"sid": args.sid})])
+        if args.vid not in got:
+            log("ERROR", f"not found vid={args.vid}")
+            return 1
+        sys.stdout.write(got[args.vid] + "\n")
+        return 0
+
+    if args.cmd == "text":
+        sys.stdout.write(read_text(s3, args.bucket, args.key) + "\n")
+        return 0
+
+    for typ, eid, h, text in read_thread(s3, args.bucket, bundle_key(args.prefix, args.sub, args.sid)):
+        sys.stdout.write(json.dumps({"t": typ, "id": eid, "h": h, "text": text}, ensure_ascii=False) + "\n")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+import argparse
+import json
+import math
+import sys
+
+STAGE_ORDER = ["init", "cache", "embed", "vector", "catalog", "hydrate", "gen", "total"]
+
+def log(level, msg):
+    sys.stderr.write(f"[{level}] {msg}\n")
+
+def pct(sorted_xs, p):
+    if not sorted_xs:
+        return 0.0
+    k = max(0, math.ceil(p / 100.0 * len(sorted_xs)) - 1)
+    return sorted_xs[min(k, len(sorted_xs) - 1)]
+
+def iter_spans(path):
+    f = sys.stdin if path == "-" else open(path, "r", encoding="utf-8", errors="ignore")
+    try:
+        for line in f:
+            s = line.strip()
+            if s.startswith("[TRACE] "):
+                s = s[len("[TRACE] "):]
+            if not s.startswith("{"):
+                continue
+            try:
+                obj = json.loads(s)
+            except Exception:
+                continue
+            if isinstance(obj, dict) and "stage" in obj and "ms" in obj:
+                yield obj
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+def stage_key(k):
+    cmd, stage = k
+    i = STAGE_ORDER.index(stage) if stage in STAGE_ORDER else len(STAGE_ORDER)
+    return (cmd, i, stage)
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("paths", nargs="+", help="trace jsonl files or captured stderr ('-' for stdin)")
+    ap.add_argument("--cmd", default="", help="only spans from this command (query|ask)")
+    ap.add_argument("--since", type=float, default=0.0, help="only spans with ts >= this unix time")
+    ap.add_argument("--skip-cached", action="store_true", help="drop traces answered from the ask cache")
+    ap.add_argument("--format", choices=["table", "json"], default="table")
+    args = ap.parse_args()
+
+    spans = []
+    for p in args.paths:
+        for sp in iter_spans(p):
+            if args.cmd and sp.get("cmd") != args.cmd:
+                continue
+            if args.since and float(sp.get("ts") or 0) < args.since:
+                continue
+            spans.append(sp)
+
+    if args.skip_cached:
+        cached = {sp.get("trace") for sp in spans if sp.get("stage") == "total" and sp.get("cached")}
+        spans = [sp for sp in spans if sp.get("trace") not in cached]
+
+    groups = {}
+    for sp in spans:
+        try:
+            ms = float(sp["ms"])
+        except Exception:
+            continue
+        groups.setdefault((str(sp.get("cmd") or ""), str(sp["stage"])), []).append(ms)
+
+    if not groups:
+        log("WARN", "no spans found")
+        return 1
+
+    rows = []
+    for k in sorted(groups, key=stage_key):
+        xs = sorted(groups[k])
+        rows.append({
+            "cmd": k[0],
+            "stage": k[1],
+            "n": len(xs),
+            "mean": round(sum(xs) / len(xs), 1),
+            "p50": round(pct(xs, 50), 1),
+            "p95": round(pct(xs, 95), 1),
+            "p99": round(pct(xs, 99), 1),
+            "max": round(xs[-1], 1),
+        })
+
+    if args.format == "json":
+        sys.stdout.write(json.dumps(rows, ensure_ascii=False, indent=2) + "\n")
+        return 0
+
+    cols = ["cmd", "stage", "n", "mean", "p50", "p95", "p99", "max"]
+    widths = {c: max(len(c), *(len(str(r[c])) for r in rows)) for c in cols}
+    sys.stdout.write("  ".join(c.rjust(widths[c]) for c in cols) + "\n")
+    for r in rows:
+        sys.stdout.write("  ".join(str(r[c]).rjust(widths[c]) for c in cols) + "\n")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())